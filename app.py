@@ -2,14 +2,26 @@ import flask
 from flask import Flask, request, jsonify
 from flask_cors import CORS # For enabling CORS
 import requests
-import gzip
-import json
-import io
-import re
 import sqlite3
-from datetime import datetime, date, time, timedelta, timezone
+from datetime import datetime, date, time, timedelta
 from urllib.parse import quote
+import os
+import asyncio
 import logging
+import threading
+
+from instrument_refresher import InstrumentMasterRefresher
+from fetch_engine import fetch_concurrently
+from upstox_async import AsyncUpstoxClient, UpstoxHTTPError
+from symbol_resolver import resolve_trading_symbols
+from upstox_http import upstox_get, log_connection_stats
+from circuit_breaker import CircuitOpenError, open_circuits
+from daily_candles import DailyCandleRanges
+from candle_cache import CandleCache, split_candles_by_day
+from candle_archive import CandleArchive
+from single_flight import SingleFlight
+from candle_extract import candles_at_times
+from screen_store import open_screen_store
 
 # --- 1. Configuration ---
 # (Mostly copied from fno_equity_analyzer.py, adapted for Flask context)
@@ -43,71 +55,71 @@ ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJrZXlfaWQiOiJza192MS4wIiwiYWxnIjoiSFMyNTYifQ.e
 # CRITICAL NOTE: ACCESS_TOKEN is for 2025-05-17. Using it for other dates will likely cause API auth failures.
 
 DB_PATH = "./upstox_data_v2.db" # Database path
-API_BASE_URL = "https://api.upstox.com"
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com") # e.g. http://127.0.0.1:8765 for upstox_mock_server
 TARGET_920_TIME_OBJ = time(9, 20, 0) # For 9:20 AM data
+ANALYZE_ENGINE = os.environ.get("ANALYZE_ENGINE", "threads") # "threads" (fetch_engine) or "async" (upstox_async)
+SCREEN_RUNS_MAX_LIMIT = 500 # Most runs /api/screen_runs returns in one response
 
 # --- 2. Logging Setup ---
 # Basic logging; for Flask, you might want more sophisticated setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s')
 logger = logging.getLogger(__name__) # Flask specific logger can also be used: app.logger
 
-# --- Global Cache for Instrument Master ---
-_instrument_master_cache = None
+# --- Instrument Master ---
+# Loaded at start-up and refreshed on a schedule by a background thread; requests never download it.
+instrument_master_refresher = InstrumentMasterRefresher()
 
-# --- 3. Helper Functions (from fno_equity_analyzer.py, slightly adapted) ---
+# Candles of past sessions never change, so every fetched day is kept in a local SQLite cache;
+# analysing the same dates again runs without any requests (see candle_cache).
+candle_cache = CandleCache()
+
+# Daily candles are fetched a date range per instrument, so re-running a previous day or moving
+# the previous date back costs no further requests.
+daily_candle_ranges = DailyCandleRanges(ACCESS_TOKEN, API_BASE_URL, cache=candle_cache)
 
-def derive_trading_symbol(stock_name_with_suffix):
-    match = re.search(r'\((.*?)\)', stock_name_with_suffix)
-    if match:
-        return match.group(1).upper()
-    symbol = stock_name_with_suffix.split()[0].upper()
-    symbol = re.sub(r'[^A-Z0-9]', '', symbol)
-    return symbol
+# Every finished 1-minute session the intraday fetches download is archived whole, compressed
+# (see candle_archive), not just its 09:20 candle; a session found there is never fetched again,
+# so screens at other times of day can run from local data. The archive is the only store of
+# finished sessions; candle_cache keeps just today's, still-forming one.
+candle_archive = CandleArchive()
+
+# --- 3. Helper Functions (from fno_equity_analyzer.py, slightly adapted) ---
 
 def get_instrument_master():
-    global _instrument_master_cache
-    if _instrument_master_cache is not None:
-        logger.info("Returning instrument master from cache.")
-        return _instrument_master_cache
-    url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-    try:
-        logger.info(f"Downloading instrument master from {url}...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        gzipped_content = response.content
-        decompressed_content = gzip.decompress(gzipped_content)
-        json_data_str = decompressed_content.decode('utf-8')
-        _instrument_master_cache = json.loads(json_data_str)
-        logger.info(f"Successfully loaded and cached {len(_instrument_master_cache)} instruments.")
-        return _instrument_master_cache
-    except Exception as e:
-        logger.error(f"Error fetching/processing instrument master: {e}")
-        return None
+    """Returns the master currently published by the background refresher (see instrument_refresher)."""
+    return instrument_master_refresher.get()
 
 def find_equity_instrument_key(stock_symbol, instrument_master):
     if not instrument_master: return None
-    for instrument in instrument_master:
-        if (instrument.get('trading_symbol') == stock_symbol and
-            instrument.get('instrument_type') == 'EQ' and
-            instrument.get('segment') == 'NSE_EQ' and # As per subtask 13
-            instrument.get('exchange') == 'NSE'):
-            return instrument.get('instrument_key')
-    logger.warning(f"Instrument key for {stock_symbol} not found in master list.")
-    return None
+    instrument_key = instrument_master.find_equity_key(stock_symbol)
+    if instrument_key is None:
+        logger.warning(f"Instrument key for {stock_symbol} not found in master list.")
+    return instrument_key
+
+def _daily_close_oi(candles):
+    """(close, oi, error) from a days/1 candle list."""
+    if candles and candles[0] and len(candles[0]) >= 7:
+        return candles[0][4], candles[0][6], None # close, oi, error
+    return None, None, "No/incomplete candle data"
+
+def _extract_920_candle(candles, target_candle_date_obj, instrument_key):
+    """(close, oi, error) for the 9:20 candle of target_candle_date_obj in a minutes/1 candle list."""
+    if candles:
+        # Bisects on the expected timestamp string instead of parsing every candle (candle_extract)
+        candle = candles_at_times(candles, target_candle_date_obj, [TARGET_920_TIME_OBJ]).get(TARGET_920_TIME_OBJ)
+        if candle:
+            return candle[4], candle[6], None # close, oi, error
+        return None, None, f"9:20 candle for {target_candle_date_obj} not in response"
+    return None, None, "No intraday candles in response"
 
 def fetch_historical_data_for_analyzer(instrument_key, date_str): # Renamed to avoid conflict if other versions exist
     if not instrument_key: return None, None, "Instrument key was None"
-    encoded_key = quote(instrument_key)
-    api_url = f"{API_BASE_URL}/v3/historical-candle/{encoded_key}/days/1/{date_str}"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"}
     logger.info(f"Fetching historical data for {instrument_key} on {date_str}")
     try:
-        response = requests.get(api_url, headers=headers, timeout=15)
-        response.raise_for_status()
-        data = response.json().get("data", {}).get("candles")
-        if data and data[0] and len(data[0]) >= 7:
-            return data[0][4], data[0][6], None # close, oi, error
-        return None, None, "No/incomplete candle data"
+        candle = daily_candle_ranges.candle(instrument_key, date_str, timeout=15)
+        return _daily_close_oi([candle] if candle else None)
+    except CircuitOpenError as e:
+        return None, None, str(e) # Reported once for the whole run by _finish_analysis
     except requests.exceptions.HTTPError as e:
         err_msg = f"HTTP Error for {instrument_key} on {date_str} (hist): {e.response.status_code} - {e.response.text[:100]}"
         logger.error(err_msg)
@@ -125,25 +137,21 @@ def fetch_intraday_data_920_for_analyzer(instrument_key, target_candle_date_obj)
     
     api_url = f"{API_BASE_URL}/v3/historical-candle/{encoded_key}/minutes/1/{api_request_date_str}"
     params = {"from_date": api_request_date_str}
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"}
     logger.info(f"Fetching intraday for {instrument_key} (target {target_candle_date_obj}, API req {api_request_date_str})")
-    try:
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+
+    def fetch():
+        response = upstox_get(ACCESS_TOKEN, api_url, params=params, timeout=20)
         response.raise_for_status()
-        candles = response.json().get("data", {}).get("candles")
-        if candles:
-            for candle in candles:
-                if len(candle) >= 7:
-                    ts_str = candle[0]
-                    try:
-                        dt_obj = datetime.fromisoformat(ts_str)
-                        if dt_obj.date() == target_candle_date_obj and dt_obj.time() == TARGET_920_TIME_OBJ:
-                            return candle[4], candle[6], None # close, oi, error
-                    except ValueError: 
-                        logger.warning(f"Timestamp parse error for {ts_str} in {instrument_key}")
-                        continue # Skip malformed timestamp
-            return None, None, f"9:20 candle for {target_candle_date_obj} not in response"
-        return None, None, "No intraday candles in response"
+        return split_candles_by_day((response.json().get("data") or {}).get("candles"))
+
+    try:
+        if CandleCache.is_final(target_candle_date_obj):
+            candles = candle_archive.get_or_fetch(instrument_key, target_candle_date_obj, fetch, cache=candle_cache)
+        else:
+            candles = candle_cache.get_or_fetch(instrument_key, "minutes", 1, target_candle_date_obj.isoformat(), fetch)
+        return _extract_920_candle(candles, target_candle_date_obj, instrument_key)
+    except CircuitOpenError as e:
+        return None, None, str(e)
     except requests.exceptions.HTTPError as e:
         err_msg = f"HTTP Error for {instrument_key} (intraday {target_candle_date_obj}): {e.response.status_code} - {e.response.text[:100]}"
         logger.error(err_msg)
@@ -153,59 +161,87 @@ def fetch_intraday_data_920_for_analyzer(instrument_key, target_candle_date_obj)
         logger.error(err_msg)
         return None, None, err_msg
 
-def init_db_for_analyzer(db_path, table_name_raw, table_name_filtered):
-    conn = None
+# Async counterparts of the two fetchers above, for analyze_stocks_for_dates_async. Same return
+# values and error messages; `client` is an open AsyncUpstoxClient shared by the whole run.
+
+async def fetch_historical_data_for_analyzer_async(client, instrument_key, date_str):
+    if not instrument_key: return None, None, "Instrument key was None"
+    logger.info(f"Fetching historical data for {instrument_key} on {date_str} (async)")
     try:
-        logger.info(f"Initializing DB at {db_path} for tables {table_name_raw}, {table_name_filtered}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name_raw}")
-        cursor.execute(f"""CREATE TABLE {table_name_raw} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT,
-            prev_day_equity_close REAL, prev_day_equity_oi INTEGER,
-            equity_920_price REAL, equity_920_oi INTEGER, record_timestamp TEXT, error_message TEXT)""")
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name_filtered}")
-        cursor.execute(f"""CREATE TABLE {table_name_filtered} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT,
-            percent_change REAL, record_timestamp TEXT)""")
-        conn.commit()
-        logger.info("DB initialized.")
+        candle = await daily_candle_ranges.candle_async(client, instrument_key, date_str)
+        return _daily_close_oi([candle] if candle else None)
+    except CircuitOpenError as e:
+        return None, None, str(e)
+    except UpstoxHTTPError as e:
+        err_msg = f"HTTP Error for {instrument_key} on {date_str} (hist): {e.status} - {e.text[:100]}"
+        logger.error(err_msg)
+        return None, None, err_msg
+    except Exception as e:
+        err_msg = f"General error for {instrument_key} on {date_str} (hist): {e or type(e).__name__}"
+        logger.error(err_msg)
+        return None, None, err_msg
+
+async def fetch_intraday_data_920_for_analyzer_async(client, instrument_key, target_candle_date_obj):
+    if not instrument_key: return None, None, "Instrument key was None"
+    api_request_date_str = (target_candle_date_obj + timedelta(days=1)).strftime('%Y-%m-%d') # API D+1 quirk
+    logger.info(f"Fetching intraday for {instrument_key} (target {target_candle_date_obj}, API req {api_request_date_str}) (async)")
+
+    async def fetch():
+        return split_candles_by_day(await client.minute_candles(instrument_key, api_request_date_str))
+
+    try:
+        if CandleCache.is_final(target_candle_date_obj):
+            candles = await candle_archive.get_or_fetch_async(instrument_key, target_candle_date_obj, fetch, cache=candle_cache)
+        else:
+            candles = await candle_cache.get_or_fetch_async(instrument_key, "minutes", 1, target_candle_date_obj.isoformat(), fetch)
+        return _extract_920_candle(candles, target_candle_date_obj, instrument_key)
+    except CircuitOpenError as e:
+        return None, None, str(e)
+    except UpstoxHTTPError as e:
+        err_msg = f"HTTP Error for {instrument_key} (intraday {target_candle_date_obj}): {e.status} - {e.text[:100]}"
+        logger.error(err_msg)
+        return None, None, err_msg
+    except Exception as e:
+        err_msg = f"General error for {instrument_key} (intraday {target_candle_date_obj}): {e or type(e).__name__}"
+        logger.error(err_msg)
+        return None, None, err_msg
+
+def init_db_for_analyzer(db_path):
+    """Opens the screen store (creating its schema and importing legacy per-date tables once)."""
+    try:
+        return open_screen_store(db_path)
     except sqlite3.Error as e:
         logger.error(f"SQLite error during DB init: {e}")
         raise # Re-raise to signal failure in analysis function
-    finally:
-        if conn: conn.close()
 
-def store_data_to_db_for_analyzer(db_path, table_name_raw, table_name_filtered, all_data, filtered_data):
-    conn = None
+def store_data_to_db_for_analyzer(db_path, trade_date, previous_date, all_data, filtered_data, universe_size=None):
+    """
+    Upserts one run's rows per (trade_date, symbol) and replaces trade_date's (symbol,
+    percent_change) hits; other symbols' rows and earlier dates are kept.
+    """
     try:
         logger.info(f"Storing data to DB. Raw: {len(all_data)}, Filtered: {len(filtered_data)}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        current_ts = datetime.now(timezone.utc).isoformat()
-        
-        for record in all_data: # Assumes record is a dict
-            cursor.execute(f"""INSERT INTO {table_name_raw} 
-                (stock_symbol, prev_day_equity_close, prev_day_equity_oi,
-                 equity_920_price, equity_920_oi, record_timestamp, error_message)
-                VALUES (?, ?, ?, ?, ?, ?, ?);""", 
-                (record['stock_symbol'], record.get('prev_day_equity_close'), record.get('prev_day_equity_oi'),
-                 record.get('equity_920_price'), record.get('equity_920_oi'), current_ts, record.get('error_message')))
-        
-        for symbol, p_change in filtered_data: # Assumes (symbol, percent_change) tuples
-            cursor.execute(f"""INSERT INTO {table_name_filtered}
-                (stock_symbol, percent_change, record_timestamp) VALUES (?, ?, ?);""",
-                (symbol, p_change, current_ts))
-        conn.commit()
+        open_screen_store(db_path).store_run(trade_date, previous_date, all_data, filtered_data, source="app", universe_size=universe_size)
         logger.info("Data stored in DB.")
     except sqlite3.Error as e:
         logger.error(f"SQLite error storing data: {e}")
         # Potentially add to an errors_list to be returned
-    finally:
-        if conn: conn.close()
 
 # --- 4. Core Analysis Function ---
-def analyze_stocks_for_dates(current_processing_date_str, previous_processing_date_str):
+# A run has three phases: _plan_analysis (dates, screen store, symbol/key resolution), the fetches,
+# and _finish_analysis (per-stock rows, filter, DB write, response). The threaded and asyncio
+# entry points share the first and last phase and differ only in how the fetches are driven.
+
+def _is_complete_row(row, previous_processing_date_str):
+    """True for a stored row with both prices, no error, screened against the same previous date."""
+    return (row['prev_day_equity_close'] is not None and row['equity_920_price'] is not None
+            and not row['error_message'] and row['previous_date'] == previous_processing_date_str)
+
+def _plan_analysis(current_processing_date_str, previous_processing_date_str, resume=False):
+    """
+    Returns the run's plan dict, or {"error": ...} if the run cannot start. With `resume`, stocks
+    whose stored row for this date is complete (_is_complete_row) are reused instead of fetched.
+    """
     logger.info(f"Starting analysis for current_date: {current_processing_date_str}, previous_date: {previous_processing_date_str}")
     
     # Date conversions
@@ -215,32 +251,34 @@ def analyze_stocks_for_dates(current_processing_date_str, previous_processing_da
     except ValueError:
         return {"error": "Invalid date format. Please use YYYY-MM-DD."}
 
-    # Dynamic table names
-    table_suffix = current_processing_date_str.replace('-', '_')
-    raw_data_table = f"data_{table_suffix}"
-    filtered_data_table = f"filtered_{table_suffix}"
-
     instrument_master = get_instrument_master()
     if not instrument_master:
         return {"error": "Failed to load instrument master."}
 
     try:
-        init_db_for_analyzer(DB_PATH, raw_data_table, filtered_data_table)
+        screen_store = init_db_for_analyzer(DB_PATH)
+        stored_rows = {}
+        if resume:
+            stored_rows = {row['stock_symbol']: row for row in screen_store.rows(current_processing_date_str)
+                           if _is_complete_row(row, previous_processing_date_str)}
     except Exception as e: # Catch DB init errors
         return {"error": f"Failed to initialize database: {e}"}
 
-
     all_stocks_data_for_db = []
-    filtered_stocks_output = [] # For the JSON response: list of dicts
     errors_list = []
     processed_count = 0
 
+    # Resolve the whole universe against the master's index in one pass; names resolved on a
+    # previous run are reused from the symbol resolution file
+    derived_symbols = resolve_trading_symbols(F_AND_O_STOCK_NAMES, instrument_master)
+    instrument_keys = instrument_master.find_equity_keys(s for s in derived_symbols.values() if s)
+
+    pending_fetches = [] # (slot in all_stocks_data_for_db, derived_symbol, instrument_key)
+    reused_slots = set() # Rows taken from the store on a resumed run; they are not written again
     for stock_name_full in F_AND_O_STOCK_NAMES:
         processed_count += 1
         logger.info(f"Processing ({processed_count}/{len(F_AND_O_STOCK_NAMES)}): {stock_name_full}")
-        derived_symbol = derive_trading_symbol(stock_name_full)
-        
-        api_error_message = None # To store specific API errors for a stock
+        derived_symbol = derived_symbols[stock_name_full]
 
         if not derived_symbol:
             err_msg = f"Symbol derivation failed for '{stock_name_full}'"
@@ -249,7 +287,7 @@ def analyze_stocks_for_dates(current_processing_date_str, previous_processing_da
             all_stocks_data_for_db.append({'stock_symbol': stock_name_full, 'error_message': err_msg})
             continue
             
-        instrument_key = find_equity_instrument_key(derived_symbol, instrument_master)
+        instrument_key = instrument_keys.get(derived_symbol)
         if not instrument_key:
             err_msg = f"Instrument key not found for {derived_symbol}."
             logger.warning(err_msg)
@@ -257,10 +295,42 @@ def analyze_stocks_for_dates(current_processing_date_str, previous_processing_da
             all_stocks_data_for_db.append({'stock_symbol': derived_symbol, 'error_message': err_msg})
             continue
 
-        prev_close, prev_oi, prev_err = fetch_historical_data_for_analyzer(instrument_key, previous_processing_date_str)
+        if derived_symbol in stored_rows:
+            reused_slots.add(len(all_stocks_data_for_db))
+            all_stocks_data_for_db.append(stored_rows[derived_symbol])
+            continue
+
+        pending_fetches.append((len(all_stocks_data_for_db), derived_symbol, instrument_key))
+        all_stocks_data_for_db.append(None) # Filled in by _finish_analysis once the fetches complete
+    if resume:
+        logger.info(f"Resuming {current_processing_date_str}: {len(reused_slots)} stored rows reused, {len(pending_fetches)} stocks to fetch.")
+
+    return {
+        "current_date_obj": current_date_obj, "previous_date_str": previous_processing_date_str,
+        "current_date_str": current_processing_date_str,
+        "all_stocks_data_for_db": all_stocks_data_for_db, "errors_list": errors_list,
+        "processed_count": processed_count, "pending_fetches": pending_fetches,
+        "resume": resume, "reused_slots": reused_slots,
+    }
+
+def _finish_analysis(plan, fetch_results):
+    """
+    Turns the fetch results into stored rows and the API response. `fetch_results` holds two
+    (value, oi, error) tuples per pending stock, daily first, in pending_fetches order. The
+    filter runs over every row, fetched or (on a resumed run) reused from the store, so the
+    stored hits are always recomputed from the full set.
+    """
+    all_stocks_data_for_db = plan["all_stocks_data_for_db"]
+    errors_list = plan["errors_list"]
+    filtered_stocks_output = [] # For the JSON response: list of dicts
+
+    for (slot, derived_symbol, instrument_key), prev_result, curr_result in zip(
+            plan["pending_fetches"], fetch_results[0::2], fetch_results[1::2]):
+        prev_close, prev_oi, prev_err = prev_result
+        curr_920_price, curr_920_oi, curr_err = curr_result
+
+        api_error_message = None # To store specific API errors for a stock
         if prev_err: api_error_message = prev_err
-        
-        curr_920_price, curr_920_oi, curr_err = fetch_intraday_data_920_for_analyzer(instrument_key, current_date_obj)
         if curr_err and not api_error_message : api_error_message = curr_err # Prioritize prev_err if both exist
         elif curr_err: api_error_message += f"; {curr_err}"
 
@@ -271,8 +341,14 @@ def analyze_stocks_for_dates(current_processing_date_str, previous_processing_da
             'equity_920_price': curr_920_price, 'equity_920_oi': curr_920_oi,
             'error_message': api_error_message
         }
-        all_stocks_data_for_db.append(stock_data_entry)
+        all_stocks_data_for_db[slot] = stock_data_entry
 
+    for stock_data_entry in all_stocks_data_for_db:
+        if 'equity_920_price' not in stock_data_entry: # Symbol or key resolution failed; nothing was fetched
+            continue
+        derived_symbol = stock_data_entry['stock_symbol']
+        prev_close, curr_920_price = stock_data_entry['prev_day_equity_close'], stock_data_entry['equity_920_price']
+        api_error_message = stock_data_entry['error_message']
         if prev_close is not None and curr_920_price is not None and prev_close != 0:
             percent_change = ((curr_920_price - prev_close) / prev_close) * 100
             logger.info(f"{derived_symbol}: Prev Close={prev_close}, 9:20 Price={curr_920_price}, %Change={percent_change:.2f}%")
@@ -285,30 +361,157 @@ def analyze_stocks_for_dates(current_processing_date_str, previous_processing_da
             # Add to main errors_list if this specific error is important to report
             # errors_list.append(calc_err) # Decided not to add this to main errors_list for now
 
-    store_data_to_db_for_analyzer(DB_PATH, raw_data_table, filtered_data_table, all_stocks_data_for_db, 
-                                  [(item['symbol'], item['percent_change']) for item in filtered_stocks_output])
+    rows_to_store = [entry for slot, entry in enumerate(all_stocks_data_for_db) if slot not in plan["reused_slots"]]
+    store_data_to_db_for_analyzer(DB_PATH, plan["current_date_str"], plan["previous_date_str"], rows_to_store,
+                                  [(item['symbol'], item['percent_change']) for item in filtered_stocks_output],
+                                  universe_size=len(all_stocks_data_for_db))
     
+    # An open circuit (bad token, upstream outage) is reported once, not once per skipped stock
+    circuit_errors = open_circuits(ACCESS_TOKEN)
+    for circuit_error in circuit_errors:
+        errors_list.append(f"{circuit_error['endpoint']}: circuit open ({circuit_error['reason']})")
+
     # Add API/Key errors to the main errors_list for the response
     for stock_entry in all_stocks_data_for_db:
         if stock_entry.get('error_message') and 'Instrument key not found' not in stock_entry['error_message'] and 'Symbol derivation failed' not in stock_entry['error_message']: # Filter out non-API errors
+            if circuit_errors and stock_entry['error_message'].startswith("Circuit open for"):
+                continue
             errors_list.append(f"{stock_entry['stock_symbol']}: {stock_entry['error_message']}")
 
 
-    return {
+    result = {
         "filtered_stocks": filtered_stocks_output,
-        "processed_stocks_count": processed_count,
+        "processed_stocks_count": plan["processed_count"],
         "errors_list": errors_list[:10] # Return only first 10 API related errors to keep response size manageable
     }
+    if circuit_errors:
+        result["circuit_breaker"] = circuit_errors
+    if plan["resume"]:
+        result["resumed"] = {"reused": len(plan["reused_slots"]), "refetched": len(plan["pending_fetches"])}
+    return result
+
+def _unexpected_fetch_error(e):
+    return None, None, f"Unexpected fetch error: {e}"
+
+def analyze_stocks_for_dates(current_processing_date_str, previous_processing_date_str, resume=False):
+    plan = _plan_analysis(current_processing_date_str, previous_processing_date_str, resume)
+    if "error" in plan:
+        return plan
+
+    # Issue the daily and 9:20 requests for every stock together; results come back in call order
+    fetch_calls = []
+    for _, _, instrument_key in plan["pending_fetches"]:
+        fetch_calls.append((fetch_historical_data_for_analyzer, (instrument_key, plan["previous_date_str"])))
+        fetch_calls.append((fetch_intraday_data_920_for_analyzer, (instrument_key, plan["current_date_obj"])))
+    # The first request goes out alone: with a bad token its 401 opens the circuit and the rest
+    # of the batch short-circuits instead of making ~200 failing calls
+    fetch_results = fetch_concurrently(fetch_calls, on_error=_unexpected_fetch_error, probe_first=True)
+    log_connection_stats()
+    candle_cache.log_stats()
+    candle_archive.log_stats()
+    return _finish_analysis(plan, fetch_results)
+
+async def analyze_stocks_for_dates_async(current_processing_date_str, previous_processing_date_str, resume=False):
+    """
+    asyncio form of analyze_stocks_for_dates with the same result. All fetches share one
+    AsyncUpstoxClient; the blocking plan/finish phases (master, SQLite) run in a worker thread.
+    """
+    plan = await asyncio.to_thread(_plan_analysis, current_processing_date_str, previous_processing_date_str, resume)
+    if "error" in plan:
+        return plan
+
+    async with AsyncUpstoxClient(ACCESS_TOKEN, API_BASE_URL) as client:
+        fetches = []
+        for _, _, instrument_key in plan["pending_fetches"]:
+            fetches.append(fetch_historical_data_for_analyzer_async(client, instrument_key, plan["previous_date_str"]))
+            fetches.append(fetch_intraday_data_920_for_analyzer_async(client, instrument_key, plan["current_date_obj"]))
+        fetch_results = [] # The first fetch runs alone, as in analyze_stocks_for_dates (probe_first)
+        if fetches:
+            fetch_results = await asyncio.gather(fetches[0], return_exceptions=True)
+        fetch_results += await asyncio.gather(*fetches[1:], return_exceptions=True)
+    fetch_results = [_unexpected_fetch_error(r) if isinstance(r, BaseException) else r for r in fetch_results]
+    candle_cache.log_stats()
+    candle_archive.log_stats()
+    return await asyncio.to_thread(_finish_analysis, plan, fetch_results)
+
+# Identical concurrent requests (same dates) share one run; its result is returned to each of
+# them. Runs for different previous dates still write the same trade_date's screen rows and
+# hits, so a lock per current date keeps one run's writes from interleaving with another's. The
+# locks are a fixed set of stripes, a date hashing to one of them, so they don't grow with the
+# dates ever requested; two dates sharing a stripe just run one after the other.
+analysis_flight = SingleFlight("analysis")
+TABLE_LOCK_STRIPES = 64
+_table_locks = [threading.Lock() for _ in range(TABLE_LOCK_STRIPES)]
+
+def _run_analysis(current_processing_date_str, previous_processing_date_str, resume=False):
+    with _table_locks[hash(current_processing_date_str) % TABLE_LOCK_STRIPES]:
+        if ANALYZE_ENGINE == "async":
+            return asyncio.run(analyze_stocks_for_dates_async(current_processing_date_str, previous_processing_date_str, resume))
+        return analyze_stocks_for_dates(current_processing_date_str, previous_processing_date_str, resume)
+
+def run_analysis(current_processing_date_str, previous_processing_date_str, resume=False):
+    """
+    Runs (or joins the in-flight run of) the analysis for these dates with the configured
+    engine. `resume` refetches only the stocks whose stored row is missing, incomplete or
+    errored, then recomputes the filtered set from all of the date's rows.
+    """
+    return analysis_flight.do((current_processing_date_str, previous_processing_date_str, resume),
+                              _run_analysis, current_processing_date_str, previous_processing_date_str, resume)
+
+def stored_analysis(current_processing_date_str, previous_processing_date_str):
+    """
+    The response of the stored run for these dates, read from the screen store without touching
+    Upstox, or None if there is none to serve: the date's latest run by this app must be
+    complete, for the same previous date and the current universe, with every fetched row
+    complete (_is_complete_row). A later run by another tool (fetch_store_equity_data,
+    database_storer) that wrote rows or hits for the date may have overwritten the app's, so
+    the date is screened afresh; imported legacy tables never overwrite rows and don't count.
+    Rows that failed symbol/key resolution are reported as a fresh run would report them. filtered_stocks come back ordered by symbol rather than in universe
+    order.
+    """
+    screen_store = open_screen_store(DB_PATH)
+    run = None
+    for candidate in screen_store.runs(current_processing_date_str):
+        if candidate['source'] == "app":
+            run = candidate
+            break
+        if candidate['status'] == 'complete' and (candidate['row_count'] or candidate['hit_count'] is not None):
+            return None # Another tool replaced rows or hits of this date after the app's last screen
+    if (run is None or run['status'] != 'complete' or run['previous_date'] != previous_processing_date_str
+            or run['universe_size'] != len(F_AND_O_STOCK_NAMES)):
+        return None
+
+    errors_list = []
+    for row in screen_store.rows(current_processing_date_str):
+        error_message = row['error_message'] or ''
+        if 'Symbol derivation failed' in error_message or 'Instrument key not found' in error_message:
+            errors_list.append(error_message)
+        elif row['previous_date'] != previous_processing_date_str:
+            continue # A symbol no longer in the universe, screened by an older run
+        elif not _is_complete_row(row, previous_processing_date_str):
+            return None # Errored or missing data: refetch (refresh=1 or resume=1) rather than serve it
+
+    return {
+        "filtered_stocks": [{"symbol": symbol, "percent_change": round(percent_change, 2)}
+                            for symbol, percent_change in screen_store.hits(current_processing_date_str)],
+        "processed_stocks_count": run['universe_size'],
+        "errors_list": errors_list[:10],
+        "stored_run": {"run_id": run['run_id'], "finished_at": run['finished_at']},
+    }
 
 # --- 5. Flask Application Setup ---
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes
+if os.environ.get("INSTRUMENT_REFRESHER_AUTOSTART", "1") == "1": # Benchmarks import this module without a server
+    instrument_master_refresher.start() # Begin loading the instrument master before the first request arrives
 
 @app.route('/api/analyze_stocks', methods=['GET'])
 def api_analyze_stocks():
     logger.info("Received request for /api/analyze_stocks")
     previous_date_str = request.args.get('previous_date')
     current_date_str = request.args.get('current_date')
+    resume = request.args.get('resume') == '1' # Refetch only missing/errored stocks of a stored run
+    refresh = request.args.get('refresh') == '1' # Run the analysis even if a complete run is stored
 
     if not previous_date_str or not current_date_str:
         logger.error("Missing date parameters.")
@@ -327,8 +530,18 @@ def api_analyze_stocks():
     # Providing other dates (e.g., 2025-05-22, 2025-05-23) will likely result in API authentication (401) errors
     # for each stock, and thus 'None' for all price/OI data.
     # The 'filtered_stocks' list will likely be empty. This is expected behavior given the token constraint.
+    if not refresh and not resume:
+        try:
+            stored_result = stored_analysis(current_date_str, previous_date_str)
+        except sqlite3.Error as e: # Fall through to a fresh run
+            logger.error(f"Could not read the stored run for {current_date_str}: {e}")
+            stored_result = None
+        if stored_result:
+            logger.info(f"Serving stored run {stored_result['stored_run']['run_id']} for {current_date_str}.")
+            return jsonify(stored_result), 200
+
     try:
-        analysis_result = analyze_stocks_for_dates(current_date_str, previous_date_str)
+        analysis_result = run_analysis(current_date_str, previous_date_str, resume)
         if "error" in analysis_result and ("instrument master" in analysis_result["error"] or "database" in analysis_result["error"]):
              # If there's a critical setup error, return 500
             return jsonify(analysis_result), 500
@@ -337,6 +550,49 @@ def api_analyze_stocks():
         logger.critical(f"Unexpected error during stock analysis: {e}", exc_info=True)
         return jsonify({"error": "An unexpected internal server error occurred."}), 500
 
+@app.route('/api/candle_cache', methods=['GET'])
+def api_candle_cache():
+    """Hit/miss counters of the candle cache (and, under "archive", the candle archive) since the server started."""
+    return jsonify({**candle_cache.log_stats(), "archive": candle_archive.log_stats()}), 200
+
+@app.route('/api/screen_runs', methods=['GET'])
+def api_screen_runs():
+    """Stored runs, newest first (?trade_date= for one date, ?limit=, default 50, at most SCREEN_RUNS_MAX_LIMIT). Never calls Upstox."""
+    trade_date = request.args.get('trade_date')
+    try:
+        if trade_date:
+            datetime.strptime(trade_date, '%Y-%m-%d')
+        limit = min(max(int(request.args.get('limit', 50)), 1), SCREEN_RUNS_MAX_LIMIT) # SQLite reads a negative LIMIT as none
+    except ValueError:
+        return jsonify({"error": "Use trade_date=YYYY-MM-DD and an integer limit."}), 400
+    try:
+        return jsonify({"runs": open_screen_store(DB_PATH).runs(trade_date, limit=limit)}), 200
+    except sqlite3.Error as e:
+        logger.error(f"Could not read stored runs: {e}")
+        return jsonify({"error": "Failed to read the database."}), 500
+
+@app.route('/api/screen_runs/<trade_date>', methods=['GET'])
+def api_screen_run_results(trade_date):
+    """trade_date's stored hits and rows, with its runs. Never calls Upstox."""
+    try:
+        datetime.strptime(trade_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Please use YYYY-MM-DD."}), 400
+    try:
+        screen_store = open_screen_store(DB_PATH)
+        runs = screen_store.runs(trade_date)
+        if not runs:
+            return jsonify({"error": f"No stored run for {trade_date}."}), 404
+        return jsonify({
+            "trade_date": trade_date, "runs": runs,
+            "filtered_stocks": [{"symbol": symbol, "percent_change": round(percent_change, 2)}
+                                for symbol, percent_change in screen_store.hits(trade_date)],
+            "rows": screen_store.rows(trade_date),
+        }), 200
+    except sqlite3.Error as e:
+        logger.error(f"Could not read stored results for {trade_date}: {e}")
+        return jsonify({"error": "Failed to read the database."}), 500
+
 if __name__ == '__main__':
     # Note: For production, use a proper WSGI server like Gunicorn or Waitress.
     # Flask's development server is not suitable for production.
@@ -344,6 +600,7 @@ if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=5001) # debug=False for cleaner logs in this context
     # To test: After running, open browser to e.g., 
     # http://localhost:5001/api/analyze_stocks?previous_date=2025-05-22&current_date=2025-05-23
+    # Add &resume=1 after a partly failed run to refetch only the stocks that failed.
     # (Expect API errors in logs and empty filtered_stocks due to token/date mismatch for these example dates)
     # Or use dates for which token is valid if you want to see data processing:
     # http://localhost:5001/api/analyze_stocks?previous_date=2025-05-16&current_date=2025-05-17
@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime, time
+
+from bench_common import session_minute_candles, time_call, report
+from candle_extract import candles_at_times
+
+# Benchmark: finding the 09:20 candle (and several target times) in 1-minute responses. The
+# original fetchers decoded the whole response and ran datetime.fromisoformat on candles until
+# a match; candle_extract bisects on the expected timestamp string, or pulls the candle straight
+# out of the raw response bytes.
+
+SESSION_DAY = date(2025, 5, 23)
+TARGET = time(9, 20)
+TARGETS = [time(9, 20), time(9, 30), time(10, 0), time(15, 29)]
+UNIVERSE_SIZE = 200 # Minute responses in one analysis run
+
+def original(body, targets):
+    """The fetchers' loop, generalised to several targets (stops once all are found)."""
+    found = {}
+    for candle in json.loads(body).get("data", {}).get("candles"):
+        if len(candle) >= 7:
+            dt_obj = datetime.fromisoformat(candle[0])
+            if dt_obj.date() == SESSION_DAY and dt_obj.time() in targets:
+                found[dt_obj.time()] = candle
+                if len(found) == len(targets):
+                    break
+    return found
+
+def bisected(body, targets):
+    return candles_at_times(json.loads(body).get("data", {}).get("candles"), SESSION_DAY, targets)
+
+def raw(body, targets):
+    return candles_at_times(body, SESSION_DAY, targets)
+
+def main():
+    bodies = [json.dumps({"status": "success", "data": {"candles": session_minute_candles(SESSION_DAY.isoformat(), 100.0 + i)}}).encode()
+              for i in range(UNIVERSE_SIZE)]
+    for targets, label in (([TARGET], "09:20 only"), (TARGETS, f"{len(TARGETS)} target times")):
+        expected = original(bodies[0], targets)
+        assert bisected(bodies[0], targets) == expected == raw(bodies[0], targets)
+        print(f"{label}, {len(json.loads(bodies[0])['data']['candles'])} candles per response:")
+        baseline = None
+        for name, fn in (("decode + parse scan (original)", original), ("decode + bisect", bisected), ("raw bytes", raw)):
+            per_response_s, _ = time_call(lambda: [fn(bodies[0], targets) for _ in range(100)])
+            universe_s, _ = time_call(lambda: [fn(body, targets) for body in bodies])
+            report(f"  {name}, per response", per_response_s / 100, baseline and baseline[0])
+            report(f"  {name}, {UNIVERSE_SIZE} responses", universe_s, baseline and baseline[1])
+            baseline = baseline or (per_response_s / 100, universe_s)
+        print()
+
+if __name__ == "__main__":
+    main()
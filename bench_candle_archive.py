@@ -0,0 +1,112 @@
+import os
+import json
+import random
+import logging
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+from bench_common import time_call, report
+from candle_cache import CandleCache
+from candle_archive import CandleArchive, encode_session, decode_session, to_candles
+from candle_extract import candles_at_times
+from instrument_master import IST
+
+# Benchmark: full 1-minute sessions kept as candle JSON (candle_cache's rows) against the
+# compressed archive (candle_archive). Sessions are random walks on a 0.05 tick with per-minute
+# volume and a slowly moving OI, like an F&O stock's.
+#  - size per session: JSON, JSON + zlib, archive blob
+#  - encode / decode one session
+#  - point lookup: the 11:00 candle of one stored session (JSON: load + parse + bisect;
+#    archive: candle_at, first from SQLite, then from its decoded-session cache)
+#  - range lookup: one instrument's 10:00-11:00 candles over every stored session
+
+N_INSTRUMENTS = 20
+N_SESSIONS = 20
+CANDLES_PER_SESSION = 375 # 09:15-15:29
+FIRST_DATE = date(2025, 4, 1)
+POINT_TIME = time(11, 0)
+
+def make_session(trading_date, seed):
+    rng = random.Random(seed)
+    price, oi = rng.uniform(100, 3000), rng.randrange(10**5, 10**7)
+    start = datetime.combine(trading_date, time(9, 15), IST)
+    candles = []
+    for m in range(CANDLES_PER_SESSION):
+        open_ = round(price / 0.05) * 0.05
+        close = round((price + rng.gauss(0, price * 0.001)) / 0.05) * 0.05
+        high = max(open_, close) + rng.randrange(5) * 0.05
+        low = min(open_, close) - rng.randrange(5) * 0.05
+        candles.append([(start + timedelta(minutes=m)).isoformat(), round(open_, 2), round(high, 2), round(low, 2),
+                        round(close, 2), rng.randrange(100, 200000), oi])
+        price = close
+        if rng.random() < 0.3:
+            oi += rng.randrange(-5000, 5000)
+    return candles[::-1] # Upstox returns newest first
+
+def main():
+    logging.disable(logging.INFO)
+    import zlib
+    work_dir = tempfile.mkdtemp()
+    dates = [FIRST_DATE + timedelta(days=d) for d in range(N_SESSIONS)]
+    keys = [f"NSE_EQ|INE{k:06d}01" for k in range(N_INSTRUMENTS)]
+    sessions = {key: {d.isoformat(): make_session(d, hash((key, d))) for d in dates} for key in keys}
+
+    cache = CandleCache(os.path.join(work_dir, "candles.db"))
+    archive = CandleArchive(os.path.join(work_dir, "candle_archive.db"))
+    for key, by_day in sessions.items():
+        cache.put_days(key, "minutes", 1, by_day)
+        archive.put_days(key, by_day)
+
+    sample = sessions[keys[0]][dates[0].isoformat()]
+    json_bytes = len(json.dumps(sample))
+    blob = encode_session(sample)
+    print(f"One {CANDLES_PER_SESSION}-candle session:")
+    print(f"  JSON (candle_cache)        {json_bytes:>8,} bytes")
+    print(f"  JSON + zlib                {len(zlib.compress(json.dumps(sample).encode(), 6)):>8,} bytes")
+    print(f"  archive blob               {len(blob):>8,} bytes  ({json_bytes / len(blob):.1f}x smaller)")
+    for store in (cache, archive):
+        store._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_sizes = {name: os.path.getsize(os.path.join(work_dir, name)) for name in ("candles.db", "candle_archive.db")}
+    print(f"  {N_INSTRUMENTS * N_SESSIONS} sessions on disk: candle_cache {db_sizes['candles.db'] / 1e6:.2f} MB, "
+          f"archive {db_sizes['candle_archive.db'] / 1e6:.2f} MB\n")
+
+    sample_json = json.dumps(sample)
+    json_decode_s, _ = time_call(lambda: json.loads(sample_json))
+    report("encode session (archive)", time_call(lambda: encode_session(sample))[0])
+    report("parse session (JSON)", json_decode_s)
+    report("decode session (archive, columns)", time_call(lambda: decode_session(blob))[0], json_decode_s)
+    report("decode session (archive, candle lists)", time_call(lambda: to_candles(decode_session(blob)))[0], json_decode_s)
+
+    trading_date = dates[N_SESSIONS // 2]
+    at = datetime.combine(trading_date, POINT_TIME, IST)
+    json_point_s, json_candle = time_call(
+        lambda: candles_at_times(cache.get(keys[0], "minutes", 1, trading_date.isoformat()), trading_date, [POINT_TIME])[POINT_TIME])
+    cold_archive = CandleArchive(archive.path, decoded_sessions_cached=0)
+    cold_point_s, cold_candle = time_call(lambda: cold_archive.candle_at(keys[0], at))
+    warm_point_s, warm_candle = time_call(lambda: archive.candle_at(keys[0], at))
+    assert json_candle == cold_candle == warm_candle, "Lookups disagree"
+    print()
+    report("point lookup, JSON cache + bisect", json_point_s)
+    report("point lookup, archive from SQLite", cold_point_s, json_point_s)
+    report("point lookup, archive decoded-session cache", warm_point_s, json_point_s)
+
+    def json_range():
+        selected = []
+        for d in dates:
+            selected.extend(c for c in cache.get(keys[1], "minutes", 1, d.isoformat()) if "T10:00" <= c[0][10:16] <= "T11:00")
+        return selected
+    start, end = (datetime.combine(dates[0], time(10, 0), IST), datetime.combine(dates[-1], time(11, 0), IST))
+    def archive_range():
+        # Per-session 10:00-11:00 windows, selected from one range read
+        columns = cold_archive.candles_between(keys[1], start, end)
+        minute = (columns["timestamp"] + 19800) % 86400 # IST seconds since midnight
+        return columns["close"][(minute >= 36000) & (minute <= 39600)]
+    json_range_s, json_rows = time_call(json_range)
+    archive_range_s, closes = time_call(archive_range)
+    assert [c[4] for c in sorted(json_rows)] == closes.tolist(), "Range lookups disagree"
+    print()
+    report(f"10:00-11:00 over {N_SESSIONS} sessions, JSON cache", json_range_s)
+    report(f"10:00-11:00 over {N_SESSIONS} sessions, archive", archive_range_s, json_range_s)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import logging
+import tempfile
+from datetime import date
+
+os.environ.setdefault("INSTRUMENT_REFRESHER_AUTOSTART", "0")
+for name in ("UPSTOX_RATE_LIMIT_PER_SECOND", "UPSTOX_RATE_LIMIT_PER_MINUTE"): # Measure the cache, not Upstox's limits
+    os.environ.setdefault(name, "0")
+
+import app
+from bench_common import start_mock_candle_server, time_call, report
+from fetch_engine import fetch_concurrently
+from daily_candles import DailyCandleRanges
+from candle_cache import CandleCache
+from candle_archive import CandleArchive
+
+# Benchmark: the daily + 9:20 fetches of one analysis of a past date, run cold (empty candle
+# cache, every candle fetched from the local mock) and then again in a fresh process-state
+# (new DailyCandleRanges, so only the SQLite cache can answer) with the mock stopped, which
+# proves the repeat runs entirely offline. The 1-minute sessions of past dates are answered by
+# the candle archive, the daily candles by the candle cache.
+
+LATENCY_SECONDS = 0.05
+N_STOCKS = 100
+PREVIOUS_DAY = "2025-05-22"
+CURRENT_DAY = date(2025, 5, 23)
+
+def main():
+    logging.disable(logging.INFO)
+    app.API_BASE_URL = start_mock_candle_server(LATENCY_SECONDS)
+    work_dir = tempfile.mkdtemp()
+    cache_path = os.path.join(work_dir, "candles.db")
+    archive_path = os.path.join(work_dir, "candle_archive.db")
+    keys = [f"NSE_EQ|INE{i:06d}01" for i in range(N_STOCKS)]
+    calls = []
+    for key in keys:
+        calls.append((app.fetch_historical_data_for_analyzer, (key, PREVIOUS_DAY)))
+        calls.append((app.fetch_intraday_data_920_for_analyzer, (key, CURRENT_DAY)))
+
+    def run():
+        # A restarted server: nothing in memory, only what the SQLite file holds
+        app.candle_cache = CandleCache(cache_path)
+        app.candle_archive = CandleArchive(archive_path)
+        app.daily_candle_ranges = DailyCandleRanges(app.ACCESS_TOKEN, app.API_BASE_URL, cache=app.candle_cache)
+        results = fetch_concurrently(calls)
+        return results, {"cache": app.candle_cache.log_stats(), "archive": app.candle_archive.log_stats()}
+
+    print(f"{N_STOCKS} stocks, {len(calls)} lookups, {LATENCY_SECONDS * 1000:.0f} ms per request:")
+    cold_s, (cold, cold_stats) = time_call(run, repeat=1)
+    assert all(err is None for _, _, err in cold), "Mock fetches returned errors"
+    app.API_BASE_URL = app.daily_candle_ranges.api_base_url = "http://127.0.0.1:9" # Nothing listens here
+    warm_s, (warm, warm_stats) = time_call(run, repeat=1)
+    assert warm == cold, "Cached results differ from fetched ones"
+    report("  cold (fetched from the mock)", cold_s)
+    print(f"    cache {cold_stats['cache']['hits']} hits, {cold_stats['cache']['misses']} misses, {cold_stats['cache']['writes']} rows written; "
+          f"archive {cold_stats['archive']['misses']} misses, {cold_stats['archive']['sessions_written']} sessions written")
+    report("  warm (SQLite cache + archive, API unreachable)", warm_s, cold_s)
+    print(f"    cache {warm_stats['cache']['hits']} hits, {warm_stats['cache']['misses']} misses; "
+          f"archive {warm_stats['archive']['hits']} hits, {warm_stats['archive']['misses']} misses")
+
+if __name__ == "__main__":
+    main()
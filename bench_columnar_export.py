@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import logging
+import tempfile
+from datetime import date, datetime, timedelta
+
+from bench_common import time_call, report
+from screen_store import ScreenStore
+from candle_cache import CandleCache
+import columnar_export
+
+# Benchmark: loading months of stored data for analysis.
+#  - row cursor: what the analysis scripts did, one query per date over the screen tables (or
+#    per instrument-day over the candle cache), building a dict per row.
+#  - columnar_export.read_columns: the same selection read in chunks and turned into NumPy
+#    arrays (and an arrow Table, when pyarrow is installed), and with only the columns a
+#    % change study needs.
+# The exports also report how many chunks they streamed, which bounds their memory.
+
+N_SYMBOLS = 1000
+N_DATES = 120 # About six months of sessions
+N_INSTRUMENTS = 50
+N_CANDLE_DATES = 40
+CANDLES_PER_SESSION = 375 # 09:15-15:29 in 1-minute candles
+FIRST_DATE = date(2025, 1, 1)
+STUDY_COLUMNS = ("trade_date", "symbol", "prev_day_equity_close", "equity_920_price") # What a % change study reads
+
+def make_screen_db(path, trade_dates):
+    store = ScreenStore(path, migrate=False)
+    for i, trade_date in enumerate(trade_dates):
+        rows = [{'stock_symbol': f"SYM{s:05d}", 'prev_day_equity_close': 100.0 + s, 'prev_day_equity_oi': s * 10,
+                 'equity_920_price': 101.0 + s + i % 7, 'equity_920_oi': s * 11, 'error_message': None}
+                for s in range(N_SYMBOLS)]
+        hits = [(row['stock_symbol'], 2.5) for row in rows[::4]]
+        store.store_run(trade_date, None, rows, hits, source="bench")
+    store.close()
+
+def make_candle_cache(path, trading_dates):
+    cache = CandleCache(path)
+    for k in range(N_INSTRUMENTS):
+        by_day = {}
+        for trading_date in trading_dates:
+            start = datetime.fromisoformat(f"{trading_date}T09:15:00+05:30")
+            by_day[trading_date] = [[(start + timedelta(minutes=m)).isoformat(), 100.0 + k, 100.5 + k, 99.5 + k, 100.2 + k, 1000 + m, 0]
+                                    for m in range(CANDLES_PER_SESSION)]
+        cache.put_days(f"NSE_EQ|INE{k:06d}01", "minutes", 1, by_day)
+
+def screen_rows_by_cursor(path, trade_dates):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = []
+    for trade_date in trade_dates:
+        for row in conn.execute("SELECT * FROM screen_rows WHERE trade_date = ?", (trade_date,)):
+            rows.append(dict(row))
+    conn.close()
+    return rows
+
+def candles_by_cursor(path, instrument_keys, trading_dates):
+    import json
+    conn = sqlite3.connect(path)
+    rows = []
+    for instrument_key in instrument_keys:
+        for trading_date in trading_dates:
+            (candles_json,) = conn.execute("SELECT candles FROM candles WHERE instrument_key = ? AND unit = 'minutes' AND interval = 1 AND trading_date = ?",
+                                           (instrument_key, trading_date)).fetchone()
+            for ts, o, h, l, c, v, oi in json.loads(candles_json):
+                rows.append({'instrument_key': instrument_key, 'timestamp': datetime.fromisoformat(ts),
+                             'open': o, 'high': h, 'low': l, 'close': c, 'volume': v, 'oi': oi})
+    conn.close()
+    return rows
+
+def compare(label, n_rows, baseline, loaders):
+    baseline_s, _ = time_call(baseline, repeat=3)
+    print(f"{label}: {n_rows:,} rows")
+    report("  row cursor, dict per row", baseline_s)
+    for name, load in loaders.items():
+        seconds, _ = time_call(load, repeat=3)
+        report(f"  read_columns, {name}", seconds, baseline_s)
+        print(f"    {n_rows / seconds / 1e6:,.2f} M rows/s")
+
+def main():
+    logging.disable(logging.INFO)
+    work_dir = tempfile.mkdtemp()
+    formats = ["numpy"] + (["arrow"] if columnar_export.pa is not None else [])
+    if columnar_export.pa is None:
+        print("pyarrow not installed; measuring the NumPy output only\n")
+
+    trade_dates = [(FIRST_DATE + timedelta(days=d)).isoformat() for d in range(N_DATES)]
+    screen_path = os.path.join(work_dir, "screen.db")
+    make_screen_db(screen_path, trade_dates)
+    loaders = {fmt: (lambda fmt=fmt: columnar_export.read_columns("screen_rows", screen_path, trade_dates[0], trade_dates[-1], fmt=fmt))
+               for fmt in formats}
+    loaders[f"numpy, {len(STUDY_COLUMNS)} columns"] = lambda: columnar_export.read_columns(
+        "screen_rows", screen_path, trade_dates[0], trade_dates[-1], columns=STUDY_COLUMNS, fmt="numpy")
+    compare(f"screen_rows, {N_DATES} dates x {N_SYMBOLS} symbols", N_DATES * N_SYMBOLS,
+            lambda: screen_rows_by_cursor(screen_path, trade_dates), loaders)
+
+    candle_dates = trade_dates[:N_CANDLE_DATES]
+    candle_path = os.path.join(work_dir, "candles.db")
+    make_candle_cache(candle_path, candle_dates)
+    instrument_keys = [f"NSE_EQ|INE{k:06d}01" for k in range(N_INSTRUMENTS)]
+    compare(f"\ncandles, {N_INSTRUMENTS} instruments x {N_CANDLE_DATES} sessions", N_INSTRUMENTS * N_CANDLE_DATES * CANDLES_PER_SESSION,
+            lambda: candles_by_cursor(candle_path, instrument_keys, candle_dates),
+            {fmt: (lambda fmt=fmt: columnar_export.read_columns("candles", candle_path, candle_dates[0], candle_dates[-1],
+                                                                 instrument_keys, "minutes", 1, fmt=fmt))
+             for fmt in formats})
+
+    for fmt in formats:
+        out_path = os.path.join(work_dir, f"screen_rows.{'parquet' if fmt == 'arrow' else 'npz'}")
+        seconds, summary = time_call(lambda: columnar_export.export("screen_rows", out_path, screen_path, fmt=fmt), repeat=1)
+        report(f"\nexport screen_rows ({fmt}), {summary['chunks']} chunks of <= {columnar_export.CHUNK_ROWS:,} rows", seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import time
+import random
+import statistics
+
+# Shared helpers for the bench_*.py scripts. Everything here is synthetic so the
+# benchmarks run offline and without an access token.
+
+UNIVERSE_SIZE = 100 # Roughly the size of F_AND_O_STOCK_NAMES
+
+def make_synthetic_instruments(n_equities=2500, n_derivatives=120000, seed=7):
+    """
+    Builds an instrument master shaped like NSE.json.gz: a few thousand NSE_EQ rows mixed
+    into a long tail of NSE_FO contracts, with the same field names as upstream.
+    """
+    rng = random.Random(seed)
+    instruments = []
+    equity_symbols = [f"SYM{i:05d}" for i in range(n_equities)]
+    for i, symbol in enumerate(equity_symbols):
+        isin = f"INE{i:06d}01"
+        instruments.append({
+            "segment": "NSE_EQ", "name": f"{symbol} LIMITED", "exchange": "NSE", "isin": isin,
+            "instrument_type": "EQ", "instrument_key": f"NSE_EQ|{isin}", "lot_size": 1,
+            "freeze_quantity": 100000.0, "exchange_token": str(1000 + i), "tick_size": 5.0,
+            "trading_symbol": symbol, "short_name": symbol.title(), "security_type": "NORMAL",
+        })
+    base_expiry_ms = 1748457000000
+    for j in range(n_derivatives):
+        underlying = equity_symbols[rng.randrange(n_equities)]
+        instrument_type = rng.choice(("FUT", "CE", "PE", "CE", "PE"))
+        expiry = base_expiry_ms + rng.randrange(3) * 28 * 86400000
+        instruments.append({
+            "segment": "NSE_FO", "name": f"{underlying} LIMITED", "exchange": "NSE", "expiry": expiry,
+            "instrument_type": instrument_type, "asset_symbol": underlying, "underlying_symbol": underlying,
+            "instrument_key": f"NSE_FO|{100000 + j}", "lot_size": rng.choice((250, 500, 750)),
+            "freeze_quantity": 10000.0, "exchange_token": str(100000 + j), "minimum_lot": 250,
+            "asset_key": f"NSE_EQ|{underlying}", "underlying_key": f"NSE_EQ|{underlying}", "tick_size": 5.0,
+            "asset_type": "EQUITY", "underlying_type": "EQUITY",
+            "trading_symbol": f"{underlying} {j} {instrument_type}", "strike_price": float(rng.randrange(100, 5000)),
+            "qty_multiplier": 1.0,
+        })
+    rng.shuffle(instruments) # Upstream does not group equities first, so scans can't stop early
+    return instruments
+
+def pick_universe(instruments, size=UNIVERSE_SIZE, seed=11):
+    """Picks `size` equity trading symbols, the way the F&O universe does."""
+    equities = [i['trading_symbol'] for i in instruments if i.get('segment') == 'NSE_EQ']
+    return random.Random(seed).sample(equities, size)
+
+def time_call(fn, repeat=5):
+    """Runs fn `repeat` times and returns (median_seconds, last_result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def report(label, seconds, baseline_seconds=None):
+    speedup = f"  ({baseline_seconds / seconds:,.1f}x)" if baseline_seconds and seconds else ""
+    print(f"{label:<45} {seconds * 1000:>12.3f} ms{speedup}")
+
+# --- Local mock of the Upstox historical-candle API ---
+
+def session_minute_candles(trading_date, base_price=100.0):
+    """A full 09:15-15:29 session of 1-minute candles in Upstox's [ts, o, h, l, c, volume, oi] shape."""
+    candles = []
+    for minute in range(375):
+        hh, mm = divmod(9 * 60 + 15 + minute, 60)
+        price = round(base_price + minute * 0.05, 2)
+        candles.append([f"{trading_date}T{hh:02d}:{mm:02d}:00+05:30", price, price + 0.1, price - 0.1, price, 1000 + minute, 0])
+    candles.reverse() # Upstox returns newest first
+    return candles
+
+def start_mock_candle_server(latency_seconds=0.05, limit_per_second=None, **config):
+    """
+    Starts upstox_mock_server in a separate process (so it doesn't share the benchmark's GIL)
+    answering every request after `latency_seconds`, and returns its base URL. Its minutes route
+    returns the session before the requested date (the API's D+1 quirk). With `limit_per_second`,
+    requests beyond that many in any sliding second get a 429 with Retry-After, like the real
+    API. Other keyword arguments are passed through as mock config (e.g. fail_status=503).
+    """
+    from upstox_mock_server import start_in_background
+    return start_in_background(latency_seconds=latency_seconds, limit_per_second=limit_per_second, **config)
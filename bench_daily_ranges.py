@@ -0,0 +1,58 @@
+import os
+import logging
+from datetime import date, timedelta
+from urllib.parse import quote
+
+for name in ("UPSTOX_RATE_LIMIT_PER_SECOND", "UPSTOX_RATE_LIMIT_PER_MINUTE"): # Measure requests, not Upstox's limits
+    os.environ.setdefault(name, "0")
+
+from bench_common import start_mock_candle_server, time_call, report
+from fetch_engine import fetch_concurrently
+from daily_candles import DailyCandleRanges
+from upstox_http import upstox_get, connection_stats
+
+# Benchmark: a multi-date workflow (each stock's close on each of the last N sessions, e.g.
+# comparing several prior closes or backfilling) against the local mock. The per-day fetcher
+# makes one /days/1/{date} request per (stock, date); DailyCandleRanges makes one range
+# request per stock and answers every other date from it.
+
+LATENCY_SECONDS = 0.05
+N_STOCKS = 100
+N_SESSIONS = 10
+TOKEN = "bench-token"
+
+def main():
+    logging.disable(logging.WARNING)
+    base_url = start_mock_candle_server(LATENCY_SECONDS)
+    keys = [f"NSE_EQ|INE{i:06d}01" for i in range(N_STOCKS)]
+    sessions, day = [], date(2025, 5, 23)
+    while len(sessions) < N_SESSIONS:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            sessions.append(day.isoformat())
+
+    def per_day(key, date_str):
+        response = upstox_get(TOKEN, f"{base_url}/v3/historical-candle/{quote(key)}/days/1/{date_str}", timeout=15)
+        response.raise_for_status()
+        return response.json()["data"]["candles"][0][4]
+
+    ranges = DailyCandleRanges(TOKEN, base_url, lookback_days=(date(2025, 5, 23) - date.fromisoformat(sessions[-1])).days)
+
+    def ranged(key, date_str):
+        return ranges.candle(key, date_str)[4]
+
+    print(f"{N_STOCKS} stocks x {N_SESSIONS} sessions, {LATENCY_SECONDS * 1000:.0f} ms per request:")
+    # Newest date first, as a screen looking back from its previous date would ask
+    calls = [(key, date_str) for date_str in sessions for key in keys]
+    results, baseline = {}, None
+    for label, fn in (("one request per (stock, date)", per_day), ("one range request per stock", ranged)):
+        before = connection_stats()["requests"]
+        seconds, results[label] = time_call(lambda: fetch_concurrently([(fn, args) for args in calls]), repeat=1)
+        sent = connection_stats()["requests"] - before
+        report(f"  {label}", seconds, baseline)
+        print(f"    {sent} requests")
+        baseline = baseline or seconds
+    assert len({tuple(r) for r in results.values()}) == 1, "Range and per-day closes differ"
+
+if __name__ == "__main__":
+    main()
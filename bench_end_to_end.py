@@ -0,0 +1,77 @@
+import os
+import asyncio
+import logging
+import tempfile
+
+# Benchmark: one full analysis of the F&O universe per engine, end to end (instrument master
+# download and symbol resolution, the daily + 9:20 fetches, the filter and the SQLite write)
+# against upstox_mock_server, which every fetcher reaches through UPSTOX_API_BASE_URL. Each run
+# starts with empty candle caches so it makes the same requests. The last case serves 401s to
+# show a bad token costing one request instead of a universe of failures.
+
+from upstox_mock_server import start_in_background, set_config, get_stats, INSTRUMENT_MASTER_PATH
+
+LATENCY_SECONDS = 0.05
+JITTER_SECONDS = 0.1
+PREVIOUS_DAY = "2025-05-22"
+CURRENT_DAY = "2025-05-23"
+
+def main():
+    base_url = start_in_background(latency_seconds=LATENCY_SECONDS)
+    work_dir = tempfile.mkdtemp()
+    os.environ["UPSTOX_API_BASE_URL"] = base_url
+    os.environ["UPSTOX_INSTRUMENT_MASTER_URL"] = base_url + INSTRUMENT_MASTER_PATH
+    os.environ["INSTRUMENT_CACHE_DIR"] = work_dir
+    os.environ["INSTRUMENT_REFRESHER_AUTOSTART"] = "0"
+    # The engines are measured against the mock, not Upstox's limits
+    for name in ("UPSTOX_RATE_LIMIT_PER_SECOND", "UPSTOX_RATE_LIMIT_PER_MINUTE"):
+        os.environ.setdefault(name, "0")
+
+    import app
+    from bench_common import time_call, report
+    from daily_candles import DailyCandleRanges
+    from candle_cache import CandleCache
+    from candle_archive import CandleArchive
+
+    logging.disable(logging.INFO) # Per-stock log lines would dominate the timings
+    app.DB_PATH = os.path.join(work_dir, "analysis.db") # Keep the repo's upstox_data_v2.db untouched
+    assert app.get_instrument_master() is not None, "Mock instrument master failed to load"
+
+    engines = {
+        "threads": lambda: app.analyze_stocks_for_dates(CURRENT_DAY, PREVIOUS_DAY),
+        "async": lambda: asyncio.run(app.analyze_stocks_for_dates_async(CURRENT_DAY, PREVIOUS_DAY)),
+    }
+
+    def cold(run):
+        def fresh():
+            cache_dir = tempfile.mkdtemp()
+            app.candle_cache = CandleCache(os.path.join(cache_dir, "candles.db"))
+            app.candle_archive = CandleArchive(os.path.join(cache_dir, "candle_archive.db"))
+            app.daily_candle_ranges = DailyCandleRanges(app.ACCESS_TOKEN, app.API_BASE_URL, cache=app.candle_cache)
+            return run()
+        return fresh
+
+    n_stocks = len(app.F_AND_O_STOCK_NAMES)
+    cases = (("healthy", {}),
+             (f"+ up to {JITTER_SECONDS * 1000:.0f} ms jitter", {"jitter_seconds": JITTER_SECONDS}),
+             ("bad token (401)", {"jitter_seconds": 0.0, "fail_status": 401}))
+    for run in engines.values(): # Warm-up: thread pool, connections, first SQLite files
+        cold(run)()
+    print(f"Mock API at {base_url}, {LATENCY_SECONDS * 1000:.0f} ms per request, {n_stocks} stocks per run\n")
+    for label, config in cases:
+        set_config(base_url, **config)
+        print(f"{label}:")
+        reference = None
+        for engine, run in engines.items():
+            get_stats(base_url, reset=True)
+            seconds, result = time_call(cold(run), repeat=1)
+            requests_made = sum(n for by_status in get_stats(base_url).values() for n in by_status.values())
+            reference = reference or result
+            assert result.get("filtered_stocks") == reference.get("filtered_stocks"), "Engines disagree"
+            report(f"  {engine}", seconds)
+            print(f"    {n_stocks / seconds:,.0f} stocks/s, {requests_made} requests, "
+                  f"{len(result.get('filtered_stocks', []))} passed the filter, {len(result.get('errors_list', []))} errors reported")
+        print()
+
+if __name__ == "__main__":
+    main()
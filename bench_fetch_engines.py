@@ -0,0 +1,79 @@
+import os
+import asyncio
+import tempfile
+import logging
+from datetime import date
+
+os.environ.setdefault("INSTRUMENT_REFRESHER_AUTOSTART", "0")
+# The engines are measured against the mock, not Upstox's limits: admit everything at once
+for name in ("UPSTOX_RATE_LIMIT_PER_SECOND", "UPSTOX_RATE_LIMIT_PER_MINUTE"):
+    os.environ.setdefault(name, "0")
+for name in ("UPSTOX_CONCURRENCY_INITIAL", "UPSTOX_CONCURRENCY_MAX"):
+    os.environ.setdefault(name, "1024")
+
+import app
+from bench_common import start_mock_candle_server, time_call, report
+from fetch_engine import fetch_concurrently, FETCH_MAX_WORKERS
+from upstox_async import AsyncUpstoxClient
+from daily_candles import DailyCandleRanges
+from candle_cache import CandleCache
+from candle_archive import CandleArchive
+
+# Benchmark: the daily + 9:20 fetches for a universe against a local mock API that answers
+# each request after a fixed latency. Compares the original sequential loop, the thread pool
+# (fetch_engine) and the asyncio client (upstox_async).
+
+LATENCY_SECONDS = 0.05
+PREVIOUS_DAY = "2025-05-22"
+CURRENT_DAY = date(2025, 5, 23)
+
+def cold(fn):
+    """Runs fn with empty candle caches, so every engine makes the same requests."""
+    def run():
+        work_dir = tempfile.mkdtemp()
+        app.candle_cache = CandleCache(os.path.join(work_dir, "candles.db"))
+        app.candle_archive = CandleArchive(os.path.join(work_dir, "candle_archive.db"))
+        app.daily_candle_ranges = DailyCandleRanges(app.ACCESS_TOKEN, app.API_BASE_URL, cache=app.candle_cache)
+        return fn()
+    return run
+
+def sequential(calls):
+    return [fn(*args) for fn, args in calls]
+
+async def gather_async(keys):
+    async with AsyncUpstoxClient(app.ACCESS_TOKEN, app.API_BASE_URL) as client:
+        fetches = []
+        for key in keys:
+            fetches.append(app.fetch_historical_data_for_analyzer_async(client, key, PREVIOUS_DAY))
+            fetches.append(app.fetch_intraday_data_920_for_analyzer_async(client, key, CURRENT_DAY))
+        return await asyncio.gather(*fetches)
+
+def main():
+    logging.disable(logging.INFO) # Per-request log lines would dominate the timings
+    app.API_BASE_URL = start_mock_candle_server(LATENCY_SECONDS)
+    print(f"Mock API at {app.API_BASE_URL}, {LATENCY_SECONDS * 1000:.0f} ms per request\n")
+
+    for n_stocks in (100, 1000):
+        keys = [f"NSE_EQ|INE{i:06d}01" for i in range(n_stocks)]
+        calls = []
+        for key in keys:
+            calls.append((app.fetch_historical_data_for_analyzer, (key, PREVIOUS_DAY)))
+            calls.append((app.fetch_intraday_data_920_for_analyzer, (key, CURRENT_DAY)))
+        print(f"{n_stocks} stocks, {len(calls)} requests:")
+
+        threaded_s, threaded = time_call(cold(lambda: fetch_concurrently(calls)), repeat=1)
+        async_s, via_async = time_call(cold(lambda: asyncio.run(gather_async(keys))), repeat=1)
+        assert threaded == via_async, "Threaded and async results differ"
+        assert all(err is None for _, _, err in via_async), "Mock fetches returned errors"
+        if n_stocks <= 100: # The sequential loop takes n_requests * latency; skip it at scale
+            sequential_s, results = time_call(cold(lambda: sequential(calls)), repeat=1)
+            assert results == threaded
+            report("  sequential (original loop)", sequential_s)
+        else:
+            sequential_s = None
+        report(f"  thread pool (fetch_engine, {min(len(calls), FETCH_MAX_WORKERS)} threads)", threaded_s, sequential_s)
+        report("  asyncio client (upstox_async)", async_s, sequential_s)
+        print()
+
+if __name__ == "__main__":
+    main()
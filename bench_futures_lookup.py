@@ -0,0 +1,45 @@
+from datetime import date, datetime
+
+from bench_common import make_synthetic_instruments, pick_universe, time_call, report
+from instrument_master import InstrumentMaster, expiry_to_date, IST
+
+# Micro-benchmark: resolving the nearest-expiry future for every F&O underlying with one
+# full scan per underlying (the old finder pattern) versus the expiry-sorted futures index.
+
+AS_OF = date(2025, 5, 1)
+
+def linear_scan_nearest_future(underlying_symbol, instruments, as_of):
+    """The pre-index pattern from instrument_finder.py, generalised from RELIANCE to any underlying."""
+    best = None
+    for instrument in instruments:
+        if (instrument.get('underlying_symbol') == underlying_symbol and
+            instrument.get('instrument_type') == 'FUT' and
+            instrument.get('segment') == 'NSE_FO' and
+            instrument.get('exchange') == 'NSE' and
+            instrument.get('expiry')):
+            expiry_date = datetime.fromtimestamp(instrument['expiry'] / 1000, IST).date()
+            if expiry_date >= as_of and (best is None or expiry_date < best[0]):
+                best = (expiry_date, instrument)
+    return best[1] if best else None
+
+def main():
+    instruments = make_synthetic_instruments()
+    universe = pick_universe(instruments)
+    print(f"Instrument master: {len(instruments)} rows, universe: {len(universe)} underlyings\n")
+
+    scan_s, scan_rows = time_call(lambda: {s: linear_scan_nearest_future(s, instruments, AS_OF) for s in universe}, repeat=3)
+    master = InstrumentMaster(instruments)
+    batch_s, batch_keys = time_call(lambda: master.nearest_future_keys(universe, AS_OF), repeat=50)
+
+    # Several synthetic contracts can share an expiry, so compare expiries rather than keys.
+    for symbol in universe:
+        scanned, key = scan_rows[symbol], batch_keys[symbol]
+        assert (scanned is None) == (key is None), f"Scan and index disagree for {symbol}"
+        if key is not None:
+            assert expiry_to_date(master.get_by_key(key).get('expiry')) == expiry_to_date(scanned['expiry'])
+
+    report("one linear scan per underlying", scan_s)
+    report("InstrumentMaster.nearest_future_keys", batch_s, scan_s)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import ssl
+import json
+import time
+import logging
+import tempfile
+import subprocess
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from bench_common import time_call, report
+from fetch_engine import fetch_concurrently
+from upstox_http import upstox_session, connection_stats
+
+# Benchmark: per-call requests.get (new TCP+TLS connection every time, as every fetcher did)
+# versus the shared keep-alive session from upstox_http, against a local HTTPS mock. Loopback
+# has no network latency, so the mock can also charge a simulated round-trip time: one RTT per
+# request and two more for each new connection's TCP + TLS 1.3 handshake.
+
+N_REQUESTS = 200
+OPENSSL = os.environ.get("OPENSSL", "openssl")
+TOKEN = "bench-token"
+BODY = json.dumps({"status": "success", "data": {"candles": [["2025-05-22T00:00:00+05:30", 100, 101, 99, 100.5, 50000, 0]]}}).encode()
+
+def make_certificate(directory):
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run([OPENSSL, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key_path, "-out", cert_path,
+                    "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return cert_path, key_path
+
+class CandleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive
+    disable_nagle_algorithm = True # Otherwise headers and body in separate segments hit delayed ACKs
+
+    def do_GET(self):
+        time.sleep(self.server.rtt_seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+class TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def finish_request(self, request, client_address):
+        # Handshake in the per-connection thread so that accept() never serialises them
+        time.sleep(2 * self.rtt_seconds)
+        try:
+            request = self.tls_context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        super().finish_request(request, client_address)
+
+def serve(cert_path, key_path, rtt_seconds, port_queue):
+    server = TLSServer(("127.0.0.1", 0), CandleHandler)
+    server.tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server.tls_context.load_cert_chain(cert_path, key_path)
+    server.rtt_seconds = rtt_seconds
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_server(cert_path, key_path, rtt_seconds):
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(cert_path, key_path, rtt_seconds, port_queue), daemon=True)
+    process.start()
+    return process, f"https://127.0.0.1:{port_queue.get(timeout=30)}"
+
+def main():
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cert_path, key_path = make_certificate(tmp_dir)
+        session = upstox_session(TOKEN)
+
+        def per_call(url):
+            response = requests.get(url, headers={"Authorization": f"Bearer {TOKEN}", "Accept": "application/json"},
+                                    timeout=15, verify=cert_path)
+            response.raise_for_status()
+            return response.json()["data"]["candles"][0][4]
+
+        def pooled(url):
+            response = session.get(url, timeout=15, verify=cert_path)
+            response.raise_for_status()
+            return response.json()["data"]["candles"][0][4]
+
+        for rtt_ms in (0, 10):
+            process, base_url = start_server(cert_path, key_path, rtt_ms / 1000)
+            urls = [f"{base_url}/v3/historical-candle/NSE_EQ%7CINE{i:06d}01/days/1/2025-05-22" for i in range(N_REQUESTS)]
+            print(f"{N_REQUESTS} requests, simulated RTT {rtt_ms} ms:")
+            for label, run in (("sequential", lambda fn: [fn(u) for u in urls]),
+                               ("thread pool", lambda fn: fetch_concurrently([(fn, (u,)) for u in urls]))):
+                before = connection_stats()
+                per_call_s, _ = time_call(lambda: run(per_call), repeat=1)
+                pooled_s, _ = time_call(lambda: run(pooled), repeat=1)
+                after = connection_stats()
+                opened = after["connections_opened"] - before["connections_opened"]
+                sent = after["requests"] - before["requests"]
+                report(f"  {label}: requests.get per call", per_call_s)
+                report(f"  {label}: shared session", pooled_s, per_call_s)
+                print(f"    shared session opened {opened} connections for {sent} requests "
+                      f"({1 - opened / sent:.1%} reused)")
+            session.close() # Drop keep-alive connections to the server being stopped
+            process.terminate()
+            print()
+
+if __name__ == "__main__":
+    main()
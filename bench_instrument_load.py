@@ -0,0 +1,57 @@
+import gzip
+import json
+import time
+import tracemalloc
+
+from bench_common import make_synthetic_instruments, time_call, report
+from instrument_master import iter_instruments, STREAM_CHUNK_SIZE
+
+# Benchmark: the old whole-payload load (response.content -> gzip.decompress -> decode ->
+# json.loads) versus the streaming loader fed in socket-sized chunks. Reports wall time,
+# time to the first parsed instrument and tracemalloc peak for each path.
+
+def legacy_load(gzipped_content):
+    decompressed_content = gzip.decompress(gzipped_content)
+    json_data_str = decompressed_content.decode('utf-8')
+    return json.loads(json_data_str)
+
+def chunked(payload, chunk_size=STREAM_CHUNK_SIZE):
+    for i in range(0, len(payload), chunk_size):
+        yield payload[i:i + chunk_size]
+
+def streaming_load(gzipped_content):
+    return list(iter_instruments(chunked(gzipped_content)))
+
+def peak_memory_mb(fn, *args):
+    tracemalloc.start()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / (1024 * 1024)
+
+def time_to_first(gzipped_content):
+    start = time.perf_counter()
+    next(iter_instruments(chunked(gzipped_content)))
+    return time.perf_counter() - start
+
+def main():
+    instruments = make_synthetic_instruments()
+    gzipped_content = gzip.compress(json.dumps(instruments).encode('utf-8'))
+    del instruments
+    print(f"Payload: {len(gzipped_content) / 1e6:.1f} MB gzipped\n")
+
+    legacy_s, _ = time_call(lambda: legacy_load(gzipped_content), repeat=3)
+    stream_s, _ = time_call(lambda: streaming_load(gzipped_content), repeat=3)
+    report("legacy load (all rows, all fields)", legacy_s)
+    report("streaming load (projected fields)", stream_s, legacy_s)
+    report("legacy time to first instrument", legacy_s)
+    report("streaming time to first instrument", time_to_first(gzipped_content), legacy_s)
+
+    legacy_mb = peak_memory_mb(legacy_load, gzipped_content)
+    stream_mb = peak_memory_mb(streaming_load, gzipped_content)
+    print(f"\n{'legacy peak traced memory':<45} {legacy_mb:>12.1f} MB")
+    print(f"{'streaming peak traced memory':<45} {stream_mb:>12.1f} MB  ({legacy_mb / stream_mb:,.1f}x less)")
+
+if __name__ == "__main__":
+    main()
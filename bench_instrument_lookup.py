@@ -0,0 +1,33 @@
+from bench_common import make_synthetic_instruments, pick_universe, time_call, report
+from instrument_master import InstrumentMaster
+
+# Micro-benchmark: resolving the F&O universe to equity instrument keys with the old
+# per-symbol linear scan versus the indexed InstrumentMaster.
+
+def linear_scan_find_equity_key(stock_symbol, instrument_master):
+    """The pre-index lookup from app.py / fno_equity_analyzer.py, kept verbatim for comparison."""
+    for instrument in instrument_master:
+        if (instrument.get('trading_symbol') == stock_symbol and
+            instrument.get('instrument_type') == 'EQ' and
+            instrument.get('segment') == 'NSE_EQ' and
+            instrument.get('exchange') == 'NSE'):
+            return instrument.get('instrument_key')
+    return None
+
+def main():
+    instruments = make_synthetic_instruments()
+    universe = pick_universe(instruments)
+    print(f"Instrument master: {len(instruments)} rows, universe: {len(universe)} symbols\n")
+
+    scan_s, scan_keys = time_call(lambda: {s: linear_scan_find_equity_key(s, instruments) for s in universe}, repeat=3)
+    build_s, master = time_call(lambda: InstrumentMaster(instruments), repeat=3)
+    lookup_s, index_keys = time_call(lambda: master.find_equity_keys(universe), repeat=50)
+    assert scan_keys == index_keys, "Index and linear scan disagree"
+
+    report("linear scan, whole universe", scan_s)
+    report("InstrumentMaster build (once per load)", build_s)
+    report("InstrumentMaster.find_equity_keys", lookup_s, scan_s)
+    report("build + lookup", build_s + lookup_s, scan_s)
+
+if __name__ == "__main__":
+    main()
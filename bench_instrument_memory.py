@@ -0,0 +1,53 @@
+import json
+import tracemalloc
+
+from bench_common import make_synthetic_instruments, time_call, report
+from instrument_master import InstrumentMaster, INSTRUMENT_FIELDS
+
+# Benchmark: resident size of the instrument universe as a list of (projected) dicts versus
+# the columnar InstrumentMaster, plus a full-universe filter on each representation.
+
+def traced_size_mb(build):
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size / (1024 * 1024)
+
+def main():
+    raw = make_synthetic_instruments()
+    # Round-trip through JSON text so every row owns its own strings, as after parsing upstream.
+    payload = json.dumps(raw)
+    del raw
+
+    _, full_dicts_mb = traced_size_mb(lambda: json.loads(payload))
+    dicts, dicts_mb = traced_size_mb(
+        lambda: [{f: row[f] for f in INSTRUMENT_FIELDS if f in row} for row in json.loads(payload)])
+    master, master_mb = traced_size_mb(lambda: InstrumentMaster(json.loads(payload)))
+    print(f"Instruments: {len(master)}\n")
+    print(f"{'list of full upstream dicts':<45} {full_dicts_mb:>12.1f} MB")
+    print(f"{'list of projected dicts':<45} {dicts_mb:>12.1f} MB")
+    print(f"{'columnar InstrumentMaster (incl. indexes)':<45} {master_mb:>12.1f} MB  "
+          f"({full_dicts_mb / master_mb:,.1f}x / {dicts_mb / master_mb:,.1f}x less)\n")
+
+    dict_filter_s, dict_hits = time_call(
+        lambda: [i for i, row in enumerate(dicts) if row.get('segment') == 'NSE_FO' and row.get('instrument_type') == 'FUT'])
+    column_filter_s, column_hits = time_call(lambda: master.select(segment='NSE_FO', instrument_type='FUT'))
+    assert dict_hits == column_hits
+    report("filter FUT rows over dicts", dict_filter_s)
+    report("filter FUT rows via InstrumentMaster.select", column_filter_s, dict_filter_s)
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("numpy not installed; skipping vectorized filter")
+        return
+    segment = np.frombuffer(master.column('segment'), dtype=np.uint8)
+    instrument_type = np.frombuffer(master.column('instrument_type'), dtype=np.uint8)
+    fo_code, fut_code = master.code('segment', 'NSE_FO'), master.code('instrument_type', 'FUT')
+    numpy_s, numpy_hits = time_call(lambda: np.flatnonzero((segment == fo_code) & (instrument_type == fut_code)))
+    assert numpy_hits.tolist() == column_hits
+    report("filter FUT rows, numpy over code columns", numpy_s, dict_filter_s)
+
+if __name__ == "__main__":
+    main()
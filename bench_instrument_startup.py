@@ -0,0 +1,46 @@
+import gzip
+import json
+import os
+import tempfile
+
+from bench_common import make_synthetic_instruments, time_call, report
+from instrument_master import InstrumentMaster, iter_instruments, STREAM_CHUNK_SIZE
+
+# Benchmark: worker cold start. Compares parsing the cached NSE.json.gz and building the
+# index (what every process did before) with memory-mapping a precompiled snapshot.
+
+def parse_and_build(payload_path):
+    def chunks():
+        with open(payload_path, 'rb') as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    return InstrumentMaster(iter_instruments(chunks()))
+
+def main():
+    instruments = make_synthetic_instruments()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        payload_path = os.path.join(tmp_dir, "NSE.json.gz")
+        snapshot_path = os.path.join(tmp_dir, "NSE.snapshot")
+        with open(payload_path, 'wb') as f:
+            f.write(gzip.compress(json.dumps(instruments).encode('utf-8')))
+        del instruments
+
+        build_s, master = time_call(lambda: parse_and_build(payload_path), repeat=3)
+        compile_s, _ = time_call(lambda: master.write_snapshot(snapshot_path), repeat=1)
+        open_s, mapped = time_call(lambda: InstrumentMaster.open_snapshot(snapshot_path), repeat=20)
+        universe = [row.get('trading_symbol') for row in master if row.get('segment') == 'NSE_EQ'][:100]
+        assert mapped.find_equity_keys(universe) == master.find_equity_keys(universe)
+        first_lookup_s, _ = time_call(
+            lambda: InstrumentMaster.open_snapshot(snapshot_path).find_equity_keys(universe), repeat=20)
+
+        print(f"Instruments: {len(master)}, snapshot: {os.path.getsize(snapshot_path) / 1e6:.1f} MB\n")
+        report("parse NSE.json.gz + build index", build_s)
+        report("compile snapshot (build step, once)", compile_s)
+        report("mmap snapshot", open_s, build_s)
+        report("mmap snapshot + resolve 100 symbols", first_lookup_s, build_s)
+
+if __name__ == "__main__":
+    main()
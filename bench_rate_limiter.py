@@ -0,0 +1,51 @@
+import time
+import logging
+
+from bench_common import time_call, start_mock_candle_server
+from fetch_engine import fetch_concurrently
+from rate_limiter import RateLimiter
+from upstox_http import upstox_session, upstox_get
+
+# Benchmark: a screen's worth of daily-candle requests from the thread pool against a local
+# mock that enforces a per-second limit (429 + Retry-After beyond it), as Upstox does. Compares
+# unthrottled requests (what the fetchers did before) with the shared rate limiter configured
+# at the server's limit, and with the limiter configured too high so only the 429 handling
+# (global pause + AIMD back-off + retry) keeps the run clean. The last case also enables the
+# default per-minute limit, whose burst (half the minute's allowance) covers the first requests
+# and whose sustained rate (limit / 60 s) paces the rest.
+
+N_REQUESTS = 300
+SERVER_LIMIT_PER_SECOND = 50
+PER_MINUTE_LIMIT = 500 # Upstox's per-minute limit (the limiter's default)
+TOKEN = "bench-token"
+
+def main():
+    logging.disable(logging.WARNING)
+    base_url = start_mock_candle_server(latency_seconds=0.05, limit_per_second=SERVER_LIMIT_PER_SECOND)
+    urls = [f"{base_url}/v3/historical-candle/NSE_EQ%7CINE{i:06d}01/days/1/2025-05-22" for i in range(N_REQUESTS)]
+    session = upstox_session(TOKEN)
+    print(f"{N_REQUESTS} requests on the thread pool, server limit {SERVER_LIMIT_PER_SECOND}/s:")
+
+    def unthrottled(url):
+        return session.get(url, timeout=15).status_code
+
+    cases = [
+        ("no limiter", unthrottled, None),
+        (f"limiter at {SERVER_LIMIT_PER_SECOND}/s", None, RateLimiter(per_second=SERVER_LIMIT_PER_SECOND, per_minute=None)),
+        (f"limiter at {2 * SERVER_LIMIT_PER_SECOND}/s (misconfigured)", None, RateLimiter(per_second=2 * SERVER_LIMIT_PER_SECOND, per_minute=None)),
+        (f"limiter at {SERVER_LIMIT_PER_SECOND}/s + {PER_MINUTE_LIMIT}/min", None,
+         RateLimiter(per_second=SERVER_LIMIT_PER_SECOND, per_minute=PER_MINUTE_LIMIT)),
+    ]
+    for label, fetch, limiter in cases:
+        time.sleep(1.0) # Let the server's window from the previous case clear
+        if fetch is None:
+            fetch = lambda url, limiter=limiter: upstox_get(TOKEN, url, timeout=15, limiter=limiter).status_code
+        seconds, statuses = time_call(lambda: fetch_concurrently([(fetch, (u,)) for u in urls]), repeat=1)
+        failed = sum(1 for s in statuses if s != 200)
+        line = f"  {label:<38} {seconds:6.2f} s  {N_REQUESTS / seconds:6.1f} req/s  {failed} failed"
+        if limiter is not None:
+            line += f"  ({limiter.stats['rate_limited']} 429s retried, concurrency limit {int(limiter.concurrency_limit)})"
+        print(line)
+
+if __name__ == "__main__":
+    main()
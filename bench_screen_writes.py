@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import logging
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+from bench_common import time_call, report
+from screen_store import ScreenStore, ROW_FIELDS
+
+# Benchmark: writing one run's rows and hits.
+#  - legacy: the original helpers, which dropped and recreated the date's data_/filtered_
+#    tables and ran one INSERT per row on a fresh default connection (rollback journal,
+#    synchronous=FULL).
+#  - row by row: the screen_* schema written the same way, one INSERT per row with rows and
+#    hits committed separately, as fno_equity_analyzer's two store helpers did.
+#  - store_run: one transaction of executemany batches over a WAL connection with
+#    synchronous=NORMAL, into an empty store and into one already holding PRIOR_DATES runs.
+
+UNIVERSE_SIZES = (100, 1000, 5000)
+PRIOR_DATES = 30
+TRADE_DATE = date(2025, 5, 23)
+
+def make_run(n):
+    rows = [{'stock_symbol': f"SYM{i:05d}", 'prev_day_equity_close': 100.0 + i, 'prev_day_equity_oi': 0,
+             'equity_920_price': 102.5 + i, 'equity_920_oi': 0, 'error_message': None if i % 50 else "HTTP 500"}
+            for i in range(n)]
+    hits = [(row['stock_symbol'], 2.5) for row in rows[::3]]
+    return rows, hits
+
+def legacy_write(db_path, trade_date, rows, hits):
+    """init_db_for_analyzer + store_data_to_db_for_analyzer as they were."""
+    suffix = trade_date.replace('-', '_')
+    raw, filtered = f"data_{suffix}", f"filtered_{suffix}"
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {raw}")
+    cursor.execute(f"""CREATE TABLE {raw} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT,
+        prev_day_equity_close REAL, prev_day_equity_oi INTEGER,
+        equity_920_price REAL, equity_920_oi INTEGER, record_timestamp TEXT, error_message TEXT)""")
+    cursor.execute(f"DROP TABLE IF EXISTS {filtered}")
+    cursor.execute(f"CREATE TABLE {filtered} (id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT, percent_change REAL, record_timestamp TEXT)")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    current_ts = datetime.now(timezone.utc).isoformat()
+    for record in rows:
+        cursor.execute(f"""INSERT INTO {raw}
+            (stock_symbol, prev_day_equity_close, prev_day_equity_oi,
+             equity_920_price, equity_920_oi, record_timestamp, error_message)
+            VALUES (?, ?, ?, ?, ?, ?, ?);""",
+            (record['stock_symbol'], record.get('prev_day_equity_close'), record.get('prev_day_equity_oi'),
+             record.get('equity_920_price'), record.get('equity_920_oi'), current_ts, record.get('error_message')))
+    for symbol, p_change in hits:
+        cursor.execute(f"INSERT INTO {filtered} (stock_symbol, percent_change, record_timestamp) VALUES (?, ?, ?);", (symbol, p_change, current_ts))
+    conn.commit()
+    conn.close()
+
+def row_by_row_write(db_path, trade_date, rows, hits):
+    conn = sqlite3.connect(db_path)
+    current_ts = datetime.now(timezone.utc).isoformat()
+    run_id = conn.execute("INSERT INTO screen_runs (trade_date, source, status, started_at) VALUES (?, 'bench', 'complete', ?)",
+                          (trade_date, current_ts)).lastrowid
+    for record in rows:
+        conn.execute(f"INSERT OR REPLACE INTO screen_rows (trade_date, symbol, run_id, {', '.join(ROW_FIELDS)}, record_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (trade_date, record['stock_symbol'], run_id, *(record.get(f) for f in ROW_FIELDS), current_ts))
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM screen_hits WHERE trade_date = ?", (trade_date,))
+    for symbol, p_change in hits:
+        conn.execute("INSERT INTO screen_hits VALUES (?, ?, ?, ?, ?)", (trade_date, symbol, run_id, p_change, current_ts))
+    conn.commit()
+    conn.close()
+
+def main():
+    logging.disable(logging.INFO)
+    trade_date = TRADE_DATE.isoformat()
+    for n in UNIVERSE_SIZES:
+        rows, hits = make_run(n)
+        work_dir = tempfile.mkdtemp()
+        legacy_path = os.path.join(work_dir, "legacy.db")
+        legacy_s, _ = time_call(lambda: legacy_write(legacy_path, trade_date, rows, hits))
+
+        row_path = os.path.join(work_dir, "rows.db")
+        ScreenStore(row_path, migrate=False).close()
+        with sqlite3.connect(row_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE") # Back to SQLite's defaults for this file
+        row_s, _ = time_call(lambda: row_by_row_write(row_path, trade_date, rows, hits))
+
+        store = ScreenStore(os.path.join(work_dir, "store.db"), migrate=False)
+        store_s, _ = time_call(lambda: store.store_run(trade_date, "2025-05-22", rows, hits, source="bench"))
+
+        grown = ScreenStore(os.path.join(work_dir, "grown.db"), migrate=False)
+        for back in range(1, PRIOR_DATES + 1):
+            grown.store_run((TRADE_DATE - timedelta(days=back)).isoformat(), None, rows, hits, source="bench")
+        grown_s, _ = time_call(lambda: grown.store_run(trade_date, "2025-05-22", rows, hits, source="bench"))
+
+        print(f"{n} rows, {len(hits)} hits:")
+        report("  legacy (DROP/CREATE + INSERT per row)", legacy_s)
+        print(f"    {legacy_s / n * 1e6:,.1f} us/row")
+        report("  row by row (screen_* schema)", row_s, legacy_s)
+        print(f"    {row_s / n * 1e6:,.1f} us/row")
+        report("  ScreenStore.store_run", store_s, legacy_s)
+        print(f"    {store_s / n * 1e6:,.1f} us/row")
+        report(f"  ScreenStore.store_run, {PRIOR_DATES} dates stored", grown_s, legacy_s)
+        print(f"    {grown_s / n * 1e6:,.1f} us/row")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import date, datetime
+from collections import OrderedDict
+
+import numpy as np
+
+from instrument_master import CACHE_DIR, IST
+from candle_cache import CandleCache, CANDLE_CACHE_PATH
+from candle_extract import IST_OFFSET_SUFFIX
+from single_flight import SingleFlight, AsyncSingleFlight
+
+# Compact archive of full 1-minute sessions, one row per (instrument_key, trading_date):
+#
+#   sessions  instrument_key, trading_date, first_ts, last_ts (epoch seconds), n_candles and a
+#             blob holding the whole session
+#
+# A blob is a fixed header (version, candle count, price scale, first timestamp) followed by
+# one zlib stream of seven int64 columns: timestamp, open, high, low and close as deltas from
+# the previous candle (prices as integers in 1/scale rupees, i.e. paise at the usual scale of
+# 100), volume as is and OI as deltas. The columns are byte-shuffled before compression so the
+# mostly-zero high bytes of the small deltas sit together. A 375-candle session takes about 3 KB
+# against ~30 KB of candle JSON, and decodes with a handful of NumPy calls.
+#
+# Only finished sessions (CandleCache.is_final) are archived; they never change. get_or_fetch()
+# only archives the days a response actually returned candles for: a finished date it leaves
+# out (the D+1 quirk, or data published late) is fetched again next time rather than archived
+# as empty. The archive is the only store of finished 1-minute sessions: get_or_fetch() reads it
+# before anything else, and a session candle_cache still holds as JSON (from before the
+# archive) is moved here on first use.
+
+# --- 1. Configuration ---
+CANDLE_ARCHIVE_PATH = os.environ.get("CANDLE_ARCHIVE_PATH", os.path.join(CACHE_DIR, "candle_archive.db"))
+# Decoded sessions kept in memory for repeated point/range lookups
+DECODED_SESSIONS_CACHED = int(os.environ.get("CANDLE_ARCHIVE_DECODED_SESSIONS", 512))
+# Sessions are compressed once and read many times; on byte-shuffled columns level 9 is ~25%
+# smaller than the default 6 for about the same time (~1 ms a session)
+COMPRESSION_LEVEL = 9
+PRICE_SCALES = (100, 10_000, 1_000_000) # The first that stores every price exactly is used
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BIIq") # version, n_candles, price scale, first timestamp
+_N_COLUMNS = 7
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume", "oi")
+_IST_OFFSET_SECONDS = int(IST.utcoffset(None).total_seconds())
+
+# --- 2. Encoding ---
+
+def _price_scale(prices):
+    for scale in PRICE_SCALES:
+        scaled = np.rint(prices * scale)
+        if np.array_equal(scaled / scale, prices):
+            return scale, scaled.astype(np.int64)
+    raise ValueError("prices have more than 6 decimals")
+
+def _epoch_seconds(timestamps):
+    """int64 epoch seconds of Upstox timestamps; converted in one NumPy call when all carry the IST offset."""
+    if {ts[19:] for ts in timestamps} == {IST_OFFSET_SUFFIX}:
+        wall_clock = np.array([ts[:19] for ts in timestamps], dtype="datetime64[s]")
+        return wall_clock.astype(np.int64) - _IST_OFFSET_SECONDS
+    return np.array([int(datetime.fromisoformat(ts).timestamp()) for ts in timestamps], dtype=np.int64)
+
+def encode_session(candles):
+    """
+    The blob for one session's Upstox candles ([timestamp, open, high, low, close, volume, oi]
+    lists, oldest- or newest-first). Raises ValueError for candles it cannot store exactly.
+    """
+    candles = sorted(candles, key=lambda candle: candle[0])
+    n = len(candles)
+    if not n:
+        return _HEADER.pack(_FORMAT_VERSION, 0, PRICE_SCALES[0], 0)
+    timestamps, *values = zip(*(candle[:_N_COLUMNS] for candle in candles))
+    epochs = _epoch_seconds(timestamps)
+    scale, prices = _price_scale(np.array(values[:4], dtype=np.float64))
+    volume_oi = np.array(values[4:6], dtype=np.float64)
+    if not np.array_equal(np.rint(volume_oi), volume_oi):
+        raise ValueError("volume/OI are not whole numbers")
+    columns = np.empty((_N_COLUMNS, n), dtype=np.int64)
+    columns[0] = np.diff(epochs, prepend=epochs[0])
+    columns[1:5] = np.diff(prices, axis=1, prepend=0)
+    columns[5] = volume_oi[0]
+    columns[6] = np.diff(volume_oi[1].astype(np.int64), prepend=0)
+    shuffled = columns.view(np.uint8).reshape(-1, 8).T # Byte planes: all lowest bytes, then the next...
+    return _HEADER.pack(_FORMAT_VERSION, n, scale, int(epochs[0])) + zlib.compress(shuffled.tobytes(), COMPRESSION_LEVEL)
+
+def decode_session(blob):
+    """{column: numpy array} for a blob from encode_session(), oldest candle first."""
+    version, n, scale, first_epoch = _HEADER.unpack_from(blob)
+    if version != _FORMAT_VERSION:
+        raise ValueError(f"Unknown candle archive format {version}")
+    if not n:
+        return _empty_columns()
+    planes = np.frombuffer(zlib.decompress(blob[_HEADER.size:]), dtype=np.uint8).reshape(8, -1)
+    columns = np.ascontiguousarray(planes.T).view(np.int64).reshape(_N_COLUMNS, n)
+    integers = np.cumsum(columns[[0, 1, 2, 3, 4, 6]], axis=1)
+    session = {"timestamp": integers[0] + first_epoch}
+    for name, prices in zip(COLUMNS[1:5], integers[1:5]):
+        session[name] = prices / scale
+    session["volume"] = columns[5].copy()
+    session["oi"] = integers[5]
+    for column in session.values():
+        column.flags.writeable = False # Shared through the decoded-session cache
+    return session
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=np.int64 if name in ("timestamp", "volume", "oi") else np.float64) for name in COLUMNS}
+
+def to_candles(session):
+    """Upstox-style candle lists (oldest first, IST timestamps) from decoded columns."""
+    wall_clock = (session["timestamp"] + _IST_OFFSET_SECONDS).astype("datetime64[s]")
+    stamps = [ts + IST_OFFSET_SUFFIX for ts in np.datetime_as_string(wall_clock, unit="s").tolist()]
+    return [list(candle) for candle in zip(stamps, *(session[name].tolist() for name in COLUMNS[1:]))]
+
+# --- 3. Archive ---
+
+class CandleArchive:
+    """
+    SQLite archive of finished 1-minute sessions (see the module comment for the format), with
+    point (candle_at) and range (candles_between) lookups by timestamp. Each thread gets its own
+    connection; the last DECODED_SESSIONS_CACHED decoded sessions are kept in memory.
+    """
+
+    def __init__(self, path=CANDLE_ARCHIVE_PATH, decoded_sessions_cached=DECODED_SESSIONS_CACHED):
+        self.path = path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "sessions_written": 0, "candles_written": 0,
+                      "raw_bytes": 0, "stored_bytes": 0, "rejected": 0}
+        self.decoded_sessions_cached = decoded_sessions_cached
+        self._decoded = OrderedDict() # (instrument_key, trading_date) -> decoded session, least recently used first
+        self._decoded_lock = threading.Lock()
+        self._fetches = SingleFlight("archive fetch")
+        self._async_fetches = AsyncSingleFlight("archive fetch")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                instrument_key TEXT NOT NULL, trading_date TEXT NOT NULL,
+                first_ts INTEGER, last_ts INTEGER, n_candles INTEGER NOT NULL,
+                data BLOB NOT NULL, archived_at REAL NOT NULL,
+                PRIMARY KEY (instrument_key, trading_date))""") # A rowid table: its multi-KB rows would overflow a WITHOUT ROWID b-tree
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL") # Readers on other threads never wait for a writer
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, n in increments.items():
+                self.stats[name] += n
+
+    # Writing
+
+    def put_days(self, instrument_key, candles_by_day):
+        """
+        Archives {'YYYY-MM-DD': candle list} for one instrument in a single transaction, skipping
+        sessions that have not finished yet and any that cannot be stored exactly. Returns the
+        number of sessions written.
+        """
+        now = time.time()
+        rows = []
+        for day, candles in candles_by_day.items():
+            if not CandleCache.is_final(day):
+                continue
+            try:
+                blob = encode_session(candles)
+            except (ValueError, TypeError, IndexError) as e:
+                logger.warning(f"Not archiving {instrument_key} {day}: {e}")
+                self._count(rejected=1)
+                continue
+            first_ts = last_ts = None
+            if candles:
+                first_ts = _HEADER.unpack_from(blob)[3]
+                last_ts = int(_epoch_seconds([max(candle[0] for candle in candles)])[0])
+            rows.append((instrument_key, str(day), first_ts, last_ts, len(candles), blob, now))
+            self._count(candles_written=len(candles), raw_bytes=len(json.dumps(candles)), stored_bytes=len(blob))
+        if rows:
+            with self._connection() as conn: # Commits on success
+                conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            with self._decoded_lock:
+                for row in rows:
+                    self._decoded.pop((row[0], row[1]), None)
+            self._count(sessions_written=len(rows))
+        return len(rows)
+
+    # Reading
+
+    def _load(self, instrument_key, trading_date):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE instrument_key = ? AND trading_date = ?", (instrument_key, trading_date)).fetchone()
+        return None if row is None else decode_session(row[0])
+
+    def session(self, instrument_key, trading_date):
+        """The archived session as {column: read-only numpy array}, or None if it is not archived."""
+        key = (instrument_key, str(trading_date))
+        with self._decoded_lock:
+            session = self._decoded.get(key)
+            if session is not None:
+                self._decoded.move_to_end(key)
+        if session is None:
+            session = self._load(*key)
+            if session is not None and self.decoded_sessions_cached > 0:
+                with self._decoded_lock:
+                    self._decoded[key] = session
+                    while len(self._decoded) > self.decoded_sessions_cached:
+                        self._decoded.popitem(last=False)
+        self._count(**({"misses": 1} if session is None else {"hits": 1}))
+        return session
+
+    def get_candles(self, instrument_key, trading_date):
+        """The archived session as Upstox candle lists (possibly empty), or None if it is not archived."""
+        session = self.session(instrument_key, trading_date)
+        return None if session is None else to_candles(session)
+
+    def _store_fetched(self, instrument_key, trading_date, fetch, cache):
+        """Archives the session from `cache`'s JSON entry if it has one (then evicts it), else from fetch()'s days."""
+        legacy = cache.final_entry(instrument_key, "minutes", 1, trading_date) if cache is not None else None
+        by_day = {trading_date: legacy} if legacy else fetch() # An empty legacy entry may be a day left out of a response
+        return self._archive_fetched(instrument_key, trading_date, by_day, cache if legacy else None)
+
+    def _archive_fetched(self, instrument_key, trading_date, by_day, migrated_from):
+        sessions = {day: candles for day, candles in by_day.items() if candles}
+        if sessions and self.put_days(instrument_key, sessions) and migrated_from is not None:
+            migrated_from.evict(instrument_key, "minutes", 1, [trading_date])
+        return by_day.get(trading_date, [])
+
+    def get_or_fetch(self, instrument_key, trading_date, fetch, cache=None):
+        """
+        Read-through lookup of a finished 1-minute session. On a miss, takes the session from
+        `cache` (a CandleCache) if it still holds it as JSON, else calls fetch(), which returns
+        {'YYYY-MM-DD': candle list} for every day the response covered; the finished ones with
+        candles are archived and `trading_date`'s list is returned. If the response had none for
+        `trading_date`, [] is returned and nothing is archived for it. Errors from fetch() propagate. Concurrent misses for the same session share one fetch().
+        """
+        trading_date = str(trading_date)
+        candles = self.get_candles(instrument_key, trading_date)
+        if candles is not None:
+            return candles
+        return self._fetches.do((instrument_key, trading_date),
+                                lambda: self._store_fetched(instrument_key, trading_date, fetch, cache))
+
+    async def get_or_fetch_async(self, instrument_key, trading_date, fetch, cache=None):
+        """get_or_fetch() for a coroutine function `fetch`."""
+        trading_date = str(trading_date)
+        candles = self.get_candles(instrument_key, trading_date)
+        if candles is not None:
+            return candles
+
+        async def fetch_and_store():
+            legacy = cache.final_entry(instrument_key, "minutes", 1, trading_date) if cache is not None else None
+            by_day = {trading_date: legacy} if legacy else await fetch()
+            return self._archive_fetched(instrument_key, trading_date, by_day, cache if legacy else None)
+
+        return await self._async_fetches.do((instrument_key, trading_date), fetch_and_store)
+
+    def candle_at(self, instrument_key, when):
+        """
+        The candle opening at `when` (an aware datetime, or epoch seconds) as an Upstox candle
+        list, or None if its session is not archived or has no candle at that minute.
+        """
+        epoch = int(when if isinstance(when, (int, float)) else when.timestamp())
+        session = self.session(instrument_key, datetime.fromtimestamp(epoch, IST).date())
+        if session is None:
+            return None
+        i = int(np.searchsorted(session["timestamp"], epoch))
+        if i == len(session["timestamp"]) or session["timestamp"][i] != epoch:
+            return None
+        return to_candles({name: column[i:i + 1] for name, column in session.items()})[0]
+
+    def candles_between(self, instrument_key, start, end):
+        """
+        {column: numpy array} of the archived candles with start <= timestamp <= end (aware
+        datetimes or epoch seconds), across sessions, oldest first. Sessions that are not
+        archived are simply absent; archived_dates() tells which are.
+        """
+        start_epoch = int(start if isinstance(start, (int, float)) else start.timestamp())
+        end_epoch = int(end if isinstance(end, (int, float)) else end.timestamp())
+        first_day = datetime.fromtimestamp(start_epoch, IST).date().isoformat()
+        last_day = datetime.fromtimestamp(end_epoch, IST).date().isoformat()
+        days = [day for (day,) in self._connection().execute(
+            "SELECT trading_date FROM sessions WHERE instrument_key = ? AND trading_date BETWEEN ? AND ? "
+            "AND n_candles > 0 AND last_ts >= ? AND first_ts <= ? ORDER BY trading_date",
+            (instrument_key, first_day, last_day, start_epoch, end_epoch))]
+        parts = []
+        for day in days:
+            session = self.session(instrument_key, day)
+            lo, hi = np.searchsorted(session["timestamp"], [start_epoch, end_epoch + 1])
+            parts.append({name: column[lo:hi] for name, column in session.items()})
+        if not parts:
+            return _empty_columns()
+        return {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+    def archived_dates(self, instrument_key, start_date=None, end_date=None):
+        """The instrument's archived trading dates ('YYYY-MM-DD'), oldest first."""
+        rows = self._connection().execute(
+            "SELECT trading_date FROM sessions WHERE instrument_key = ? AND trading_date BETWEEN ? AND ? ORDER BY trading_date",
+            (instrument_key, str(start_date or date.min), str(end_date or date.max)))
+        return [day for (day,) in rows]
+
+    def log_stats(self, label="Candle archive"):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0.0
+        logger.info(f"{label}: {stats['hits']} hits, {stats['misses']} misses, {stats['sessions_written']} sessions "
+                    f"({stats['candles_written']} candles) written at {ratio:.1f}x smaller than JSON, {stats['rejected']} rejected.")
+        return {**stats, "compression_ratio": round(ratio, 2)}
+
+# --- 4. Command Line ---
+
+def import_candle_cache(archive, cache_path=CANDLE_CACHE_PATH, evict=False):
+    """
+    Archives every finished, non-empty 1-minute session held in a candle_cache file; returns the
+    count. With `evict`, the archived sessions' JSON entries are then deleted from the cache.
+    """
+    conn = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+    try:
+        by_instrument = {}
+        for instrument_key, trading_date, candles_json in conn.execute(
+                "SELECT instrument_key, trading_date, candles FROM candles WHERE unit = 'minutes' AND interval = 1 AND final = 1 AND candles != '[]'"):
+            by_instrument.setdefault(instrument_key, {})[trading_date] = json.loads(candles_json)
+    finally:
+        conn.close()
+    archived = sum(archive.put_days(instrument_key, by_day) for instrument_key, by_day in by_instrument.items())
+    if evict:
+        cache = CandleCache(cache_path)
+        for instrument_key, by_day in by_instrument.items():
+            archived_days = set(archive.archived_dates(instrument_key, min(by_day), max(by_day)))
+            cache.evict(instrument_key, "minutes", 1, [day for day in by_day if day in archived_days])
+    return archived
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill or inspect the compressed 1-minute candle archive.")
+    parser.add_argument("command", choices=("import", "stats"))
+    parser.add_argument("--archive", default=CANDLE_ARCHIVE_PATH)
+    parser.add_argument("--cache", default=CANDLE_CACHE_PATH, help="import: candle_cache file to archive from")
+    parser.add_argument("--evict", action="store_true", help="import: delete the archived sessions from the candle_cache file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    archive = CandleArchive(args.archive)
+    if args.command == "import":
+        print(f"Archived {import_candle_cache(archive, args.cache, args.evict)} sessions from {args.cache}.")
+        archive.log_stats()
+    else:
+        n_sessions, n_candles, stored_bytes, n_instruments = archive._connection().execute(
+            "SELECT count(*), total(n_candles), total(length(data)), count(DISTINCT instrument_key) FROM sessions").fetchone()
+        print(f"{n_sessions} sessions of {n_instruments} instruments, {int(n_candles)} candles, {stored_bytes / 1e6:.2f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
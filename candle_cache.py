@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime
+
+from instrument_master import CACHE_DIR, IST
+from single_flight import SingleFlight, AsyncSingleFlight
+
+# --- 1. Configuration ---
+CANDLE_CACHE_PATH = os.environ.get("CANDLE_CACHE_PATH", os.path.join(CACHE_DIR, "candles.db"))
+# Candles of a finished session never change and are kept for good. Today's (IST) session is
+# still forming, so its entries are only served for this long before being fetched again.
+CURRENT_DAY_TTL_SECONDS = int(os.environ.get("CANDLE_CACHE_CURRENT_DAY_TTL_SECONDS", 60))
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Cache ---
+
+class CandleCache:
+    """
+    Read-through, write-back SQLite cache of Upstox candles, one row per
+    (instrument_key, unit, interval, trading_date) holding that session's candle list as JSON.
+
+    An empty list is a real entry (the instrument had no session that day), distinct from a
+    miss. Past sessions are immutable and never expire; today's and later dates expire after
+    CURRENT_DAY_TTL_SECONDS, and so do empty entries unless the caller knows the day settled
+    (see put_days()): a response that leaves a day out may just not have published it yet.
+    Each thread gets its own connection. `stats` counts hits, misses (including expired
+    entries) and rows written; see log_stats().
+    """
+
+    def __init__(self, path=CANDLE_CACHE_PATH, current_day_ttl_seconds=CURRENT_DAY_TTL_SECONDS):
+        self.path = path
+        self.current_day_ttl_seconds = current_day_ttl_seconds
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0}
+        self._fetches = SingleFlight("candle fetch")
+        self._async_fetches = AsyncSingleFlight("candle fetch")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS candles (
+                instrument_key TEXT NOT NULL, unit TEXT NOT NULL, interval INTEGER NOT NULL,
+                trading_date TEXT NOT NULL, candles TEXT NOT NULL, fetched_at REAL NOT NULL, final INTEGER NOT NULL,
+                PRIMARY KEY (instrument_key, unit, interval, trading_date)) WITHOUT ROWID""")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL") # Readers on other threads never wait for a writer
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, n in increments.items():
+                self.stats[name] += n
+
+    @staticmethod
+    def is_final(trading_date):
+        """True for sessions that have closed, i.e. any date before today in IST."""
+        day = trading_date if isinstance(trading_date, date) else date.fromisoformat(trading_date)
+        return day < datetime.now(IST).date()
+
+    def get(self, instrument_key, unit, interval, trading_date):
+        """The cached candle list (possibly empty), or None on a miss or an expired entry."""
+        row = self._connection().execute(
+            "SELECT candles, fetched_at, final FROM candles WHERE instrument_key = ? AND unit = ? AND interval = ? AND trading_date = ?",
+            (instrument_key, unit, interval, str(trading_date))).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        candles_json, fetched_at, final = row
+        if not final and time.time() - fetched_at > self.current_day_ttl_seconds:
+            self._count(misses=1, expired=1)
+            return None
+        self._count(hits=1)
+        return json.loads(candles_json)
+
+    def put_days(self, instrument_key, unit, interval, candles_by_day, settled_through=None):
+        """
+        Writes {'YYYY-MM-DD': candle list} for one instrument in a single transaction. Empty
+        lists are only kept for good on days up to `settled_through` (a date the response is
+        known to cover, e.g. its newest candle's); other empty entries expire like today's.
+        """
+        if not candles_by_day:
+            return
+        now = time.time()
+        settled_through = str(settled_through) if settled_through is not None else ""
+        rows = [(instrument_key, unit, interval, day, json.dumps(candles), now,
+                 int(self.is_final(day) and (bool(candles) or day <= settled_through)))
+                for day, candles in candles_by_day.items()]
+        with self._connection() as conn: # Commits on success
+            conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self._count(writes=len(rows))
+
+    def final_entry(self, instrument_key, unit, interval, trading_date):
+        """A finished session's cached candle list, or None; not counted in `stats` (see CandleArchive.get_or_fetch)."""
+        row = self._connection().execute(
+            "SELECT candles FROM candles WHERE instrument_key = ? AND unit = ? AND interval = ? AND trading_date = ? AND final = 1",
+            (instrument_key, unit, interval, str(trading_date))).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def evict(self, instrument_key, unit, interval, trading_dates):
+        """Deletes the given days' entries, e.g. once they are kept in the candle archive instead; returns the count."""
+        rows = [(instrument_key, unit, interval, str(day)) for day in trading_dates]
+        with self._connection() as conn:
+            deleted = conn.executemany(
+                "DELETE FROM candles WHERE instrument_key = ? AND unit = ? AND interval = ? AND trading_date = ?", rows).rowcount
+        return deleted
+
+    def _store_fetched(self, instrument_key, unit, interval, trading_date, by_day):
+        by_day.setdefault(trading_date, [])
+        self.put_days(instrument_key, unit, interval, by_day)
+        return by_day[trading_date]
+
+    def get_or_fetch(self, instrument_key, unit, interval, trading_date, fetch):
+        """
+        Read-through lookup: on a miss calls fetch(), which returns {'YYYY-MM-DD': candle list}
+        for every day the response covered; all of them are written back and `trading_date`'s
+        list is returned. If the response had none for `trading_date`, an empty entry is written
+        that expires after CURRENT_DAY_TTL_SECONDS, so the day is fetched again later. Errors from fetch() propagate and
+        nothing is written. Concurrent misses for the same entry share one fetch().
+        """
+        trading_date = str(trading_date)
+        candles = self.get(instrument_key, unit, interval, trading_date)
+        if candles is not None:
+            return candles
+        return self._fetches.do((instrument_key, unit, interval, trading_date),
+                                lambda: self._store_fetched(instrument_key, unit, interval, trading_date, fetch()))
+
+    async def get_or_fetch_async(self, instrument_key, unit, interval, trading_date, fetch):
+        """get_or_fetch() for a coroutine function `fetch`."""
+        trading_date = str(trading_date)
+        candles = self.get(instrument_key, unit, interval, trading_date)
+        if candles is not None:
+            return candles
+
+        async def fetch_and_store():
+            return self._store_fetched(instrument_key, unit, interval, trading_date, await fetch())
+
+        return await self._async_fetches.do((instrument_key, unit, interval, trading_date), fetch_and_store)
+
+    def log_stats(self, label="Candle cache"):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0.0
+        coalesced = self._fetches.stats["joined"] + self._async_fetches.stats["joined"]
+        logger.info(f"{label}: {stats['hits']} hits, {stats['misses']} misses ({stats['expired']} expired), "
+                    f"{hit_rate:.1%} hit rate, {stats['writes']} rows written, {coalesced} fetches coalesced.")
+        return {**stats, "hit_rate": round(hit_rate, 3), "coalesced_fetches": coalesced}
+
+def split_candles_by_day(candles):
+    """{'YYYY-MM-DD': [candles]} from any Upstox candle list, keeping the response's order within a day."""
+    by_day = {}
+    for candle in candles or ():
+        if candle and len(candle) >= 7:
+            by_day.setdefault(candle[0][:10], []).append(candle)
+    return by_day
@@ -0,0 +1,104 @@
+import json
+import logging
+from bisect import bisect_left
+from datetime import datetime
+
+# Helpers for picking candles at given times out of Upstox candle responses without parsing
+# every timestamp. Upstox writes every timestamp in one fixed form ("2025-05-23T09:20:00+05:30"),
+# so the timestamp a target candle must carry can be built once and compared as a string, and
+# because a response is time-ordered those strings are sorted too.
+
+# --- 1. Configuration ---
+IST_OFFSET_SUFFIX = "+05:30" # Offset Upstox writes on every candle timestamp
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Timestamps ---
+
+def candle_timestamp(day, at, offset_suffix=IST_OFFSET_SUFFIX):
+    """The timestamp string of the candle opening at `at` (a datetime.time) on `day`."""
+    return f"{day.isoformat()}T{at.strftime('%H:%M:%S')}{offset_suffix}"
+
+# --- 3. Parsed Candle Lists ---
+
+def _scan_by_parsing(candles, timestamps):
+    """
+    Fallback for responses whose timestamps are not in the expected form: parse each one and
+    compare wall-clock date and time, as the original fetchers did.
+    """
+    wanted = {}
+    for ts in timestamps:
+        dt_obj = datetime.fromisoformat(ts)
+        wanted[(dt_obj.date(), dt_obj.time())] = ts
+    found = {}
+    for candle in candles:
+        if not candle or len(candle) < 7:
+            continue
+        try:
+            dt_obj = datetime.fromisoformat(candle[0])
+            ts = wanted.get((dt_obj.date(), dt_obj.time()))
+        except (TypeError, ValueError):
+            continue
+        if ts is not None and ts not in found:
+            found[ts] = candle
+    return found
+
+def find_candles_at(candles, timestamps):
+    """
+    {timestamp: candle} for each of `timestamps` (from candle_timestamp) present in a parsed
+    candle list, oldest-first or newest-first. Each lookup is a bisection on the raw timestamp
+    strings, O(log n) per target instead of parsing every candle. If any target is missing,
+    the list is scanned once with real datetime parsing in case its timestamps use another
+    form, so the result never differs from the parsing scan.
+    """
+    if not candles:
+        return {}
+    n = len(candles)
+    newest_first = n > 1 and candles[0][0] > candles[-1][0]
+    ascending_ts = (lambda i: candles[n - 1 - i][0]) if newest_first else (lambda i: candles[i][0])
+    found = {}
+    for ts in timestamps:
+        i = bisect_left(range(n), ts, key=ascending_ts)
+        if i < n and ascending_ts(i) == ts:
+            candle = candles[n - 1 - i] if newest_first else candles[i]
+            if len(candle) >= 7:
+                found[ts] = candle
+    if len(found) < len(timestamps):
+        found.update(_scan_by_parsing(candles, [t for t in timestamps if t not in found]))
+    return found
+
+# --- 4. Raw Response Bodies ---
+
+def extract_candles_from_body(body, timestamps):
+    """
+    {timestamp: candle} for `timestamps` straight from a candle response's raw JSON bytes:
+    each target's quoted timestamp is located with bytes.find and only its enclosing
+    [ts, o, h, l, c, volume, oi] array is decoded, so the rest of the response is never turned
+    into Python objects. Falls back to a full decode (and find_candles_at) for any target not
+    found that way, e.g. when the session or its 09:20 candle is genuinely absent.
+    """
+    found = {}
+    for ts in timestamps:
+        at = body.find(f'"{ts}"'.encode())
+        if at < 0:
+            continue
+        start, end = body.rfind(b"[", 0, at), body.find(b"]", at)
+        try:
+            candle = json.loads(body[start:end + 1])
+        except ValueError:
+            continue
+        if len(candle) >= 7:
+            found[ts] = candle
+    if len(found) < len(timestamps):
+        candles = ((json.loads(body) or {}).get("data") or {}).get("candles") or [] # "data" is null when there is no session
+        found.update(find_candles_at(candles, [t for t in timestamps if t not in found]))
+    return found
+
+def candles_at_times(candles_or_body, day, times):
+    """{time: candle} for several `times` of `day` from one parsed candle list or raw response body."""
+    by_ts = {candle_timestamp(day, t): t for t in times}
+    if isinstance(candles_or_body, (bytes, bytearray)):
+        found = extract_candles_from_body(candles_or_body, list(by_ts))
+    else:
+        found = find_candles_at(candles_or_body, list(by_ts))
+    return {by_ts[ts]: candle for ts, candle in found.items()}
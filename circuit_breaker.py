@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import logging
+import threading
+from urllib.parse import urlsplit, unquote
+
+# --- 1. Configuration ---
+# 5xx responses or timeouts within the window that open an endpoint's circuit. A single 401
+# always opens it: the token is bad and every other request with it would fail the same way.
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_FAILURE_WINDOW_SECONDS = float(os.environ.get("CIRCUIT_FAILURE_WINDOW_SECONDS", 10))
+# How long an open circuit short-circuits before letting one half-open probe through; doubled
+# after every failed probe, up to the maximum
+CIRCUIT_COOLDOWN_SECONDS = float(os.environ.get("CIRCUIT_COOLDOWN_SECONDS", 30))
+CIRCUIT_MAX_COOLDOWN_SECONDS = float(os.environ.get("CIRCUIT_MAX_COOLDOWN_SECONDS", 300))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+logger = logging.getLogger(__name__)
+
+_breakers = {} # (access_token, endpoint) -> CircuitBreaker
+_auth_failed = {} # access_token -> endpoint whose 401 condemned it, until a probe succeeds
+_breakers_lock = threading.Lock()
+_DATE_SEGMENT = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# --- 2. Errors ---
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while its endpoint's circuit is open."""
+
+    def __init__(self, endpoint, reason, status, retry_in_seconds):
+        super().__init__(f"Circuit open for {endpoint} ({reason}); next probe in {retry_in_seconds:.0f} s")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.status = status
+        self.retry_in_seconds = retry_in_seconds
+
+    def to_dict(self):
+        return {"error": "circuit_open", "endpoint": self.endpoint, "reason": self.reason,
+                "status": self.status, "retry_in_seconds": round(self.retry_in_seconds, 1)}
+
+# --- 3. Breaker ---
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one endpoint and access token.
+
+    Callers take `probe = breaker.allow()` before a request (raises CircuitOpenError while
+    open; check() is the same test without taking the probe) and report the outcome with on_response(status, probe) or on_failure(reason, probe)
+    for timeouts and connection errors. The circuit opens on a 401, or on CIRCUIT_FAILURE_THRESHOLD
+    5xx/timeouts within CIRCUIT_FAILURE_WINDOW_SECONDS. Once the cooldown has passed, one caller
+    is let through as a half-open probe: success closes the circuit, failure reopens it with
+    twice the cooldown. Outcomes of requests sent before the circuit opened are ignored.
+    """
+
+    def __init__(self, endpoint, access_token=None):
+        self.endpoint = endpoint
+        self.access_token = access_token
+        self.state = CLOSED
+        self.reason = None
+        self.status = None
+        self.opened_at = 0.0
+        self.cooldown_seconds = CIRCUIT_COOLDOWN_SECONDS
+        self.short_circuited = 0
+        self._failures = [] # monotonic times of recent 5xx/timeouts while closed
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _error(self, now):
+        retry_in = max(0.0, self.opened_at + self.cooldown_seconds - now)
+        return CircuitOpenError(self.endpoint, self.reason, self.status, retry_in)
+
+    def allow(self):
+        """Returns True if this request is the half-open probe, False for a normal request."""
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.cooldown_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"Circuit for {self.endpoint}: sending a half-open probe.")
+                return True
+            self.short_circuited += 1
+            raise self._error(now)
+
+    def check(self):
+        """
+        Raises CircuitOpenError if allow() would, without claiming the probe. Lets callers fail
+        fast before queueing for the rate limiter; allow() still decides once they are admitted.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at < self.cooldown_seconds or self._probe_in_flight:
+                self.short_circuited += 1
+                raise self._error(now)
+
+    def open_error(self):
+        """The CircuitOpenError callers would get now, or None while the circuit is closed."""
+        with self._lock:
+            return None if self.state == CLOSED else self._error(time.monotonic())
+
+    def on_response(self, status, probe=False):
+        """Reports an HTTP status (None if the request ended without a usable outcome)."""
+        if status == 401:
+            self._trip("auth: 401 Unauthorized", status, probe)
+            _open_auth_siblings(self)
+        elif status is not None and status >= 500:
+            self._record_failure(f"upstream: {status}", status, probe)
+        elif status is not None and status != 429:
+            self._close(probe)
+        elif probe: # 429 or no outcome says nothing about the endpoint; let the next caller probe
+            with self._lock:
+                self._probe_in_flight = False
+
+    def on_failure(self, reason, probe=False):
+        """Reports a timeout or connection failure."""
+        self._record_failure(f"network: {reason}", None, probe)
+
+    def _record_failure(self, reason, status, probe):
+        if probe:
+            self._trip(reason, status, probe)
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            now = time.monotonic()
+            self._failures = [t for t in self._failures if now - t < CIRCUIT_FAILURE_WINDOW_SECONDS]
+            self._failures.append(now)
+            if len(self._failures) < CIRCUIT_FAILURE_THRESHOLD:
+                return
+        self._trip(f"{reason} ({CIRCUIT_FAILURE_THRESHOLD} failures in {CIRCUIT_FAILURE_WINDOW_SECONDS:.0f} s)", status, probe)
+
+    def _trip(self, reason, status, probe=False):
+        with self._lock:
+            if self.state == OPEN and not probe:
+                return
+            if probe: # The probe failed: back off further before the next one
+                self.cooldown_seconds = min(self.cooldown_seconds * 2, CIRCUIT_MAX_COOLDOWN_SECONDS)
+                self._probe_in_flight = False
+            self.state, self.reason, self.status = OPEN, reason, status
+            self.opened_at = time.monotonic()
+            self._failures = []
+            cooldown = self.cooldown_seconds
+        logger.error(f"Circuit for {self.endpoint} opened ({reason}); short-circuiting requests for {cooldown:.0f} s.")
+
+    def _close(self, probe):
+        with self._lock:
+            if self.state == CLOSED:
+                self._failures = []
+                return
+            if not probe:
+                return
+            skipped = self.short_circuited
+            self.state, self.reason, self.status = CLOSED, None, None
+            self.cooldown_seconds = CIRCUIT_COOLDOWN_SECONDS
+            self.short_circuited = 0
+            self._probe_in_flight = False
+        with _breakers_lock:
+            _auth_failed.pop(self.access_token, None)
+        logger.info(f"Circuit for {self.endpoint} closed after a successful probe ({skipped} requests were short-circuited).")
+
+    def _open_for_auth(self, source_endpoint):
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self.state, self.status = OPEN, 401
+            self.reason = f"auth: 401 Unauthorized on {source_endpoint}"
+            self.opened_at = time.monotonic()
+            self._failures = []
+
+# --- 4. Registry ---
+
+def endpoint_of(url):
+    """
+    The endpoint a URL belongs to, with instrument keys and dates dropped from its path:
+    .../historical-candle/NSE_EQ%7CINE002A01018/days/1/2025-05-22 -> /v3/historical-candle/days/1
+    """
+    segments = [s for s in urlsplit(url).path.split('/')
+                if s and '|' not in unquote(s) and not _DATE_SEGMENT.match(s)]
+    return '/' + '/'.join(segments)
+
+def circuit_breaker(access_token, url):
+    """The process-wide breaker for `url`'s endpoint under `access_token`, created on first use."""
+    key = (access_token, endpoint_of(url))
+    breaker = _breakers.get(key)
+    if breaker is not None:
+        return breaker
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key[1], access_token)
+            if access_token in _auth_failed:
+                breaker._open_for_auth(_auth_failed[access_token])
+    return breaker
+
+def _open_auth_siblings(source):
+    # A 401 condemns the token, not the endpoint: open its other endpoints too, so a bad token
+    # costs one request in total rather than one per endpoint
+    with _breakers_lock:
+        _auth_failed[source.access_token] = source.endpoint
+        siblings = [b for (token, _), b in _breakers.items() if token == source.access_token and b is not source]
+    for breaker in siblings:
+        breaker._open_for_auth(source.endpoint)
+
+def open_circuits(access_token):
+    """Structured errors (CircuitOpenError.to_dict()) for every endpoint currently open for the token."""
+    with _breakers_lock:
+        breakers = [b for (token, _), b in _breakers.items() if token == access_token]
+    errors = (b.open_error() for b in breakers)
+    return [e.to_dict() for e in errors if e is not None]
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Optional: without it chunks are dicts of NumPy arrays and exports are .npz parts
+    pa = pq = None
+
+from screen_store import DB_PATH, open_screen_store
+from candle_cache import CANDLE_CACHE_PATH
+from candle_archive import CANDLE_ARCHIVE_PATH, decode_session
+
+# Bulk, columnar reads of the stored screening data and cached candles for analytics:
+#
+#   screen_rows  one row per (trade_date, symbol): previous close/OI, 09:20 price/OI, error
+#   screen_hits  one row per (trade_date, symbol) that passed the filter, with its % change
+#   candles      one row per cached candle, exploded from candle_cache's per-session JSON lists
+#                (daily candles and today's 1-minute session)
+#   archived_candles  one row per 1-minute candle of the finished sessions in candle_archive
+#
+# Each dataset is read in chunks of CHUNK_ROWS rows over a read-only connection, filtered in
+# SQL on a trade date range and a symbol set (instrument keys for candles), and each chunk is
+# turned into columns at once: a pyarrow.RecordBatch when pyarrow is installed, otherwise a
+# dict of NumPy arrays. Memory stays bounded by one chunk however many months are read. The
+# screen store is opened (and so migrated from the legacy per-date tables) before it is read.
+
+# --- 1. Configuration ---
+CHUNK_ROWS = int(os.environ.get("COLUMNAR_EXPORT_CHUNK_ROWS", 65536))
+DEFAULT_FORMAT = "arrow" if pa is not None else "numpy"
+CANDLE_TIMEZONE = "Asia/Kolkata" # Upstox candle timestamps are IST; arrow keeps the zone, NumPy stores UTC
+
+logger = logging.getLogger(__name__)
+
+# Column kinds and how each is represented. Nullable integers are float64 (NaN for NULL) in
+# NumPy, which has no integer null; arrow keeps them int64 with nulls.
+_ARROW_TYPES = {"text": "string", "date": "date32", "int": "int64", "nullable_int": "int64", "float": "float64"}
+_NUMPY_DTYPES = {"date": "datetime64[D]", "int": np.int64, "nullable_int": np.float64, "float": np.float64,
+                 "timestamp": "datetime64[s]"}
+
+_SCREEN_ROW_COLUMNS = (("trade_date", "date"), ("symbol", "text"), ("run_id", "int"), ("previous_date", "date"),
+                       ("prev_day_equity_close", "float"), ("prev_day_equity_oi", "nullable_int"),
+                       ("equity_920_price", "float"), ("equity_920_oi", "nullable_int"),
+                       ("error_message", "text"), ("record_timestamp", "text"))
+_SCREEN_HIT_COLUMNS = (("trade_date", "date"), ("symbol", "text"), ("run_id", "int"),
+                       ("percent_change", "float"), ("record_timestamp", "text"))
+_CANDLE_COLUMNS = (("instrument_key", "text"), ("unit", "text"), ("interval", "int"), ("trading_date", "date"),
+                   ("timestamp", "timestamp"), ("open", "float"), ("high", "float"), ("low", "float"),
+                   ("close", "float"), ("volume", "int"), ("oi", "int"))
+_ARCHIVED_CANDLE_COLUMNS = (("instrument_key", "text"), ("trading_date", "date"), ("timestamp", "timestamp"),
+                            ("open", "float"), ("high", "float"), ("low", "float"), ("close", "float"),
+                            ("volume", "int"), ("oi", "int"))
+
+_DATASET_COLUMNS = {"screen_rows": _SCREEN_ROW_COLUMNS, "screen_hits": _SCREEN_HIT_COLUMNS, "candles": _CANDLE_COLUMNS,
+                    "archived_candles": _ARCHIVED_CANDLE_COLUMNS}
+DATASETS = tuple(_DATASET_COLUMNS)
+
+# --- 2. Reading ---
+
+def _connect_read_only(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No database at {path}")
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+def _screen_store_path(path):
+    """The screen store's file, opened once through open_screen_store so its tables exist and legacy tables are imported."""
+    path = path or DB_PATH
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No database at {path}")
+    try:
+        open_screen_store(path)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Screen store at {path} is not migrated and could not be migrated ({e}); "
+                           f"run: python screen_store.py migrate --db {path}") from e
+    return path
+
+def _filters(date_column, key_column, start_date, end_date, keys):
+    """WHERE clause and parameters; the key set is passed as one JSON parameter, whatever its size."""
+    clauses, params = [], []
+    if start_date is not None:
+        clauses.append(f"{date_column} >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append(f"{date_column} <= ?")
+        params.append(str(end_date))
+    if keys is not None:
+        clauses.append(f"{key_column} IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(sorted(set(keys))))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def _sql_chunks(path, sql, params, chunk_rows):
+    conn = _connect_read_only(path)
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def _rechunk(sessions, chunk_rows):
+    """Lists of column arrays, chunk_rows rows each (the last may be shorter), from per-session lists of column arrays."""
+    pending, n_pending = [], 0
+    for columns in sessions:
+        pending.append(columns)
+        n_pending += len(columns[0])
+        if n_pending >= chunk_rows:
+            columns = [np.concatenate(parts) for parts in zip(*pending)]
+            while len(columns[0]) >= chunk_rows:
+                yield [column[:chunk_rows] for column in columns]
+                columns = [column[chunk_rows:] for column in columns]
+            pending, n_pending = [columns], len(columns[0])
+    if n_pending:
+        yield [np.concatenate(parts) for parts in zip(*pending)]
+
+def _candle_sessions(path, where, params, chunk_rows):
+    """
+    Lists of column arrays in _CANDLE_COLUMNS order, one per stored session. Each session is
+    parsed once and split into columns with zip(), so no per-candle tuples are built.
+    """
+    epoch_seconds = {} # Every instrument's session shares the same timestamps; parse each once
+    sql = f"SELECT instrument_key, unit, interval, trading_date, candles FROM candles{where} ORDER BY trading_date, instrument_key"
+    # Each stored row is a whole session (hundreds of candles), so fewer rows are fetched at a time
+    for entries in _sql_chunks(path, sql, params, max(1, chunk_rows // 256)):
+        for instrument_key, unit, interval, trading_date, candles_json in entries:
+            candles = json.loads(candles_json)
+            if not candles:
+                continue
+            timestamps, *values = zip(*candles)
+            n = len(candles)
+            for stamp in timestamps:
+                if stamp not in epoch_seconds:
+                    epoch_seconds[stamp] = int(datetime.fromisoformat(stamp).timestamp())
+            yield [np.full(n, instrument_key), np.full(n, unit), np.full(n, interval, dtype=np.int64),
+                   np.full(n, trading_date, dtype="datetime64[D]"),
+                   np.fromiter(map(epoch_seconds.__getitem__, timestamps), dtype=np.int64, count=n),
+                   *(np.array(column, dtype=np.float64) for column in values[:4]),
+                   *(np.array(column, dtype=np.int64) for column in values[4:6])]
+
+def _archived_sessions(path, where, params, chunk_rows):
+    """Lists of column arrays in _ARCHIVED_CANDLE_COLUMNS order, one per archived session, decoded from its blob."""
+    sql = f"SELECT instrument_key, trading_date, data FROM sessions{where} ORDER BY trading_date, instrument_key"
+    for entries in _sql_chunks(path, sql, params, max(1, chunk_rows // 256)):
+        for instrument_key, trading_date, blob in entries:
+            session = decode_session(blob)
+            n = len(session["timestamp"])
+            if n:
+                yield [np.full(n, instrument_key), np.full(n, trading_date, dtype="datetime64[D]"),
+                       *(session[name] for name, _ in _ARCHIVED_CANDLE_COLUMNS[2:])]
+
+def _select(dataset, columns):
+    """The dataset's (name, kind) columns, narrowed to `columns` (in the dataset's order) if given."""
+    if dataset not in _DATASET_COLUMNS:
+        raise ValueError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    if columns is None:
+        return _DATASET_COLUMNS[dataset]
+    unknown = set(columns) - {name for name, _ in _DATASET_COLUMNS[dataset]}
+    if unknown:
+        raise ValueError(f"Unknown {dataset} columns: {', '.join(sorted(unknown))}")
+    return tuple(column for column in _DATASET_COLUMNS[dataset] if column[0] in columns)
+
+def _column_chunks(dataset, path, start_date, end_date, symbols, unit, interval, columns, chunk_rows):
+    """Lists of column values (sequences or arrays), in `columns` order, one list per chunk."""
+    if dataset in ("candles", "archived_candles"):
+        where, params = _filters("trading_date", "instrument_key", start_date, end_date, symbols)
+        if dataset == "candles":
+            for column, value in (("unit", unit), ("interval", interval)):
+                if value is not None:
+                    where += (" AND " if where else " WHERE ") + f"{column} = ?"
+                    params.append(value)
+            sessions = _candle_sessions(path or CANDLE_CACHE_PATH, where, params, chunk_rows)
+        else:
+            sessions = _archived_sessions(path or CANDLE_ARCHIVE_PATH, where, params, chunk_rows)
+        positions = [[name for name, _ in _DATASET_COLUMNS[dataset]].index(name) for name, _ in columns]
+        for chunk in _rechunk(sessions, chunk_rows):
+            yield [chunk[i] for i in positions]
+        return
+    # Only the selected columns are read; SQLite's per-value cost dominates these loads
+    where, params = _filters("trade_date", "symbol", start_date, end_date, symbols)
+    sql = f"SELECT {', '.join(name for name, _ in columns)} FROM {dataset}{where} ORDER BY trade_date, symbol"
+    for rows in _sql_chunks(_screen_store_path(path), sql, params, chunk_rows):
+        yield list(zip(*rows))
+
+# --- 3. Columns ---
+
+def _dates(values):
+    """'YYYY-MM-DD' strings (None for NULL) as datetime64[D]; each distinct date is parsed once."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values
+    strings = np.array(["NaT" if v is None else v for v in values], dtype=str)
+    distinct, inverse = np.unique(strings, return_inverse=True)
+    return distinct.astype("datetime64[D]")[inverse]
+
+def _arrow_type(kind):
+    if kind == "timestamp":
+        return pa.timestamp("s", tz=CANDLE_TIMEZONE)
+    return getattr(pa, _ARROW_TYPES[kind])()
+
+def _arrow_column(values, kind):
+    if kind == "date":
+        days = _dates(values)
+        return pa.array(days, type=pa.date32(), mask=np.isnat(days))
+    return pa.array(values, type=_arrow_type(kind))
+
+def _numpy_column(values, kind):
+    if kind == "date":
+        return _dates(values)
+    if kind == "text":
+        if isinstance(values, np.ndarray):
+            return values.astype(str)
+        return np.array(["" if v is None else v for v in values], dtype=str) # NULL text becomes ""
+    return np.asarray(values, dtype=_NUMPY_DTYPES[kind]) # NULL becomes NaN
+
+def _to_columns(columns, values_by_column, fmt):
+    if fmt == "arrow":
+        return pa.RecordBatch.from_arrays([_arrow_column(values, kind) for (_, kind), values in zip(columns, values_by_column)],
+                                          names=[name for name, _ in columns])
+    return {name: _numpy_column(values, kind) for (name, kind), values in zip(columns, values_by_column)}
+
+def _check_format(fmt):
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in ("arrow", "numpy"):
+        raise ValueError(f"Unknown format {fmt!r}; expected 'arrow' or 'numpy'")
+    if fmt == "arrow" and pa is None:
+        raise RuntimeError("format='arrow' needs pyarrow (pip install pyarrow); use format='numpy'")
+    return fmt
+
+def iter_chunks(dataset, path=None, start_date=None, end_date=None, symbols=None,
+                unit=None, interval=None, columns=None, chunk_rows=CHUNK_ROWS, fmt=None):
+    """
+    Yields `dataset` (see DATASETS) in chunks of up to chunk_rows rows, ordered by date then
+    symbol/instrument: pyarrow.RecordBatch for fmt='arrow', {column: numpy array} for
+    fmt='numpy' (default: arrow when pyarrow is installed). Dates are inclusive 'YYYY-MM-DD'
+    bounds on trade_date (trading_date for candles); `symbols` is a set of symbols, or of
+    instrument keys for candles. `unit`/`interval` select one cached candle series, e.g.
+    ('days', 1); archived_candles are always 1-minute. `columns` limits the output (and, for
+    the screen tables, the read) to those columns. `path` defaults to the screen store's, the
+    candle cache's or the candle archive's file.
+    """
+    selected, fmt = _select(dataset, columns), _check_format(fmt)
+    for values_by_column in _column_chunks(dataset, path, start_date, end_date, symbols, unit, interval, selected, chunk_rows):
+        yield _to_columns(selected, values_by_column, fmt)
+
+def read_columns(dataset, path=None, start_date=None, end_date=None, symbols=None,
+                 unit=None, interval=None, columns=None, chunk_rows=CHUNK_ROWS, fmt=None):
+    """The whole selection at once: a pyarrow.Table, or {column: numpy array}. See iter_chunks()."""
+    selected, fmt = _select(dataset, columns), _check_format(fmt)
+    chunks = list(iter_chunks(dataset, path, start_date, end_date, symbols, unit, interval, columns, chunk_rows, fmt))
+    if fmt == "arrow":
+        return pa.Table.from_batches(chunks, schema=pa.schema([(name, _arrow_type(kind)) for name, kind in selected]))
+    if not chunks:
+        return {name: _numpy_column([], kind) for name, kind in selected}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+# --- 4. Export ---
+
+def export(dataset, out_path, path=None, start_date=None, end_date=None, symbols=None,
+           unit=None, interval=None, columns=None, chunk_rows=CHUNK_ROWS, fmt=None):
+    """
+    Streams the selection to disk one chunk at a time: a Parquet file with one row group per
+    chunk (fmt='arrow'), or a directory of part-NNNNN.npz files (fmt='numpy'), each loadable
+    with numpy.load. Returns {"path", "format", "rows", "chunks"}.
+    """
+    fmt = _check_format(fmt)
+    n_rows = n_chunks = 0
+    writer = None
+    if fmt == "numpy":
+        os.makedirs(out_path, exist_ok=True)
+    try:
+        for chunk in iter_chunks(dataset, path, start_date, end_date, symbols, unit, interval, columns, chunk_rows, fmt):
+            if fmt == "arrow":
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, chunk.schema)
+                writer.write_batch(chunk)
+                n_rows += chunk.num_rows
+            else:
+                np.savez(os.path.join(out_path, f"part-{n_chunks:05d}.npz"), **chunk)
+                n_rows += len(next(iter(chunk.values())))
+            n_chunks += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info(f"Exported {n_rows} {dataset} rows in {n_chunks} chunks to {out_path} ({fmt}).")
+    return {"path": out_path, "format": fmt, "rows": n_rows, "chunks": n_chunks}
+
+# --- 5. Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored screen rows/hits, cached or archived candles in columnar form.")
+    parser.add_argument("dataset", choices=DATASETS)
+    parser.add_argument("out", help="Parquet file (arrow) or directory of .npz parts (numpy)")
+    parser.add_argument("--db", help=f"database file (default: {DB_PATH}, {CANDLE_CACHE_PATH} for candles "
+                                     f"or {CANDLE_ARCHIVE_PATH} for archived_candles)")
+    parser.add_argument("--from", dest="start_date", help="first trade date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", help="last trade date, YYYY-MM-DD")
+    parser.add_argument("--symbols", help="comma-separated symbols (instrument keys for candles)")
+    parser.add_argument("--unit", help="candles: unit, e.g. minutes or days (archived_candles are 1-minute)")
+    parser.add_argument("--interval", type=int, help="candles: interval, e.g. 1")
+    parser.add_argument("--columns", help="comma-separated columns to export (default: all)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--format", dest="fmt", choices=("arrow", "numpy"), default=DEFAULT_FORMAT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None
+    summary = export(args.dataset, args.out, args.db, args.start_date, args.end_date, symbols,
+                     args.unit, args.interval, columns, args.chunk_rows, args.fmt)
+    print(json.dumps(summary))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import os
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
+
+from instrument_master import IST
+from upstox_http import upstox_get
+from fetch_engine import fetch_concurrently
+from single_flight import SingleFlight, AsyncSingleFlight
+
+# --- 1. Configuration ---
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com")
+# A single-day miss fetches this many days back from the requested date in the same request,
+# so re-runs and comparisons against nearby prior closes are answered without another call.
+DAILY_RANGE_LOOKBACK_DAYS = int(os.environ.get("DAILY_RANGE_LOOKBACK_DAYS", 30))
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Helpers ---
+
+def _as_date(value):
+    return value if isinstance(value, date) else datetime.strptime(value, '%Y-%m-%d').date()
+
+def daily_range_path(instrument_key, from_date, to_date):
+    """The days/1 path for every session from `from_date` to `to_date` inclusive (the API takes to_date first)."""
+    return f"/v3/historical-candle/{quote(instrument_key)}/days/1/{_as_date(to_date).isoformat()}/{_as_date(from_date).isoformat()}"
+
+def split_by_day(candles):
+    """{'YYYY-MM-DD': candle} from a days/1 candle list, keyed by the candle timestamp's date."""
+    return {candle[0][:10]: candle for candle in candles or () if candle and len(candle) >= 7}
+
+def fetch_daily_range(access_token, instrument_key, from_date, to_date, api_base_url=API_BASE_URL, timeout=15):
+    """
+    Every daily candle of `instrument_key` from `from_date` to `to_date` in one request, split
+    per day. Raises requests' HTTPError (and circuit_breaker.CircuitOpenError) like the fetchers'
+    own calls, so callers keep their error handling.
+    """
+    response = upstox_get(access_token, f"{api_base_url}{daily_range_path(instrument_key, from_date, to_date)}", timeout=timeout)
+    response.raise_for_status()
+    return split_by_day((response.json().get("data") or {}).get("candles"))
+
+# --- 3. Range Cache ---
+
+class DailyCandleRanges:
+    """
+    Daily candles per instrument, fetched a date range at a time and served per day from memory.
+
+    candle(key, date) answers from a previously fetched range when one covers the date; a day
+    inside a covered range without a candle (holiday, suspension) is answered as None without
+    asking again. On a miss, one request fetches DAILY_RANGE_LOOKBACK_DAYS up to the date, and
+    prefetch() covers an explicit range for many instruments at once. Today's (IST) session is
+    still forming, and a day after the newest candle returned may not be published yet, so
+    ranges are only recorded as covered up to the earlier of yesterday and that candle's day;
+    later days are fetched again. Failed fetches are not recorded. Thread-safe; candle_async() is the same
+    lookup through an AsyncUpstoxClient. Concurrent misses for one instrument share a single
+    range request when its range covers their dates.
+
+    With a candle_cache.CandleCache, every fetched day (including days without a session) is
+    also written to it as a ("days", 1) entry and consulted before fetching, so ranges survive
+    restarts; days without a candle past the covered part expire there like today's.
+    """
+
+    def __init__(self, access_token, api_base_url=API_BASE_URL, lookback_days=DAILY_RANGE_LOOKBACK_DAYS, cache=None):
+        self.access_token = access_token
+        self.api_base_url = api_base_url
+        self.lookback_days = lookback_days
+        self.cache = cache
+        self._candles = {} # instrument_key -> {'YYYY-MM-DD': candle}
+        self._covered = {} # instrument_key -> [(from_date, to_date)] already fetched
+        self._lock = threading.Lock()
+        self._fetches = SingleFlight("daily range fetch") # Keyed by instrument: one range request in flight each
+        self._async_fetches = AsyncSingleFlight("daily range fetch")
+        self.stats = {"hits": 0, "range_requests": 0}
+
+    def _lookup(self, instrument_key, day):
+        """(True, candle-or-None) if a fetched range covers `day`, else (False, None)."""
+        with self._lock:
+            if any(start <= day <= end for start, end in self._covered.get(instrument_key, ())):
+                self.stats["hits"] += 1
+                return True, self._candles.get(instrument_key, {}).get(day.isoformat())
+        return False, None
+
+    def _cached(self, instrument_key, day):
+        """(True, candle-or-None) if the persistent cache has `day`, else (False, None)."""
+        if self.cache is None:
+            return False, None
+        candles = self.cache.get(instrument_key, "days", 1, day.isoformat())
+        if candles is None:
+            return False, None
+        return True, candles[0] if candles else None
+
+    def _record(self, instrument_key, from_date, to_date, by_day):
+        today = datetime.now(IST).date()
+        # A day without a candle only counts as "no session" before the newest candle returned:
+        # later ones (yesterday's, say) may just not be published yet
+        newest = max((_as_date(day) for day in by_day), default=from_date - timedelta(days=1))
+        last_settled = min(today - timedelta(days=1), newest)
+        if self.cache is not None:
+            days = (from_date + timedelta(days=i) for i in range((min(to_date, today) - from_date).days + 1))
+            self.cache.put_days(instrument_key, "days", 1, {d.isoformat(): [by_day[d.isoformat()]] if d.isoformat() in by_day else [] for d in days},
+                                settled_through=last_settled)
+        with self._lock:
+            self.stats["range_requests"] += 1
+            self._candles.setdefault(instrument_key, {}).update(
+                (day, candle) for day, candle in by_day.items() if day <= last_settled.isoformat())
+            if from_date <= last_settled:
+                self._covered.setdefault(instrument_key, []).append((from_date, min(to_date, last_settled)))
+
+    def _miss_range(self, day):
+        return day - timedelta(days=self.lookback_days), day
+
+    def fetch_range(self, instrument_key, from_date, to_date, timeout=15):
+        """Fetches and records one range; returns its per-day candles."""
+        from_date, to_date = _as_date(from_date), _as_date(to_date)
+        by_day = fetch_daily_range(self.access_token, instrument_key, from_date, to_date, self.api_base_url, timeout)
+        self._record(instrument_key, from_date, to_date, by_day)
+        return by_day
+
+    def _fetch_miss(self, instrument_key, from_date, to_date, timeout):
+        return from_date, to_date, self.fetch_range(instrument_key, from_date, to_date, timeout=timeout)
+
+    def candle(self, instrument_key, date_str, timeout=15):
+        """The daily candle of `instrument_key` on `date_str`, or None if it did not trade that day."""
+        day = _as_date(date_str)
+        while True:
+            for lookup in (self._lookup, self._cached):
+                covered, candle = lookup(instrument_key, day)
+                if covered:
+                    return candle
+            fetched_from, fetched_to, by_day = self._fetches.do(
+                instrument_key, self._fetch_miss, instrument_key, *self._miss_range(day), timeout)
+            if fetched_from <= day <= fetched_to:
+                return by_day.get(day.isoformat())
+            # Joined another date's request for this instrument that doesn't reach `day`; look again
+
+    async def candle_async(self, client, instrument_key, date_str, timeout_seconds=15):
+        """candle() through an open AsyncUpstoxClient."""
+        day = _as_date(date_str)
+
+        async def fetch_miss(from_date, to_date):
+            candles = await client.get_candles(daily_range_path(instrument_key, from_date, to_date), timeout_seconds=timeout_seconds)
+            by_day = split_by_day(candles)
+            self._record(instrument_key, from_date, to_date, by_day)
+            return from_date, to_date, by_day
+
+        while True:
+            for lookup in (self._lookup, self._cached):
+                covered, candle = lookup(instrument_key, day)
+                if covered:
+                    return candle
+            fetched_from, fetched_to, by_day = await self._async_fetches.do(instrument_key, fetch_miss, *self._miss_range(day))
+            if fetched_from <= day <= fetched_to:
+                return by_day.get(day.isoformat())
+
+    def prefetch(self, instrument_keys, from_date, to_date):
+        """
+        Covers `from_date`..`to_date` for every instrument with one request each (concurrently),
+        skipping instruments already covered. Returns the number of failed instruments.
+        """
+        from_date, to_date = _as_date(from_date), _as_date(to_date)
+        with self._lock:
+            pending = [key for key in dict.fromkeys(instrument_keys)
+                       if not any(start <= from_date and to_date <= end for start, end in self._covered.get(key, ()))]
+
+        def fetch(key):
+            try:
+                self.fetch_range(key, from_date, to_date)
+                return True
+            except Exception as e: # requests errors and open circuits alike; candle() will retry per day
+                logger.warning(f"Daily range {from_date}..{to_date} for {key} failed: {e}")
+                return False
+
+        results = fetch_concurrently([(fetch, (key,)) for key in pending], probe_first=True)
+        failed = results.count(False)
+        logger.info(f"Prefetched daily candles {from_date}..{to_date} for {len(pending) - failed}/{len(pending)} instruments.")
+        return failed
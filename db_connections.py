@@ -0,0 +1,145 @@
+import os
+import queue
+import sqlite3
+import weakref
+import logging
+import threading
+from concurrent.futures import Future
+
+# --- 1. Configuration ---
+# Prepared statements kept per connection; the screen store issues a few dozen distinct ones
+STATEMENT_CACHE_SIZE = int(os.environ.get("SQLITE_STATEMENT_CACHE_SIZE", 256))
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Reader:
+    """Holds one thread's reader connection in its threading.local; collected when the thread exits."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.finalizer = None
+
+# --- 2. Connection Manager ---
+
+class SQLiteConnectionManager:
+    """
+    Long-lived connections to one SQLite file in WAL mode:
+
+    - one writer connection, owned by a dedicated thread that runs submitted write functions
+      one at a time from a queue, so writes are serialized without lock contention or
+      SQLITE_BUSY retries between threads;
+    - one read-only connection per reading thread, opened on first use and kept while the thread
+      lives, so pool threads keep their page cache and prepared statements between calls, and
+      closed when the thread exits, so short-lived request threads don't leave connections
+      behind. In WAL mode these read a consistent snapshot and never wait for the writer, nor
+      it for them.
+
+    `pragmas` are applied to every connection (e.g. {"synchronous": "NORMAL", "cache_size": -16384});
+    `setup(conn)` runs once on the writer connection before any submitted write.
+    """
+
+    def __init__(self, path, pragmas=None, setup=None, name="sqlite-writer"):
+        self.path = path
+        self.pragmas = dict(pragmas or {})
+        self._local = threading.local()
+        self._readers = weakref.WeakSet() # Live threads' readers, so close() can close them all
+        self._readers_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self.stats = {"writes": 0, "write_errors": 0, "max_queue_depth": 0, "readers_opened": 0, "readers_closed": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        started = Future()
+        self._writer = threading.Thread(target=self._run_writer, args=(setup, started), name=name, daemon=True)
+        self._writer.start()
+        started.result() # Surface schema/setup errors to the caller
+
+    def _configure(self, conn):
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    # Writes
+
+    def _run_writer(self, setup, started):
+        try:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._configure(conn)
+            if setup:
+                setup(conn)
+        except BaseException as e:
+            started.set_exception(e)
+            return
+        started.set_result(None)
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            fn, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(conn))
+                self.stats["writes"] += 1
+            except BaseException as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.stats["write_errors"] += 1
+                future.set_exception(e)
+        conn.close()
+
+    def submit(self, fn):
+        """Queues fn(conn) for the writer thread; returns a Future of its result."""
+        if threading.current_thread() is self._writer:
+            raise RuntimeError("submit() called from the writer thread; call the function directly")
+        future = Future()
+        self._queue.put((fn, future))
+        depth = self._queue.qsize()
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+        return future
+
+    def write(self, fn):
+        """Runs fn(conn) on the writer connection and returns its result (re-raising its error)."""
+        return self.submit(fn).result()
+
+    # Reads
+
+    def reader(self):
+        """The calling thread's read-only connection, opened on first use and closed when the thread exits."""
+        holder = getattr(self._local, "reader", None)
+        if holder is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30,
+                                   cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+            self._configure(conn)
+            holder = _Reader(conn)
+            # The thread's locals are dropped when it exits, and the holder with them
+            holder.finalizer = weakref.finalize(holder, self._close_reader, conn)
+            self._local.reader = holder
+            with self._readers_lock:
+                self._readers.add(holder)
+                self.stats["readers_opened"] += 1
+        return holder.conn
+
+    def _close_reader(self, conn):
+        conn.close()
+        with self._readers_lock:
+            self.stats["readers_closed"] += 1
+
+    @property
+    def open_readers(self):
+        return self.stats["readers_opened"] - self.stats["readers_closed"]
+
+    def close(self):
+        """Finishes the queued writes, then closes the writer and every reader connection."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._readers_lock:
+            holders = list(self._readers)
+        for holder in holders:
+            holder.finalizer()
+        self._local = threading.local()
@@ -1,14 +1,13 @@
 import sqlite3
 import json
-from datetime import datetime, timezone
 import logging
 
+from screen_store import open_screen_store
+
 # --- Configuration & Initialization ---
 DB_PATH = "./upstox_data_v2.db"
-TARGET_DATE_STR_FOR_TABLES = "2025-05-23" # Date for table naming
-
-RAW_DATA_TABLE_NAME = f"data_{TARGET_DATE_STR_FOR_TABLES.replace('-', '_')}"
-FILTERED_DATA_TABLE_NAME = f"filtered_{TARGET_DATE_STR_FOR_TABLES.replace('-', '_')}"
+TARGET_DATE_STR = "2025-05-23" # trade_date the rows and hits are stored under
+PREVIOUS_DATE_STR = "2025-05-22"
 
 # Logging Setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
@@ -28,93 +27,25 @@ SIMULATED_FILTERED_STOCKS_PERCENT_CHANGE = [
 
 def store_processed_data(all_stocks_data, filtered_stocks_data):
     """
-    Stores raw processed stock data and filtered stock list into SQLite database.
+    Stores raw processed stock data and filtered stock list as one run in the screen store.
     """
-    conn = None
     summary = {
         "status": "pending",
-        "raw_data_table": RAW_DATA_TABLE_NAME,
-        "filtered_data_table": FILTERED_DATA_TABLE_NAME,
+        "trade_date": TARGET_DATE_STR,
+        "run_id": None,
         "raw_rows_inserted": 0,
         "filtered_rows_inserted": 0,
         "errors": []
     }
 
     try:
-        logging.info(f"Connecting to database at: {DB_PATH}")
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # --- 1. Store Raw Data ---
-        logging.info(f"Preparing to store raw data into table: {RAW_DATA_TABLE_NAME}")
-        cursor.execute(f"DROP TABLE IF EXISTS {RAW_DATA_TABLE_NAME}")
-        create_raw_table_sql = f"""
-        CREATE TABLE {RAW_DATA_TABLE_NAME} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stock_symbol TEXT NOT NULL,
-            prev_day_equity_close REAL,
-            prev_day_equity_oi INTEGER,
-            equity_920_price REAL,
-            equity_920_oi INTEGER,
-            record_timestamp TEXT NOT NULL
-        );
-        """
-        cursor.execute(create_raw_table_sql)
-        logging.info(f"Table {RAW_DATA_TABLE_NAME} created (or recreated).")
-
-        raw_rows_inserted_count = 0
-        for record in all_stocks_data:
-            current_ts = datetime.now(timezone.utc).isoformat()
-            # Handle cases where data might be None, ensure it's correctly inserted as NULL
-            insert_sql = f"""
-            INSERT INTO {RAW_DATA_TABLE_NAME} (
-                stock_symbol, prev_day_equity_close, prev_day_equity_oi,
-                equity_920_price, equity_920_oi, record_timestamp
-            ) VALUES (?, ?, ?, ?, ?, ?);
-            """
-            # Extract values safely, defaulting to None if key is missing (though data structure is fixed here)
-            data_tuple = (
-                record.get('stock_symbol'),
-                record.get('prev_day_equity_close'),
-                record.get('prev_day_equity_oi'),
-                record.get('equity_920_price'),
-                record.get('equity_920_oi'),
-                current_ts
-            )
-            cursor.execute(insert_sql, data_tuple)
-            raw_rows_inserted_count += 1
-        conn.commit()
-        summary["raw_rows_inserted"] = raw_rows_inserted_count
-        logging.info(f"Successfully inserted {raw_rows_inserted_count} rows into {RAW_DATA_TABLE_NAME}.")
-
-        # --- 2. Store Filtered Data ---
-        logging.info(f"Preparing to store filtered data into table: {FILTERED_DATA_TABLE_NAME}")
-        cursor.execute(f"DROP TABLE IF EXISTS {FILTERED_DATA_TABLE_NAME}")
-        create_filtered_table_sql = f"""
-        CREATE TABLE {FILTERED_DATA_TABLE_NAME} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stock_symbol TEXT NOT NULL,
-            percent_change REAL,
-            record_timestamp TEXT NOT NULL
-        );
-        """
-        cursor.execute(create_filtered_table_sql)
-        logging.info(f"Table {FILTERED_DATA_TABLE_NAME} created (or recreated).")
-
-        filtered_rows_inserted_count = 0
-        for symbol, p_change in filtered_stocks_data:
-            current_ts = datetime.now(timezone.utc).isoformat()
-            insert_sql = f"""
-            INSERT INTO {FILTERED_DATA_TABLE_NAME} (
-                stock_symbol, percent_change, record_timestamp
-            ) VALUES (?, ?, ?);
-            """
-            cursor.execute(insert_sql, (symbol, p_change, current_ts))
-            filtered_rows_inserted_count += 1
-        conn.commit()
-        summary["filtered_rows_inserted"] = filtered_rows_inserted_count
-        logging.info(f"Successfully inserted {filtered_rows_inserted_count} rows into {FILTERED_DATA_TABLE_NAME}.")
-
+        logging.info(f"Storing {len(all_stocks_data)} rows and {len(filtered_stocks_data)} filtered stocks for {TARGET_DATE_STR} in {DB_PATH}")
+        # The simulated records carry their error as 'error'; the store's column is error_message
+        rows = [{**record, 'error_message': record.get('error_message') or record.get('error')} for record in all_stocks_data]
+        summary["run_id"] = open_screen_store(DB_PATH).store_run(
+            TARGET_DATE_STR, PREVIOUS_DATE_STR, rows, filtered_stocks_data, source="db_storage_module")
+        summary["raw_rows_inserted"] = len(rows)
+        summary["filtered_rows_inserted"] = len(filtered_stocks_data)
         summary["status"] = "success"
 
     except sqlite3.Error as e:
@@ -127,10 +58,6 @@ def store_processed_data(all_stocks_data, filtered_stocks_data):
         logging.error(error_msg)
         summary["status"] = "error"
         summary["errors"].append(error_msg)
-    finally:
-        if conn:
-            logging.info("Closing database connection.")
-            conn.close()
     
     return summary
 
@@ -147,15 +74,11 @@ if __name__ == "__main__":
 
     # Optional: Verification by reading from DB (if needed for confirmation here)
     if result_summary["status"] == "success":
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        print(f"\n--- Verifying data in {RAW_DATA_TABLE_NAME} (first 5 rows) ---")
-        cursor.execute(f"SELECT * FROM {RAW_DATA_TABLE_NAME} LIMIT 5")
-        for row in cursor.fetchall():
+        store = open_screen_store(DB_PATH)
+        print(f"\n--- Verifying screen_rows for {TARGET_DATE_STR} (first 5 rows) ---")
+        for row in store.rows(TARGET_DATE_STR)[:5]:
             print(row)
         
-        print(f"\n--- Verifying data in {FILTERED_DATA_TABLE_NAME} (first 5 rows) ---")
-        cursor.execute(f"SELECT * FROM {FILTERED_DATA_TABLE_NAME} LIMIT 5")
-        for row in cursor.fetchall():
+        print(f"\n--- Verifying screen_hits for {TARGET_DATE_STR} (first 5 rows) ---")
+        for row in store.hits(TARGET_DATE_STR)[:5]:
             print(row)
-        conn.close()
@@ -1,26 +1,16 @@
-import requests
-import gzip
 import json
-import io
+
+from instrument_master import load_instrument_master
 
 # --- Data Loading (adapted from nse_downloader.py) ---
 def load_nse_instruments():
-    url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-    try:
-        print("Downloading instrument master data...")
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        print("Download complete. Decompressing...")
-        gzipped_content = response.content 
-        decompressed_content = gzip.decompress(gzipped_content)
-        print("Decompression complete. Parsing JSON...")
-        json_data_str = decompressed_content.decode('utf-8')
-        parsed_data = json.loads(json_data_str)
-        print(f"Parsing complete. Loaded {len(parsed_data)} instruments.")
-        return parsed_data
-    except Exception as e:
-        print(f"An error occurred during data loading: {e}")
+    print("Loading instrument master data (disk cache, revalidated upstream when stale)...")
+    parsed_data = load_instrument_master()
+    if parsed_data is None:
+        print("An error occurred during data loading; see log for details.")
         return None
+    print(f"Loading complete. Loaded {len(parsed_data)} instruments.")
+    return parsed_data
 
 # --- Equity Key Finding Logic ---
 def find_reliance_equity_key(instruments):
@@ -1,10 +1,13 @@
+import os
 import requests
 import json
 from datetime import datetime, date # Not strictly needed for fixed date but good practice
 from urllib.parse import quote
 
+from upstox_http import upstox_get
+
 # Configuration from prompt
-API_BASE_URL = "https://api.upstox.com"
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com")
 EQUITY_INSTRUMENT_KEY_RAW = "NSE_EQ|INE002A01018" # Reliance Equity
 EQUITY_INSTRUMENT_KEY_ENCODED = quote(EQUITY_INSTRUMENT_KEY_RAW)
 
@@ -24,16 +27,11 @@ def fetch_equity_data_for_target_date():
     # Unit "days", interval "1", target_date TARGET_DATE_STR
     api_url = f"{API_BASE_URL}/v3/historical-candle/{EQUITY_INSTRUMENT_KEY_ENCODED}/days/1/{TARGET_DATE_STR}"
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json"
-    }
-
     print(f"Fetching URL: {api_url}")
     print(f"Requesting data for fixed target date: {TARGET_DATE_STR}")
 
     try:
-        response = requests.get(api_url, headers=headers, timeout=15)
+        response = upstox_get(access_token, api_url, timeout=15)
         response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
         
         response_json = response.json()
@@ -0,0 +1,44 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. Configuration ---
+# Upper bound on HTTP requests in flight for one screen run. Upstox rate limits apply per
+# token, so this stays modest; raise it via the environment when the limits allow.
+FETCH_MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", 32))
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Engine ---
+
+def fetch_concurrently(calls, max_workers=FETCH_MAX_WORKERS, on_error=None, probe_first=False):
+    """
+    Runs each (fn, args) in `calls` on a bounded thread pool and returns their results in the
+    same order as `calls`, so callers can zip them back onto the stocks they were issued for.
+
+    The fetchers catch their own HTTP errors and return them as values; `on_error(exc)` only
+    covers anything unexpected that escapes, and its return value takes that call's place so
+    one bad stock never loses the rest of the run. Without on_error such a call yields None.
+
+    With `probe_first`, the first call runs alone before the pool fans out, so that a bad token
+    or a down endpoint opens its circuit breaker after one request rather than a pool's worth.
+    """
+    if not calls:
+        return []
+    start = time.perf_counter()
+    workers = max(1, min(max_workers, len(calls)))
+
+    def run(call):
+        fn, args = call
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.error(f"Unexpected error in {getattr(fn, '__name__', fn)}{args}: {e}", exc_info=True)
+            return on_error(e) if on_error else None
+
+    results = [run(calls[0])] if probe_first else []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+        results.extend(executor.map(run, calls[len(results):]))
+    logger.info(f"Completed {len(calls)} fetches on {workers} threads in {time.perf_counter() - start:.2f} s.")
+    return results
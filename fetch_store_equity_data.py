@@ -1,12 +1,14 @@
-import requests
-import gzip
-import json
-import io
+import os
 import sqlite3
-from datetime import datetime, date, time, timedelta, timezone
+from datetime import datetime, date, time, timedelta
 from urllib.parse import quote
 import logging
 
+from instrument_snapshot import load_instrument_snapshot
+from upstox_http import upstox_get
+from candle_extract import candles_at_times
+from screen_store import open_screen_store
+
 # --- 1. Configuration ---
 STOCK_SYMBOL = "RELIANCE"
 # API_KEY is often used for different auth schemes (e.g., v1, or for specific partner APIs).
@@ -18,7 +20,7 @@ ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJrZXlfaWQiOiJza192MS4wIiwiYWxnIjoiSFMyNTYifQ.e
 # For live operations, a dynamically generated access token is required.
 
 DB_PATH = "./upstox_data_v2.db" # Changed from upstox_data.db to upstox_data_v2.db as per subtask 12
-API_BASE_URL = "https://api.upstox.com"
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com")
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -30,43 +32,29 @@ _instrument_master_cache = None
 
 def get_instrument_master():
     """
-    Fetches (or returns from cache) the NSE instrument master list.
+    Returns the NSE instrument master list from memory, the disk cache, or a fresh download.
     """
     global _instrument_master_cache
     if _instrument_master_cache is not None:
         logging.info("Returning instrument master from cache.")
         return _instrument_master_cache
-
-    url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-    try:
-        logging.info(f"Downloading instrument master from {url}...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        gzipped_content = response.content
-        decompressed_content = gzip.decompress(gzipped_content)
-        json_data_str = decompressed_content.decode('utf-8')
-        _instrument_master_cache = json.loads(json_data_str)
+    _instrument_master_cache = load_instrument_snapshot()
+    if _instrument_master_cache is not None:
         logging.info(f"Successfully loaded and cached {len(_instrument_master_cache)} instruments.")
-        return _instrument_master_cache
-    except Exception as e:
-        logging.error(f"Error fetching/processing instrument master: {e}")
-        return None
+    return _instrument_master_cache
 
 def get_equity_instrument_key(stock_symbol_to_find):
     """
-    Finds the equity instrument key for a given stock symbol from the master list.
+    Finds the equity instrument key for a given stock symbol from the indexed master list.
     """
-    master_list = get_instrument_master()
-    if not master_list:
+    master = get_instrument_master()
+    if not master:
         return None
-    
-    for instrument in master_list:
-        if (instrument.get('trading_symbol') == stock_symbol_to_find and
-            instrument.get('instrument_type') == 'EQ' and
-            instrument.get('segment') == 'NSE_EQ' and # As per subtask 13
-            instrument.get('exchange') == 'NSE'):
-            logging.info(f"Found instrument key for {stock_symbol_to_find}: {instrument.get('instrument_key')}")
-            return instrument.get('instrument_key')
+
+    instrument_key = master.find_equity_key(stock_symbol_to_find)
+    if instrument_key:
+        logging.info(f"Found instrument key for {stock_symbol_to_find}: {instrument_key}")
+        return instrument_key
     logging.warning(f"Equity instrument key for {stock_symbol_to_find} not found.")
     return None
 
@@ -82,11 +70,10 @@ def fetch_historical_daily_data(instrument_key, target_date_str):
 
     encoded_key = quote(instrument_key)
     api_url = f"{API_BASE_URL}/v3/historical-candle/{encoded_key}/days/1/{target_date_str}"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"}
     
     logging.info(f"Fetching historical daily data from: {api_url}")
     try:
-        response = requests.get(api_url, headers=headers, timeout=15)
+        response = upstox_get(ACCESS_TOKEN, api_url, timeout=15)
         response.raise_for_status()
         data = response.json()
         candles = data.get("data", {}).get("candles")
@@ -120,34 +107,20 @@ def fetch_intraday_minute_data(instrument_key, target_datetime_obj):
     encoded_key = quote(instrument_key)
     # This endpoint fetches data for the "current server day". We filter for our target_datetime_obj.
     api_url = f"{API_BASE_URL}/v3/historical-candle/intraday/{encoded_key}/minutes/1"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"}
 
     logging.info(f"Fetching intraday minute data from: {api_url} (will filter for {target_datetime_obj})")
     try:
-        response = requests.get(api_url, headers=headers, timeout=20)
+        response = upstox_get(ACCESS_TOKEN, api_url, timeout=20)
         response.raise_for_status()
-        data = response.json()
-        candles = data.get("data", {}).get("candles")
-
-        if candles and isinstance(candles, list):
-            for candle in candles:
-                if isinstance(candle, list) and len(candle) >= 7:
-                    timestamp_str = candle[0]
-                    try:
-                        dt_obj = datetime.fromisoformat(timestamp_str)
-                        # Compare date and time (stripping timezone for direct comparison if needed, or make target_datetime_obj timezone-aware)
-                        # Assuming target_datetime_obj is naive and API returns tz-aware (+05:30)
-                        if dt_obj.date() == target_datetime_obj.date() and dt_obj.time() == target_datetime_obj.time():
-                            price = candle[4]
-                            oi = candle[6]
-                            logging.info(f"Intraday 09:20 AM data for {target_datetime_obj.date()}: Price={price}, OI={oi}")
-                            return price, oi
-                    except ValueError:
-                        logging.warning(f"Could not parse timestamp in intraday data: {timestamp_str}")
-                        continue # to next candle
-            logging.warning(f"09:20 AM candle for {target_datetime_obj.date()} not found in intraday response.")
-        else:
-            logging.warning(f"No candles returned by intraday API for {instrument_key}.")
+        # target_datetime_obj is naive IST; the candle is located by its "+05:30" timestamp string
+        target_time = target_datetime_obj.time()
+        candle = candles_at_times(response.content, target_datetime_obj.date(), [target_time]).get(target_time)
+        if candle:
+            price = candle[4]
+            oi = candle[6]
+            logging.info(f"Intraday 09:20 AM data for {target_datetime_obj.date()}: Price={price}, OI={oi}")
+            return price, oi
+        logging.warning(f"09:20 AM candle for {target_datetime_obj.date()} not found in intraday response for {instrument_key}.")
             
     except Exception as e:
         logging.error(f"Error fetching intraday minute data: {e}")
@@ -194,60 +167,27 @@ def main():
     )
 
     # --- Store Data in SQLite ---
-    table_name = f"data_{simulated_current_date_obj.strftime('%Y_%m_%d')}"
-    conn = None
+    trade_date = simulated_current_date_obj.isoformat()
     try:
-        logging.info(f"Connecting to database: {DB_PATH} to store data in table: {table_name}")
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Ensure table exists with the correct schema (from subtask 16)
-        # Dropping table for this consolidated script to ensure schema consistency on re-runs.
-        logging.info(f"Dropping table {table_name} if it exists to ensure fresh schema.")
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-        
-        create_table_sql = f"""
-        CREATE TABLE {table_name} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stock_symbol TEXT NOT NULL,
-            prev_day_equity_close REAL,
-            prev_day_equity_oi INTEGER,
-            equity_920_price REAL,
-            equity_920_oi INTEGER,
-            record_timestamp TEXT NOT NULL
-        );
-        """
-        cursor.execute(create_table_sql)
-        logging.info(f"Table {table_name} created/ensured.")
-
-        record_ts = datetime.now(timezone.utc).isoformat()
-        insert_sql = f"""
-        INSERT INTO {table_name} (stock_symbol, prev_day_equity_close, prev_day_equity_oi, 
-                                 equity_920_price, equity_920_oi, record_timestamp)
-        VALUES (?, ?, ?, ?, ?, ?);
-        """
-        data_to_insert = (
-            STOCK_SYMBOL, prev_day_close, prev_day_oi,
-            current_day_920_price, current_day_920_oi, record_ts
-        )
-        cursor.execute(insert_sql, data_to_insert)
-        conn.commit()
-        inserted_id = cursor.lastrowid
-        logging.info(f"Data inserted into {table_name} with ID: {inserted_id}. Data: {data_to_insert}")
+        logging.info(f"Storing data for {STOCK_SYMBOL} on {trade_date} in the screen store at {DB_PATH}")
+        store = open_screen_store(DB_PATH)
+        record = {
+            'stock_symbol': STOCK_SYMBOL,
+            'prev_day_equity_close': prev_day_close, 'prev_day_equity_oi': prev_day_oi,
+            'equity_920_price': current_day_920_price, 'equity_920_oi': current_day_920_oi,
+        }
+        # A single-stock run: this date's other rows and its hits are left as they are
+        run_id = store.store_run(trade_date, simulated_prev_trading_date_obj.isoformat(), [record], None, source="fetch_store_equity_data")
+        logging.info(f"Data stored as run {run_id}. Data: {record}")
         
         # Verification query
-        cursor.execute(f"SELECT * FROM {table_name} WHERE id = ?", (inserted_id,))
-        retrieved_row = cursor.fetchone()
-        logging.info(f"Verified inserted row: {retrieved_row}")
+        retrieved_row = next((row for row in store.rows(trade_date) if row['stock_symbol'] == STOCK_SYMBOL), None)
+        logging.info(f"Verified stored row: {retrieved_row}")
 
     except sqlite3.Error as e:
         logging.error(f"SQLite error: {e}")
     except Exception as e:
         logging.error(f"General error during database operations: {e}")
-    finally:
-        if conn:
-            conn.close()
-            logging.info("Database connection closed.")
             
     logging.info("Equity data fetch and store process finished.")
 
@@ -1,13 +1,18 @@
+import os
 import requests
-import gzip
-import json
-import io
-import re
 import sqlite3
-from datetime import datetime, date, time, timedelta, timezone
+from datetime import date, time, timedelta
 from urllib.parse import quote
 import logging
 
+from instrument_snapshot import load_instrument_snapshot
+from symbol_resolver import resolve_trading_symbols
+from fetch_engine import fetch_concurrently
+from upstox_http import upstox_get, log_connection_stats
+from circuit_breaker import CircuitOpenError, open_circuits
+from candle_extract import candles_at_times
+from screen_store import open_screen_store
+
 # --- 1. Configuration ---
 F_AND_O_STOCK_NAMES = [
     "Reliance Industries", "Tata Consultancy Services (TCS)", "Infosys", "HDFC Bank", 
@@ -41,7 +46,7 @@ ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJrZXlfaWQiOiJza192MS4wIiwiYWxnIjoiSFMyNTYifQ.e
 # The script is designed to handle these failures gracefully.
 
 DB_PATH = "./upstox_data_v2.db"
-API_BASE_URL = "https://api.upstox.com"
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com")
 
 # Test Dates
 PREVIOUS_DAY_FETCH_STR = "2025-05-22" # Thursday
@@ -49,11 +54,6 @@ CURRENT_DAY_CANDLE_TARGET_STR = "2025-05-23"  # Friday (for 9:20 AM candle)
 CURRENT_DAY_CANDLE_TARGET_OBJ = date(2025, 5, 23)
 TARGET_920_TIME = time(9, 20, 0)
 
-# Table naming based on the "current day" for which 9:20 AM data is targeted
-TABLE_NAME_DATE_SUFFIX = CURRENT_DAY_CANDLE_TARGET_STR.replace('-', '_')
-RAW_DATA_TABLE_NAME = f"data_{TABLE_NAME_DATE_SUFFIX}"
-FILTERED_DATA_TABLE_NAME = f"filtered_{TABLE_NAME_DATE_SUFFIX}"
-
 # --- 2. Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s')
 
@@ -62,69 +62,33 @@ _instrument_master_cache = None
 
 # --- 3. Helper Functions ---
 
-def derive_trading_symbol(stock_name_with_suffix):
-    """Derives a trading symbol from a stock name."""
-    match = re.search(r'\((.*?)\)', stock_name_with_suffix)
-    if match:
-        return match.group(1).upper()
-    # More robust split needed for names like "Dr. Reddy's Laboratories"
-    # For now, simple first word, but known to be imperfect.
-    # Example: "Larsen & Toubro" -> "LARSEN" (needs to be LT)
-    # "Dr. Reddy's Laboratories" -> "DR." (needs to be DRREDDY)
-    # This will be a source of "key not found" for many.
-    symbol = stock_name_with_suffix.split()[0].upper()
-    symbol = re.sub(r'[^A-Z0-9]', '', symbol) # Remove non-alphanumeric like '.' from DR.
-    return symbol
-
 def get_instrument_master(api_base_url_unused_param=API_BASE_URL): # param kept for signature consistency if needed
-    """Fetches (or returns from cache) the NSE instrument master list."""
+    """Returns the NSE instrument master list from memory, the disk cache, or a fresh download."""
     global _instrument_master_cache
     if _instrument_master_cache is not None:
         logging.info("Returning instrument master from cache.")
         return _instrument_master_cache
-    
-    url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz" # Hardcoded as it's fixed
-    try:
-        logging.info(f"Downloading instrument master from {url}...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        gzipped_content = response.content
-        decompressed_content = gzip.decompress(gzipped_content)
-        json_data_str = decompressed_content.decode('utf-8')
-        _instrument_master_cache = json.loads(json_data_str)
+    _instrument_master_cache = load_instrument_snapshot()
+    if _instrument_master_cache is not None:
         logging.info(f"Successfully loaded and cached {len(_instrument_master_cache)} instruments.")
-        return _instrument_master_cache
-    except Exception as e:
-        logging.error(f"Error fetching/processing instrument master: {e}")
-        return None
-
-def find_equity_instrument_key(stock_symbol, instrument_master):
-    """Finds the equity instrument key from the provided master list."""
-    if not instrument_master: return None
-    for instrument in instrument_master:
-        if (instrument.get('trading_symbol') == stock_symbol and
-            instrument.get('instrument_type') == 'EQ' and
-            instrument.get('segment') == 'NSE_EQ' and
-            instrument.get('exchange') == 'NSE'):
-            return instrument.get('instrument_key')
-    logging.warning(f"Instrument key for {stock_symbol} not found in master list.")
-    return None
+    return _instrument_master_cache
 
 def fetch_historical_data(instrument_key, date_str, access_token_param=ACCESS_TOKEN, api_base_url_param=API_BASE_URL):
     """Fetches historical daily candle data for a given instrument key and date."""
     if not instrument_key: return None, None
     encoded_key = quote(instrument_key)
     api_url = f"{api_base_url_param}/v3/historical-candle/{encoded_key}/days/1/{date_str}"
-    headers = {"Authorization": f"Bearer {access_token_param}", "Accept": "application/json"}
     logging.info(f"Fetching historical data for {instrument_key} on {date_str} from {api_url}")
     try:
-        response = requests.get(api_url, headers=headers, timeout=15)
+        response = upstox_get(access_token_param, api_url, timeout=15)
         response.raise_for_status()
         data = response.json().get("data", {}).get("candles")
         if data and data[0] and len(data[0]) >= 7:
             logging.info(f"Historical data received for {instrument_key} on {date_str}: {data[0]}")
             return data[0][4], data[0][6] # close, oi
         logging.warning(f"No/incomplete historical candle data for {instrument_key} on {date_str}.")
+    except CircuitOpenError:
+        pass # Logged once when the circuit opened
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             logging.warning(f"AUTH ERROR (401) fetching historical for {instrument_key} on {date_str}. Token invalid for this date/request.")
@@ -145,30 +109,21 @@ def fetch_intraday_data_920(instrument_key, target_candle_date_obj, access_token
     
     api_url = f"{api_base_url_param}/v3/historical-candle/{encoded_key}/minutes/1/{api_request_date_str}"
     params = {"from_date": api_request_date_str} # Corrected API structure
-    headers = {"Authorization": f"Bearer {access_token_param}", "Accept": "application/json"}
     
     full_url_for_log = f"{api_url}?from_date={api_request_date_str}"
     logging.info(f"Fetching intraday data for {instrument_key} (target candle: {target_candle_date_obj} 09:20, API req date: {api_request_date_str}) from {full_url_for_log}")
     
     try:
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+        response = upstox_get(access_token_param, api_url, params=params, timeout=20)
         response.raise_for_status()
-        candles = response.json().get("data", {}).get("candles")
-        if candles:
-            logging.info(f"Received {len(candles)} candles for {instrument_key} for API req date {api_request_date_str}.")
-            for candle in candles:
-                if len(candle) >= 7:
-                    ts_str = candle[0]
-                    try:
-                        dt_obj = datetime.fromisoformat(ts_str)
-                        if dt_obj.date() == target_candle_date_obj and dt_obj.time() == TARGET_920_TIME:
-                            logging.info(f"Found 09:20 AM candle for {instrument_key} on {target_candle_date_obj}: {candle}")
-                            return candle[4], candle[6] # close, oi
-                    except ValueError:
-                        logging.warning(f"Could not parse timestamp {ts_str} for {instrument_key}")
-            logging.warning(f"09:20 AM candle for {instrument_key} on {target_candle_date_obj} not found in response for API req date {api_request_date_str}.")
-        else:
-            logging.warning(f"No intraday candles returned for {instrument_key} for API req date {api_request_date_str}.")
+        # Pull the 09:20 candle straight out of the response body rather than decoding all of it
+        candle = candles_at_times(response.content, target_candle_date_obj, [TARGET_920_TIME]).get(TARGET_920_TIME)
+        if candle:
+            logging.info(f"Found 09:20 AM candle for {instrument_key} on {target_candle_date_obj}: {candle}")
+            return candle[4], candle[6] # close, oi
+        logging.warning(f"09:20 AM candle for {instrument_key} on {target_candle_date_obj} not found in response for API req date {api_request_date_str}.")
+    except CircuitOpenError:
+        pass
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             logging.warning(f"AUTH ERROR (401) fetching intraday for {instrument_key} (target {target_candle_date_obj}). Token invalid for this date/request.")
@@ -178,104 +133,33 @@ def fetch_intraday_data_920(instrument_key, target_candle_date_obj, access_token
         logging.error(f"General error fetching intraday for {instrument_key} (target {target_candle_date_obj}): {e}")
     return None, None
 
-def init_db(db_path, table_name_raw, table_name_filtered):
-    """Initializes database and creates tables with specified schemas, dropping if they exist."""
-    conn = None
+def init_db(db_path):
+    """Opens the screen store, creating its tables if needed; earlier dates' results are kept."""
     try:
         logging.info(f"Initializing database at {db_path}...")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Raw data table
-        logging.info(f"Dropping table {table_name_raw} if it exists.")
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name_raw}")
-        create_raw_sql = f"""
-        CREATE TABLE {table_name_raw} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT,
-            prev_day_equity_close REAL, prev_day_equity_oi INTEGER,
-            equity_920_price REAL, equity_920_oi INTEGER,
-            record_timestamp TEXT
-        );"""
-        cursor.execute(create_raw_sql)
-        logging.info(f"Table {table_name_raw} created.")
-
-        # Filtered data table
-        logging.info(f"Dropping table {table_name_filtered} if it exists.")
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name_filtered}")
-        create_filtered_sql = f"""
-        CREATE TABLE {table_name_filtered} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, stock_symbol TEXT,
-            percent_change REAL, record_timestamp TEXT
-        );"""
-        cursor.execute(create_filtered_sql)
-        logging.info(f"Table {table_name_filtered} created.")
-        
-        conn.commit()
+        store = open_screen_store(db_path)
         logging.info("Database initialized successfully.")
+        return store
     except sqlite3.Error as e:
         logging.error(f"SQLite error during DB initialization: {e}")
-    finally:
-        if conn: conn.close()
-
-def store_raw_data_to_db(db_path, table_name_raw, stock_data_list):
-    """Stores list of raw stock data dictionaries to the database."""
-    if not stock_data_list: 
-        logging.info("No raw data to store.")
-        return
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        current_ts = datetime.now(timezone.utc).isoformat()
-        
-        for record in stock_data_list:
-            cursor.execute(f"""
-            INSERT INTO {table_name_raw} (stock_symbol, prev_day_equity_close, prev_day_equity_oi,
-                                          equity_920_price, equity_920_oi, record_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?);
-            """, (record['stock_symbol'], record['prev_day_equity_close'], record['prev_day_equity_oi'],
-                  record['equity_920_price'], record['equity_920_oi'], current_ts))
-        conn.commit()
-        logging.info(f"Stored {len(stock_data_list)} records into {table_name_raw}.")
-    except sqlite3.Error as e:
-        logging.error(f"SQLite error storing raw data: {e}")
-    finally:
-        if conn: conn.close()
+        return None
 
-def store_filtered_data_to_db(db_path, table_name_filtered, filtered_stock_list):
-    """Stores list of (symbol, percent_change) tuples to the database."""
-    if not filtered_stock_list:
-        logging.info("No filtered data to store.")
-        return
-    conn = None
+def store_results_to_db(db_path, stock_data_list, filtered_stock_list):
+    """Stores the raw stock dicts and (symbol, percent_change) tuples as one run for the target date."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        current_ts = datetime.now(timezone.utc).isoformat()
-
-        for symbol, p_change in filtered_stock_list:
-            cursor.execute(f"""
-            INSERT INTO {table_name_filtered} (stock_symbol, percent_change, record_timestamp)
-            VALUES (?, ?, ?);
-            """, (symbol, p_change, current_ts))
-        conn.commit()
-        logging.info(f"Stored {len(filtered_stock_list)} records into {table_name_filtered}.")
+        open_screen_store(db_path).store_run(CURRENT_DAY_CANDLE_TARGET_STR, PREVIOUS_DAY_FETCH_STR,
+                                             stock_data_list, filtered_stock_list, source="fno_equity_analyzer")
+        logging.info(f"Stored {len(stock_data_list)} rows and {len(filtered_stock_list)} filtered stocks for {CURRENT_DAY_CANDLE_TARGET_STR}.")
     except sqlite3.Error as e:
-        logging.error(f"SQLite error storing filtered data: {e}")
-    finally:
-        if conn: conn.close()
+        logging.error(f"SQLite error storing data: {e}")
 
-def display_filtered_results(db_path, table_name_filtered):
-    """Queries and prints data from the filtered results table."""
-    conn = None
+def display_filtered_results(db_path, trade_date):
+    """Queries and prints the stored filtered results for trade_date."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        logging.info(f"Querying {table_name_filtered} for display...")
-        cursor.execute(f"SELECT stock_symbol, percent_change FROM {table_name_filtered} ORDER BY stock_symbol;")
-        results = cursor.fetchall()
+        logging.info(f"Querying screen_hits for {trade_date} for display...")
+        results = open_screen_store(db_path).hits(trade_date)
         
-        print(f"\n--- Filtered Stocks (from {table_name_filtered}) ---")
+        print(f"\n--- Filtered Stocks (for {trade_date}) ---")
         if results:
             for symbol, p_change in results:
                 print(f"Stock: {symbol}, Change: {p_change:.2f}%")
@@ -285,8 +169,6 @@ def display_filtered_results(db_path, table_name_filtered):
     except sqlite3.Error as e:
         logging.error(f"SQLite error displaying filtered results: {e}")
         print(f"Error querying filtered results: {e}")
-    finally:
-        if conn: conn.close()
 
 # --- 4. Main Workflow ---
 def main():
@@ -300,16 +182,22 @@ def main():
         logging.error("Failed to load instrument master. Cannot proceed.")
         return
 
-    init_db(DB_PATH, RAW_DATA_TABLE_NAME, FILTERED_DATA_TABLE_NAME)
+    init_db(DB_PATH)
 
     all_stocks_data_for_db = []
     filtered_stocks_for_db = [] # List of (symbol, percent_change) tuples
 
+    # Resolve the whole universe against the master's index in one pass; names resolved on a
+    # previous run are reused from the symbol resolution file
+    derived_symbols = resolve_trading_symbols(F_AND_O_STOCK_NAMES, instrument_master)
+    instrument_keys = instrument_master.find_equity_keys(s for s in derived_symbols.values() if s)
+
+    pending_fetches = [] # (slot in all_stocks_data_for_db, derived_symbol, instrument_key)
     for stock_name_full in F_AND_O_STOCK_NAMES:
         logging.info(f"--- Processing: {stock_name_full} ---")
-        derived_symbol = derive_trading_symbol(stock_name_full)
+        derived_symbol = derived_symbols[stock_name_full]
         
-        if not derived_symbol: # Should not happen with current simple logic but good check
+        if not derived_symbol: # Name did not match any NSE equity (see symbol_resolver)
             logging.warning(f"Could not derive symbol for '{stock_name_full}'. Skipping.")
             all_stocks_data_for_db.append({
                 'stock_symbol': stock_name_full, # Store original name if symbol derivation fails
@@ -320,7 +208,7 @@ def main():
             continue
             
         logging.info(f"Derived Symbol: {derived_symbol}")
-        instrument_key = find_equity_instrument_key(derived_symbol, instrument_master)
+        instrument_key = instrument_keys.get(derived_symbol)
 
         if not instrument_key:
             logging.warning(f"Instrument key not found for {derived_symbol}. Data fetch will be skipped.")
@@ -332,10 +220,21 @@ def main():
             })
             continue
 
-        # Fetch data
-        prev_close, prev_oi = fetch_historical_data(instrument_key, PREVIOUS_DAY_FETCH_STR)
-        curr_920_price, curr_920_oi = fetch_intraday_data_920(instrument_key, CURRENT_DAY_CANDLE_TARGET_OBJ)
+        pending_fetches.append((len(all_stocks_data_for_db), derived_symbol, instrument_key))
+        all_stocks_data_for_db.append(None) # Filled in below once the fetches complete
+
+    # Fetch data: the daily and 9:20 requests for every stock run together on the fetch engine
+    fetch_calls = []
+    for _, _, instrument_key in pending_fetches:
+        fetch_calls.append((fetch_historical_data, (instrument_key, PREVIOUS_DAY_FETCH_STR)))
+        fetch_calls.append((fetch_intraday_data_920, (instrument_key, CURRENT_DAY_CANDLE_TARGET_OBJ)))
+    fetch_results = fetch_concurrently(fetch_calls, on_error=lambda e: (None, None), probe_first=True)
+    log_connection_stats()
+    for circuit_error in open_circuits(ACCESS_TOKEN):
+        logging.error(f"Requests to {circuit_error['endpoint']} were short-circuited: {circuit_error['reason']}")
 
+    for (slot, derived_symbol, instrument_key), (prev_close, prev_oi), (curr_920_price, curr_920_oi) in zip(
+            pending_fetches, fetch_results[0::2], fetch_results[1::2]):
         # Prepare for raw DB storage
         stock_data_entry = {
             'stock_symbol': derived_symbol,
@@ -344,7 +243,7 @@ def main():
             'equity_920_price': curr_920_price,
             'equity_920_oi': curr_920_oi
         }
-        all_stocks_data_for_db.append(stock_data_entry)
+        all_stocks_data_for_db[slot] = stock_data_entry
 
         # Calculate percent change and filter
         if prev_close is not None and curr_920_price is not None and prev_close != 0:
@@ -357,11 +256,10 @@ def main():
             logging.info(f"{derived_symbol}: Not enough data to calculate percent change (Prev Close: {prev_close}, 9:20 Price: {curr_920_price}).")
             
     # Store collected data
-    store_raw_data_to_db(DB_PATH, RAW_DATA_TABLE_NAME, all_stocks_data_for_db)
-    store_filtered_data_to_db(DB_PATH, FILTERED_DATA_TABLE_NAME, filtered_stocks_for_db)
+    store_results_to_db(DB_PATH, all_stocks_data_for_db, filtered_stocks_for_db)
 
     # Display filtered results from DB
-    display_filtered_results(DB_PATH, FILTERED_DATA_TABLE_NAME)
+    display_filtered_results(DB_PATH, CURRENT_DAY_CANDLE_TARGET_STR)
     
     logging.info("Consolidated F&O equity data processing workflow finished.")
 
@@ -1,89 +1,45 @@
-import requests
-import gzip
 import json
-import io
-from datetime import datetime, date, timedelta
+from datetime import datetime
+
+from instrument_snapshot import load_instrument_snapshot
 
 # --- Data Loading (adapted from nse_downloader.py) ---
 def load_nse_instruments():
-    url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        gzipped_content = response.raw.read()
-        decompressed_content = gzip.decompress(gzipped_content)
-        json_data_str = decompressed_content.decode('utf-8')
-        parsed_data = json.loads(json_data_str)
-        return parsed_data
-    except Exception as e:
-        print(f"Error loading or parsing instrument data: {e}")
-        return None
+    master = load_instrument_snapshot()
+    if master is None:
+        print("Error loading or parsing instrument data; see log for details.")
+    return master
 
 # --- Instrument Finding Logic ---
-def find_reliance_keys(instruments):
-    if not instruments:
+def find_equity_and_future_keys(master, symbol, as_of=None):
+    """
+    Returns the NSE equity key and the nearest-expiry stock future key for `symbol` (next month's
+    contract once this month's has expired).
+    Both come from the master's indexes: no scan over the instrument list, no per-row timestamp parsing.
+    """
+    if not master:
         print("Instrument data is empty or not loaded.")
         return {"equity_key": None, "future_key": None, "error": "Instrument data not loaded"}
 
-    reliance_equity_key = None
-    reliance_future_key = None
-    
-    # Target symbols
-    equity_trading_symbol = 'RELIANCE'
-    underlying_symbol_future = 'RELIANCE' # For futures, we usually check underlying
-
-    # For futures: find the contract with the nearest expiry in the future
-    current_dt = datetime.now()
-    nearest_future_expiry = None
-    
-    # Debug: print sample instrument details to understand segments and types
-    # print("Sample instruments (first 5):")
-    # for i in range(min(5, len(instruments))):
-    # print(instruments[i])
-    # print("-" * 20)
+    # For futures: the contract with the nearest expiry on or after now
+    as_of = as_of or datetime.now()
+    equity_key = master.find_equity_key(symbol)
+    future = master.nearest_future(symbol, as_of)
+    future_key = future.get('instrument_key') if future else None
 
-    for instrument in instruments:
-        try:
-            # 1. Find Equity Instrument Key
-            if (instrument.get('trading_symbol') == equity_trading_symbol and
-                instrument.get('instrument_type') == 'EQ' and
-                instrument.get('exchange') == 'NSE' and # ensure it's NSE exchange
-                'EQ' in instrument.get('segment', '')): # e.g. NSE_EQ or similar
-                reliance_equity_key = instrument.get('instrument_key')
-                # print(f"Found equity: {instrument}") # Debug
+    if not equity_key:
+        print(f"Equity instrument for {symbol} not found.")
+    if not future_key:
+        print(f"Current month future for {symbol} not found.")
 
-            # 2. Find Stock Future Instrument Key (Current Month)
-            if (instrument.get('underlying_symbol') == underlying_symbol_future and
-                instrument.get('instrument_type') == 'FUT' and # Common type for stock futures
-                instrument.get('exchange') == 'NSE' and
-                'FO' in instrument.get('segment', '')): # e.g. NSE_FO, NFO_FO
-                
-                expiry_ms = instrument.get('expiry')
-                if expiry_ms:
-                    # Convert milliseconds to datetime object
-                    # expiry_date = datetime.fromtimestamp(expiry_ms / 1000).date() # .date() to compare dates only
-                    expiry_datetime = datetime.fromtimestamp(expiry_ms / 1000)
+    return {"equity_key": equity_key, "future_key": future_key}
 
-                    # We need the contract that expires this month or the nearest future month
-                    # It must expire on or after today
-                    if expiry_datetime >= current_dt:
-                        if nearest_future_expiry is None or expiry_datetime < nearest_future_expiry:
-                            nearest_future_expiry = expiry_datetime
-                            reliance_future_key = instrument.get('instrument_key')
-                            # print(f"Found potential future: {instrument}, Expiry: {expiry_datetime}") # Debug
-                        # If two futures have the same expiry datetime (should not happen for different keys),
-                        # this logic takes the first one it encounters.
-        
-        except Exception as e:
-            # print(f"Error processing instrument: {instrument}. Error: {e}") # Debug
-            continue # Skip to next instrument if there's an error processing one
+def find_universe_future_keys(master, symbols, as_of=None):
+    """Nearest-expiry future keys (see nearest_future_keys) for a whole list of underlyings in one call: {symbol: key or None}."""
+    return master.nearest_future_keys(symbols, as_of or datetime.now())
 
-    if not reliance_equity_key:
-        print(f"Equity instrument for {equity_trading_symbol} not found.")
-    if not reliance_future_key:
-        print(f"Current month future for {underlying_symbol_future} not found.")
-        
-    return {"equity_key": reliance_equity_key, "future_key": reliance_future_key}
+def find_reliance_keys(instruments):
+    return find_equity_and_future_keys(instruments, 'RELIANCE')
 
 if __name__ == "__main__":
     print("Loading instrument master data...")
@@ -0,0 +1,786 @@
+import requests
+import bisect
+import codecs
+import itertools
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import zlib
+import tempfile
+import logging
+from array import array
+from datetime import date, datetime, timedelta, timezone
+
+# --- 1. Configuration ---
+INSTRUMENT_MASTER_URL = os.environ.get(
+    "UPSTOX_INSTRUMENT_MASTER_URL",
+    "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz")
+CACHE_DIR = os.environ.get("INSTRUMENT_CACHE_DIR", "./.instrument_cache")
+CACHE_TTL_SECONDS = int(os.environ.get("INSTRUMENT_CACHE_TTL_SECONDS", 6 * 60 * 60)) # Revalidate at most every 6 hours
+# Bump when the on-disk layout changes so older cache files are ignored rather than misread.
+CACHE_FORMAT_VERSION = 1
+# Fields kept per instrument; everything else in the upstream rows is dropped while parsing.
+# isin is kept on top of the lookup fields because InstrumentMaster indexes it.
+INSTRUMENT_FIELDS = ('instrument_key', 'trading_symbol', 'segment', 'instrument_type', 'exchange',
+                     'underlying_symbol', 'expiry', 'name', 'lot_size', 'isin')
+STREAM_CHUNK_SIZE = 64 * 1024
+BUILD_BATCH_SIZE = 10000 # Rows converted to columns at a time while building an InstrumentMaster
+IST = timezone(timedelta(hours=5, minutes=30)) # Exchange time zone for expiry dates
+SNAPSHOT_MAGIC = b'UPXIMSNP'
+SNAPSHOT_FORMAT_VERSION = 3
+_skip_separators = re.compile(r'[\s,]*').match
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Cache File Helpers ---
+
+def cache_paths(cache_dir):
+    base = os.path.join(cache_dir, f"NSE.v{CACHE_FORMAT_VERSION}")
+    return base + ".json.gz", base + ".meta.json"
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_FORMAT_VERSION:
+            return None
+        return meta
+    except (OSError, ValueError):
+        return None
+
+def _temp_file_for(path, mode='wb'):
+    """
+    An open, uniquely named temp file in `path`'s directory, to be renamed onto `path` once
+    written. The name is unique per call, so concurrent writers (threads or processes) never
+    share one.
+    """
+    return tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.",
+                                       suffix='.tmp', delete=False, encoding=None if 'b' in mode else 'utf-8')
+
+def _write_atomic(path, data, mode='wb'):
+    """Writes to a temp file and renames it so readers never see a partial file."""
+    with _temp_file_for(path, mode) as f:
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+def _write_meta(meta_path, url, etag, last_modified, fetched_at):
+    meta = {
+        'version': CACHE_FORMAT_VERSION, 'url': url,
+        'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at,
+    }
+    _write_atomic(meta_path, json.dumps(meta), mode='w')
+
+def _iter_file_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _parse_payload_file(payload_path, fields=INSTRUMENT_FIELDS, build=list, load_cached=None):
+    if load_cached is not None:
+        data = load_cached(payload_path)
+        if data is not None:
+            return data
+    return build(iter_instruments(_iter_file_chunks(payload_path), fields))
+
+# --- 3. Streaming Parser ---
+
+def _iter_text(byte_chunks):
+    """Decompresses (if gzipped) and decodes byte chunks into text chunks, one chunk at a time."""
+    decompressor = None
+    head = b''
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in byte_chunks:
+        if not chunk:
+            continue
+        if decompressor is None:
+            # Some CDNs send the file with Content-Encoding: gzip, in which case requests has
+            # already inflated it. Only inflate here when the gzip magic bytes are present.
+            head += chunk
+            if len(head) < 2:
+                continue
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if head[:2] == b'\x1f\x8b' else False
+            chunk, head = head, b''
+        data = decompressor.decompress(chunk) if decompressor else chunk
+        if data:
+            yield text_decoder.decode(data)
+    if decompressor:
+        tail = decompressor.flush()
+        if tail:
+            yield text_decoder.decode(tail)
+    yield text_decoder.decode(head, final=True)
+
+def iter_instruments(byte_chunks, fields=INSTRUMENT_FIELDS):
+    """
+    Yields instrument dicts from a (gzipped) JSON array delivered as an iterable of byte chunks.
+
+    Only one chunk of compressed and decompressed data is held at a time, and each element is
+    reduced to `fields` as soon as it is parsed (fields=None keeps whole rows).
+    """
+    scan_once = json.JSONDecoder().scan_once
+    buffer = ''
+    pos = 0
+    seen_open_bracket = False
+    incomplete = False
+    for text in _iter_text(byte_chunks):
+        buffer = buffer[pos:] + text if pos < len(buffer) else text
+        pos = 0
+        if incomplete and '}' not in text:
+            continue # An unfinished element can only be completed by a closing brace
+        incomplete = False
+        end = len(buffer)
+        while True:
+            pos = _skip_separators(buffer, pos).end()
+            if pos >= end:
+                break
+            if not seen_open_bracket:
+                if buffer[pos] != '[':
+                    raise ValueError(f"Instrument master is not a JSON array (starts with {buffer[pos]!r})")
+                seen_open_bracket = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                instrument, next_pos = scan_once(buffer, pos)
+            except (StopIteration, json.JSONDecodeError):
+                incomplete = True # Element continues in the next chunk
+                break
+            if fields is not None:
+                instrument = {field: instrument[field] for field in fields if field in instrument}
+            yield instrument
+            pos = next_pos
+    if pos < len(buffer) and buffer[pos:].strip():
+        raise ValueError("Instrument master stream ended inside an element")
+    raise ValueError("Instrument master stream ended before the closing ']'")
+
+# --- 4. Loader ---
+
+def _download_to_cache(response, payload_path, fields, build):
+    """Parses the response body as it streams in while teeing the raw bytes into the disk cache."""
+    tmp_file = _temp_file_for(payload_path)
+    tmp_path = tmp_file.name
+    try:
+        with tmp_file:
+            def tee(chunks):
+                for chunk in chunks:
+                    tmp_file.write(chunk)
+                    yield chunk
+            teed_chunks = tee(response.iter_content(STREAM_CHUNK_SIZE))
+            data = build(iter_instruments(teed_chunks, fields))
+            for _ in teed_chunks: # Drain anything after the closing ']' (e.g. the gzip trailer)
+                pass
+        os.replace(tmp_path, payload_path)
+        return data
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_instrument_master(url=INSTRUMENT_MASTER_URL, cache_dir=CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS,
+                           force_refresh=False, timeout=30, fields=INSTRUMENT_FIELDS, build=list, load_cached=None):
+    """
+    Returns the parsed NSE instrument master, using a versioned on-disk copy when possible.
+
+    Within ttl_seconds of the last successful check the disk copy is used without any network I/O.
+    After that the upstream file is revalidated with If-None-Match / If-Modified-Since and only
+    downloaded again on a 200. If upstream is unreachable a stale disk copy is still returned.
+    Both the download and the disk copy are streamed through iter_instruments, so only the
+    projected `fields` of each row are ever held in memory as a whole. `build` receives the
+    instrument iterator; pass InstrumentMaster to get the compact indexed form without ever
+    materialising the list of dicts. Whenever the disk copy is current, `load_cached(payload_path)`
+    (if given) is tried before re-parsing it; returning None from it falls back to parsing.
+    Returns None only when there is neither a usable disk copy nor a successful download.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    payload_path, meta_path = cache_paths(cache_dir)
+    meta = _read_meta(meta_path)
+    if meta and meta.get('url') != url:
+        meta = None # Cache belongs to a different source
+    have_payload = meta is not None and os.path.exists(payload_path)
+
+    now = time.time()
+    if have_payload and not force_refresh and now - meta.get('fetched_at', 0) < ttl_seconds:
+        try:
+            data = _parse_payload_file(payload_path, fields, build, load_cached)
+            logger.info(f"Loaded {len(data)} instruments from disk cache {payload_path}.")
+            return data
+        except Exception as e:
+            logger.warning(f"Disk cache {payload_path} unreadable ({e}); downloading again.")
+            have_payload = False
+
+    headers = {}
+    if have_payload:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        logger.info(f"Downloading instrument master from {url} (conditional={bool(headers)})...")
+        with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and have_payload:
+                logger.info("Instrument master unchanged upstream (304); reusing disk cache.")
+                _write_meta(meta_path, url, meta.get('etag'), meta.get('last_modified'), now)
+                return _parse_payload_file(payload_path, fields, build, load_cached)
+            response.raise_for_status()
+            data = _download_to_cache(response, payload_path, fields, build)
+            _write_meta(meta_path, url, response.headers.get('ETag'), response.headers.get('Last-Modified'), now)
+        logger.info(f"Downloaded and cached {len(data)} instruments to {payload_path}.")
+        return data
+    except Exception as e:
+        logger.error(f"Error fetching/processing instrument master: {e}")
+        if have_payload:
+            logger.warning("Falling back to stale instrument master from disk cache.")
+            try:
+                return _parse_payload_file(payload_path, fields, build, load_cached)
+            except Exception as disk_err:
+                logger.error(f"Stale disk cache unreadable: {disk_err}")
+        return None
+
+# --- 5. Indexed Instrument Master ---
+
+def _align(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
+
+def _read_snapshot_header(buffer):
+    magic_len = len(SNAPSHOT_MAGIC)
+    if bytes(buffer[:magic_len]) != SNAPSHOT_MAGIC:
+        raise ValueError("Not an instrument master snapshot")
+    header_len = int.from_bytes(buffer[magic_len:magic_len + 8], 'little')
+    header = json.loads(bytes(buffer[magic_len + 8:magic_len + 8 + header_len]).decode('utf-8'))
+    if header.get('version') != SNAPSHOT_FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+        raise ValueError(f"Incompatible snapshot (version {header.get('version')}, byteorder {header.get('byteorder')})")
+    return header
+
+def expiry_threshold_ms(when):
+    """
+    Converts a date or datetime into the epoch-millisecond bound used for expiry queries.
+    A date means "from the start of that trading day in IST"; a datetime is used as-is
+    (naive datetimes are taken as local time, like datetime.timestamp()).
+    """
+    if not isinstance(when, datetime):
+        when = datetime.combine(when, datetime.min.time(), tzinfo=IST)
+    return int(when.timestamp() * 1000)
+
+def expiry_to_date(expiry_ms):
+    """Expiry epoch milliseconds -> the IST calendar date of expiry."""
+    return datetime.fromtimestamp(expiry_ms / 1000, tz=IST).date()
+
+def read_snapshot_header(path):
+    """Returns the JSON header of a snapshot file without mapping its columns."""
+    with open(path, 'rb') as f:
+        prefix = f.read(len(SNAPSHOT_MAGIC) + 8)
+        header_len = int.from_bytes(prefix[len(SNAPSHOT_MAGIC):], 'little') if len(prefix) == len(SNAPSHOT_MAGIC) + 8 else 0
+        return _read_snapshot_header(prefix + f.read(header_len))
+
+class InstrumentRow:
+    """
+    Read-only view of one row of an InstrumentMaster.
+
+    Supports the dict-style access (`row.get('trading_symbol')`, `row['expiry']`) that the
+    scripts used on the raw instrument dicts, without allocating a dict per instrument.
+    """
+    __slots__ = ('_master', '_index')
+
+    def __init__(self, master, index):
+        self._master = master
+        self._index = index
+
+    def get(self, field, default=None):
+        value = self._master._value(field, self._index)
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self._master._value(field, self._index)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return self._master._value(field, self._index) is not None
+
+    def keys(self):
+        return [field for field in INSTRUMENT_FIELDS if field in self]
+
+    def to_dict(self):
+        return {field: self[field] for field in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, InstrumentRow):
+            return self._master is other._master and self._index == other._index
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._master), self._index))
+
+    def __repr__(self):
+        return f"InstrumentRow({self.to_dict()!r})"
+
+class _StringColumn:
+    """Variable-length strings stored back to back in one UTF-8 buffer, addressed by an offsets array."""
+
+    def __init__(self, blob=None, offsets=None):
+        # blob / offsets may be read-only memoryviews over a snapshot; such columns are never extended.
+        self.blob = bytearray() if blob is None else blob
+        self.offsets = array('I', [0]) if offsets is None else offsets
+
+    def extend(self, values):
+        encoded = [value.encode('utf-8') if value else b'' for value in values]
+        self.offsets.extend(itertools.islice(itertools.accumulate(map(len, encoded), initial=self.offsets[-1]), 1, None))
+        self.blob += b''.join(encoded)
+
+    def raw_values(self):
+        """All values as bytes, in row order. Only used while building indexes."""
+        blob, offsets = self.blob, self.offsets
+        return [bytes(blob[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+    def raw(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index):
+        return self.raw(index).decode('utf-8') or None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+class _CodedColumn:
+    """Dictionary-encoded column: one small integer per row plus a table of the distinct values."""
+
+    def __init__(self, typecode, codes=None, values=None):
+        self.codes = array(typecode) if codes is None else codes
+        self.values = [None] if values is None else values # Code 0 is always "absent"
+        self._lookup = {value: code for code, value in enumerate(self.values)}
+        self._lookup[''] = 0
+        self._max_code = 2 ** (8 * self.codes.itemsize) - 1
+
+    def code(self, value):
+        return self._lookup.get(value)
+
+    def _new_code(self, value):
+        code = len(self.values)
+        if code > self._max_code:
+            raise ValueError(f"Too many distinct values for a {self.codes.itemsize}-byte code column")
+        self._lookup[value] = code
+        self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        return code
+
+    def extend(self, values):
+        lookup = self._lookup
+        self.codes.extend([lookup[value] if value in lookup else self._new_code(value) for value in values])
+
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+    def __len__(self):
+        return len(self.codes)
+
+# Indexes queried only by exact key (find / get_by_key); they also get a hash table for those lookups
+_EXACT_INDEXES = ('symbol_segment_type', 'key')
+
+class _SortedIndex:
+    """
+    Secondary index stored as one flat uint32 array of row numbers ordered by key.
+
+    Keys are not stored: `key_of(row)` re-derives them from the columns, and range lookups
+    bisect over the order array. The sort is stable, so rows sharing a key stay in load order
+    and the first of them is the row the old linear scans would have returned.
+
+    With `exact`, first() is a hash lookup instead of a bisect: `slots` is an open-addressing
+    table (uint32, row + 1, 0 for empty) of each key's first row, placed by CRC-32 of the key
+    with linear probing. Like the order array it holds no keys, so it costs 4 bytes per slot,
+    is built once and is stored in (and memory-mapped from) the snapshot.
+    """
+
+    def __init__(self, key_of, keys=None, order=None, exact=False, slots=None):
+        # keys: every row's key in row order, precomputed in bulk so the build needs no per-row calls.
+        # order: an already-built order array (e.g. from a snapshot); keys is ignored then.
+        self._key_of = key_of
+        if order is None:
+            order = array('I', sorted((row for row, key in enumerate(keys) if key), key=keys.__getitem__))
+            if exact:
+                slots = self._build_slots(order, keys)
+        self.order = order
+        self.slots = slots
+        self._mask = len(slots) - 1 if slots is not None else None
+
+    @staticmethod
+    def _build_slots(order, keys):
+        size = 8
+        while size < 2 * len(order): # At most half full, so probe runs stay short
+            size *= 2
+        mask = size - 1
+        slots = array('I', bytes(4 * size))
+        crc32 = zlib.crc32
+        for row in order: # Equal keys are adjacent and in load order: only the first is placed
+            key = keys[row]
+            slot = crc32(key) & mask
+            while slots[slot]:
+                if keys[slots[slot] - 1] == key:
+                    break
+                slot = (slot + 1) & mask
+            else:
+                slots[slot] = row + 1
+        return slots
+
+    def all(self, key):
+        lo = bisect.bisect_left(self.order, key, key=self._key_of)
+        hi = bisect.bisect_right(self.order, key, lo=lo, key=self._key_of)
+        return list(self.order[lo:hi])
+
+    def between(self, low, high):
+        """Rows whose key satisfies low <= key < high, in key order."""
+        lo = bisect.bisect_left(self.order, low, key=self._key_of)
+        hi = bisect.bisect_left(self.order, high, lo=lo, key=self._key_of)
+        return self.order[lo:hi]
+
+    def first(self, key):
+        slots = self.slots
+        if slots is not None:
+            slot = zlib.crc32(key) & self._mask
+            while slots[slot]:
+                if self._key_of(slots[slot] - 1) == key:
+                    return slots[slot] - 1
+                slot = (slot + 1) & self._mask
+            return None
+        lo = bisect.bisect_left(self.order, key, key=self._key_of)
+        if lo < len(self.order) and self._key_of(self.order[lo]) == key:
+            return self.order[lo]
+        return None
+
+class InstrumentMaster:
+    """
+    Compact, indexed, column-oriented store for the instrument master.
+
+    Rows are kept as parallel columns rather than one dict per instrument: unique strings
+    (instrument_key, trading_symbol, isin) live in packed UTF-8 buffers, repeated strings
+    (name, underlying_symbol, segment, instrument_type, exchange) are integer codes into
+    tables of interned values, and expiry / lot_size are typed arrays. The array columns
+    support the buffer protocol, so whole-universe filters can run over them directly
+    (e.g. numpy.frombuffer on column('segment')).
+
+    Row-number indexes built once per load replace the per-symbol linear scans: equity key
+    resolution and instrument_key lookups are O(1) hash lookups, ISIN / underlying /
+    futures-by-expiry lookups O(log n) bisects, all over flat uint32 arrays instead of O(n)
+    walks over the list. Lookups and
+    iteration yield InstrumentRow views, which behave like the old instrument dicts.
+    """
+
+    _STRING_COLUMNS = ('instrument_key', 'trading_symbol', 'isin')
+    _CODED_COLUMNS = {'segment': 'B', 'instrument_type': 'B', 'exchange': 'B',
+                      'name': 'I', 'underlying_symbol': 'I'}
+
+    def __init__(self, instruments):
+        self.snapshot_path = None # Set when the columns are memory-mapped from a snapshot file
+        self._strings = {column: _StringColumn() for column in self._STRING_COLUMNS}
+        self._coded = {column: _CodedColumn(typecode) for column, typecode in self._CODED_COLUMNS.items()}
+        self._expiry = array('q') # epoch milliseconds, 0 when absent
+        self._lot_size = array('i') # 0 when absent
+        self._count = 0
+        instruments = iter(instruments or ())
+        while True:
+            batch = list(itertools.islice(instruments, BUILD_BATCH_SIZE))
+            if not batch:
+                break
+            self._extend(batch)
+        self._build_indexes()
+
+    def _extend(self, batch):
+        for column, store in self._strings.items():
+            store.extend([instrument.get(column) for instrument in batch])
+        for column, store in self._coded.items():
+            store.extend([instrument.get(column) for instrument in batch])
+        self._expiry.extend([int(instrument.get('expiry') or 0) for instrument in batch])
+        self._lot_size.extend([int(instrument.get('lot_size') or 0) for instrument in batch])
+        self._count += len(batch)
+
+    def _build_indexes(self):
+        segments, types = self._coded['segment'].codes, self._coded['instrument_type'].codes
+        suffixes = {}
+        symbol_segment_type_keys = [
+            symbol + (suffixes.get((segment, instrument_type)) or
+                      suffixes.setdefault((segment, instrument_type), bytes((0, segment, instrument_type))))
+            if symbol else b''
+            for symbol, segment, instrument_type in zip(self._strings['trading_symbol'].raw_values(), segments, types)]
+        self._by_symbol_segment_type = _SortedIndex(self._symbol_segment_type_key, symbol_segment_type_keys, exact=True)
+        del symbol_segment_type_keys
+        self._by_key = _SortedIndex(self._strings['instrument_key'].raw, self._strings['instrument_key'].raw_values(), exact=True)
+        self._by_isin = _SortedIndex(self._strings['isin'].raw, self._strings['isin'].raw_values())
+        self._by_underlying = _SortedIndex(self._coded['underlying_symbol'].codes.__getitem__,
+                                           self._coded['underlying_symbol'].codes)
+        is_future = self._future_row_filter()
+        underlyings = self._coded['underlying_symbol'].codes
+        future_keys = [(underlyings[row], self._expiry[row]) if is_future(row) else None for row in range(self._count)]
+        self._by_future_expiry = _SortedIndex(self._future_key, future_keys)
+
+    def _future_row_filter(self):
+        """Predicate for NSE stock/index FUT contracts in an F&O segment with an underlying and expiry."""
+        fo_segments = {code for code, value in enumerate(self._coded['segment'].values) if value and 'FO' in value}
+        fut_code = self.code('instrument_type', 'FUT')
+        nse_code = self.code('exchange', 'NSE')
+        segments, types = self._coded['segment'].codes, self._coded['instrument_type'].codes
+        exchanges, underlyings = self._coded['exchange'].codes, self._coded['underlying_symbol'].codes
+        return lambda row: (types[row] == fut_code and segments[row] in fo_segments and exchanges[row] == nse_code
+                            and underlyings[row] != 0 and self._expiry[row] != 0)
+
+    def _future_key(self, index):
+        return (self._coded['underlying_symbol'].codes[index], self._expiry[index])
+
+    def _index_parts(self):
+        return {'symbol_segment_type': (self._symbol_segment_type_key, self._by_symbol_segment_type),
+                'key': (self._strings['instrument_key'].raw, self._by_key),
+                'isin': (self._strings['isin'].raw, self._by_isin),
+                'underlying': (self._coded['underlying_symbol'].codes.__getitem__, self._by_underlying),
+                'future_expiry': (self._future_key, self._by_future_expiry)}
+
+    def _symbol_segment_type_key(self, index):
+        symbol = self._strings['trading_symbol'].raw(index)
+        if not symbol:
+            return b''
+        return symbol + bytes((0, self._coded['segment'].codes[index], self._coded['instrument_type'].codes[index]))
+
+    def _value(self, field, index):
+        if field in self._strings:
+            return self._strings[field][index]
+        if field in self._coded:
+            return self._coded[field][index]
+        if field == 'expiry':
+            return self._expiry[index] or None
+        if field == 'lot_size':
+            return self._lot_size[index] or None
+        return None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (InstrumentRow(self, index) for index in range(self._count))
+
+    def row(self, index):
+        return InstrumentRow(self, index)
+
+    # --- Snapshot (memory-mapped) form ---
+
+    def _sections(self):
+        """(name, buffer, typecode) for every column and index, in file order."""
+        sections = []
+        for column, store in self._strings.items():
+            sections.append((f"strings.{column}.blob", store.blob, 'B'))
+            sections.append((f"strings.{column}.offsets", store.offsets, 'I'))
+        for column, store in self._coded.items():
+            sections.append((f"coded.{column}", store.codes, self._CODED_COLUMNS[column]))
+        sections.append(('expiry', self._expiry, 'q'))
+        sections.append(('lot_size', self._lot_size, 'i'))
+        for name, (_, index) in self._index_parts().items():
+            sections.append((f"index.{name}", index.order, 'I'))
+        for name in _EXACT_INDEXES:
+            sections.append((f"hash.{name}", self._index_parts()[name][1].slots, 'I'))
+        return sections
+
+    def write_snapshot(self, path, source=None):
+        """
+        Writes the columns, code tables and prebuilt indexes to a single binary file that
+        open_snapshot() can memory-map. `source` is stored in the header as-is so callers can
+        tell which payload the snapshot was compiled from.
+        """
+        layout = {}
+        offset = 0
+        sections = self._sections()
+        for name, buffer, typecode in sections:
+            nbytes = memoryview(buffer).nbytes
+            layout[name] = [offset, nbytes, typecode]
+            offset = _align(offset + nbytes)
+        header = json.dumps({
+            'version': SNAPSHOT_FORMAT_VERSION, 'byteorder': sys.byteorder, 'count': self._count,
+            'source': source or {}, 'sections': layout,
+            'code_values': {column: store.values for column, store in self._coded.items()},
+        }).encode('utf-8')
+        data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header))
+        f = _temp_file_for(path)
+        tmp_path = f.name
+        try:
+            with f:
+                f.write(SNAPSHOT_MAGIC + len(header).to_bytes(8, 'little') + header)
+                for name, buffer, _ in sections:
+                    f.seek(data_start + layout[name][0])
+                    f.write(memoryview(buffer).cast('B'))
+                f.truncate(data_start + offset)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def open_snapshot(cls, path):
+        """
+        Returns an InstrumentMaster whose columns and indexes are read-only views over an mmap
+        of the snapshot file. Nothing is parsed or copied, so processes that open the same file
+        share its pages through the OS page cache.
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _read_snapshot_header(mapped)
+        data_start = _align(len(SNAPSHOT_MAGIC) + 8 + int.from_bytes(mapped[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 8], 'little'))
+        view = memoryview(mapped)
+
+        def section(name):
+            offset, nbytes, typecode = header['sections'][name]
+            start = data_start + offset
+            return view[start:start + nbytes].cast(typecode)
+
+        master = cls.__new__(cls)
+        master.snapshot_path = path
+        master._mmap = mapped
+        master._count = header['count']
+        master._strings = {column: _StringColumn(section(f"strings.{column}.blob"), section(f"strings.{column}.offsets"))
+                           for column in cls._STRING_COLUMNS}
+        master._coded = {column: _CodedColumn(typecode, section(f"coded.{column}"), header['code_values'][column])
+                         for column, typecode in cls._CODED_COLUMNS.items()}
+        master._expiry = section('expiry')
+        master._lot_size = section('lot_size')
+        master._by_symbol_segment_type = master._by_key = master._by_isin = master._by_underlying = None
+        master._by_future_expiry = None
+        for name, (key_of, _) in master._index_parts().items():
+            slots = section(f"hash.{name}") if name in _EXACT_INDEXES else None
+            setattr(master, f"_by_{name}", _SortedIndex(key_of, order=section(f"index.{name}"), slots=slots))
+        return master
+
+    # --- Columnar access ---
+
+    def column(self, field):
+        """
+        Returns the raw column: the code array for dictionary-encoded fields, the typed array
+        for expiry / lot_size, and a decoded list for packed string fields.
+        """
+        if field in self._coded:
+            return self._coded[field].codes
+        if field == 'expiry':
+            return self._expiry
+        if field == 'lot_size':
+            return self._lot_size
+        if field in self._strings:
+            store = self._strings[field]
+            return [store[i] for i in range(self._count)]
+        raise KeyError(field)
+
+    def code(self, field, value):
+        """Returns the integer code used for value in a dictionary-encoded column, or None if it never occurs."""
+        return self._coded[field].code(value)
+
+    def select(self, **criteria):
+        """
+        Returns the row indexes whose columns equal the given values,
+        e.g. select(segment='NSE_FO', instrument_type='FUT').
+        """
+        columns = []
+        for field, value in criteria.items():
+            if field in self._coded:
+                code = self.code(field, value)
+                if code is None:
+                    return []
+                columns.append((self._coded[field].codes, code))
+            else:
+                columns.append((self.column(field), value))
+        if not columns:
+            return list(range(self._count))
+        (first_column, first_value), rest = columns[0], columns[1:]
+        matches = [i for i, value in enumerate(first_column) if value == first_value]
+        for column, wanted in rest:
+            matches = [i for i in matches if column[i] == wanted]
+        return matches
+
+    # --- Indexed lookups ---
+
+    def find(self, trading_symbol, segment, instrument_type):
+        """Returns the row for (trading_symbol, segment, instrument_type) or None."""
+        segment_code = self.code('segment', segment)
+        type_code = self.code('instrument_type', instrument_type)
+        if not trading_symbol or not segment_code or not type_code:
+            return None
+        key = trading_symbol.encode('utf-8') + bytes((0, segment_code, type_code))
+        index = self._by_symbol_segment_type.first(key)
+        return None if index is None else InstrumentRow(self, index)
+
+    def find_equity_key(self, trading_symbol, segment='NSE_EQ'):
+        """Returns the instrument_key of the NSE equity with this trading symbol, or None."""
+        instrument = self.find(trading_symbol, segment, 'EQ')
+        if instrument and instrument.get('exchange') == 'NSE':
+            return instrument.get('instrument_key')
+        return None
+
+    def find_equity_keys(self, trading_symbols, segment='NSE_EQ'):
+        """Resolves a whole symbol list in one call. Returns {symbol: instrument_key or None}."""
+        return {symbol: self.find_equity_key(symbol, segment) for symbol in trading_symbols}
+
+    def get_by_key(self, instrument_key):
+        index = self._by_key.first(instrument_key.encode('utf-8')) if instrument_key else None
+        return None if index is None else InstrumentRow(self, index)
+
+    def get_by_isin(self, isin):
+        if not isin:
+            return []
+        return [InstrumentRow(self, index) for index in self._by_isin.all(isin.encode('utf-8'))]
+
+    def get_by_underlying(self, underlying_symbol):
+        code = self.code('underlying_symbol', underlying_symbol)
+        return [InstrumentRow(self, index) for index in self._by_underlying.all(code)] if code else []
+
+    # --- Futures by expiry ---
+
+    def futures(self, underlying_symbol, on_or_after=None):
+        """
+        FUT contracts on underlying_symbol in ascending expiry order, optionally only those
+        expiring on/after `on_or_after` (see expiry_threshold_ms). Each call is two bisects.
+        """
+        code = self.code('underlying_symbol', underlying_symbol)
+        if not code:
+            return []
+        low = expiry_threshold_ms(on_or_after) if on_or_after is not None else 0
+        return [InstrumentRow(self, row) for row in self._by_future_expiry.between((code, low), (code + 1, 0))]
+
+    def nearest_future(self, underlying_symbol, on_or_after):
+        """The FUT contract with the nearest expiry on/after `on_or_after`, or None."""
+        return self.nth_future(underlying_symbol, on_or_after, 0)
+
+    def nth_future(self, underlying_symbol, on_or_after, n):
+        """n=0 near month, n=1 next month, n=2 far month, counted from `on_or_after`."""
+        code = self.code('underlying_symbol', underlying_symbol)
+        if not code:
+            return None
+        rows = self._by_future_expiry.between((code, expiry_threshold_ms(on_or_after)), (code + 1, 0))
+        return InstrumentRow(self, rows[n]) if n < len(rows) else None
+
+    def futures_expiring_in(self, underlying_symbol, year, month):
+        """FUT contracts on underlying_symbol whose expiry (IST date) falls in the given month."""
+        code = self.code('underlying_symbol', underlying_symbol)
+        if not code:
+            return []
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        low, high = expiry_threshold_ms(date(year, month, 1)), expiry_threshold_ms(date(next_year, next_month, 1))
+        return [InstrumentRow(self, row) for row in self._by_future_expiry.between((code, low), (code, high))]
+
+    def nearest_future_keys(self, underlying_symbols, as_of):
+        """
+        Batch form of nearest_future for a whole universe: {underlying: instrument_key or None},
+        the contract with the nearest expiry on/after `as_of`. After the month's expiry day that
+        is next month's contract; futures_expiring_in() restricts to one calendar month. The
+        threshold is computed once and each underlying costs two bisects on the shared index.
+        """
+        low = expiry_threshold_ms(as_of)
+        result = {}
+        for underlying_symbol in underlying_symbols:
+            code = self.code('underlying_symbol', underlying_symbol)
+            rows = self._by_future_expiry.between((code, low), (code + 1, 0)) if code else ()
+            result[underlying_symbol] = self._strings['instrument_key'][rows[0]] if len(rows) else None
+        return result
@@ -0,0 +1,88 @@
+import os
+import time
+import logging
+import threading
+
+from instrument_snapshot import load_instrument_snapshot
+
+# --- 1. Configuration ---
+# How often the background thread revalidates the instrument master upstream. Each tick is a
+# conditional GET, so an unchanged master costs one 304 and a re-map of the existing snapshot.
+REFRESH_INTERVAL_SECONDS = int(os.environ.get("INSTRUMENT_REFRESH_INTERVAL_SECONDS", 60 * 60))
+RETRY_INTERVAL_SECONDS = 60 # Used instead while no master has been loaded yet
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Refresher ---
+
+class InstrumentMasterRefresher:
+    """
+    Owns the process-wide InstrumentMaster for a long-running server.
+
+    A daemon thread loads the master at start-up and revalidates it every `interval_seconds`.
+    Each new master is built completely before it is published by a single reference assignment,
+    so a request that called get() keeps using the master it got even if a refresh lands mid-way.
+    All loads go through one lock: callers that arrive while a load is running wait for it and
+    share its result instead of starting a second download.
+    """
+
+    def __init__(self, loader=load_instrument_snapshot, interval_seconds=REFRESH_INTERVAL_SECONDS):
+        self._loader = loader
+        self.interval_seconds = interval_seconds
+        self._master = None
+        self._generation = 0 # Bumped on every completed load attempt
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_refreshed_at = None
+
+    def get(self):
+        """Returns the current master, loading it first (or waiting for the in-flight load) if there is none yet."""
+        master = self._master
+        if master is None:
+            master = self.refresh()
+        return master
+
+    def refresh(self, force_refresh=False):
+        """
+        Loads the master and publishes it. If another load is already running, waits for it and
+        returns its result rather than loading again. Keeps the previous master if the load fails.
+        """
+        generation = self._generation
+        with self._load_lock:
+            if self._generation != generation and not force_refresh:
+                return self._master # Another caller finished a load while we were waiting
+            start = time.perf_counter()
+            try:
+                master = self._loader(ttl_seconds=self.interval_seconds, force_refresh=force_refresh)
+            except Exception as e:
+                logger.error(f"Instrument master refresh failed: {e}", exc_info=True)
+                master = None
+            finally:
+                self._generation += 1
+            if master is None:
+                logger.warning("Instrument master refresh returned nothing; keeping the current master.")
+                return self._master
+            self._master = master # Atomic publish: readers see either the old or the new master
+            self.last_refreshed_at = time.time()
+            logger.info(f"Published instrument master with {len(master)} instruments "
+                        f"({(time.perf_counter() - start) * 1000:.1f} ms).")
+            return master
+
+    def start(self):
+        """Starts the background thread (idempotent). The first load happens immediately."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="instrument-master-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval_seconds if self._master is not None else RETRY_INTERVAL_SECONDS)
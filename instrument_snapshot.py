@@ -0,0 +1,81 @@
+import os
+import time
+import logging
+
+from instrument_master import (load_instrument_master, read_snapshot_header, cache_paths, InstrumentMaster,
+                               INSTRUMENT_MASTER_URL, CACHE_DIR, CACHE_TTL_SECONDS, CACHE_FORMAT_VERSION)
+
+# --- 1. Configuration ---
+SNAPSHOT_FILE_NAME = f"NSE.v{CACHE_FORMAT_VERSION}.snapshot"
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Helpers ---
+
+def snapshot_path_for(cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, SNAPSHOT_FILE_NAME)
+
+def _payload_identity(payload_path):
+    """Identifies the exact payload file a snapshot was compiled from."""
+    stat = os.stat(payload_path)
+    return {'payload_size': stat.st_size, 'payload_mtime_ns': stat.st_mtime_ns}
+
+def _open_if_current(snapshot_path, payload_path):
+    """Maps the snapshot if it was compiled from the current payload file; otherwise returns None."""
+    try:
+        if read_snapshot_header(snapshot_path).get('source') != _payload_identity(payload_path):
+            return None
+        return InstrumentMaster.open_snapshot(snapshot_path)
+    except (OSError, ValueError) as e:
+        logger.info(f"Snapshot {snapshot_path} not usable ({e}); it will be rebuilt.")
+        return None
+
+def compile_snapshot(cache_dir=CACHE_DIR, master=None):
+    """
+    Build step: compiles the cached instrument master payload into a binary snapshot file.
+
+    Uses `master` if already built, otherwise parses the payload on disk (downloading it first
+    if needed). Returns the snapshot path, or None if no instrument master is available.
+    """
+    if master is None:
+        master = load_instrument_master(cache_dir=cache_dir, build=InstrumentMaster)
+        if master is None:
+            return None
+    payload_path, _ = cache_paths(cache_dir)
+    snapshot_path = snapshot_path_for(cache_dir)
+    master.write_snapshot(snapshot_path, source=_payload_identity(payload_path))
+    logger.info(f"Compiled {len(master)} instruments into snapshot {snapshot_path}.")
+    return snapshot_path
+
+# --- 3. Loader ---
+
+def load_instrument_snapshot(url=INSTRUMENT_MASTER_URL, cache_dir=CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS,
+                             force_refresh=False, timeout=30):
+    """
+    Returns a memory-mapped InstrumentMaster, revalidating upstream exactly like
+    load_instrument_master. While the payload on disk is unchanged the existing snapshot is
+    mapped directly (no JSON parsing, no index build). When a new payload arrives it is parsed
+    once, compiled into a fresh snapshot, and the snapshot is mapped.
+    """
+    snapshot_path = snapshot_path_for(cache_dir)
+    start = time.perf_counter()
+    master = load_instrument_master(url=url, cache_dir=cache_dir, ttl_seconds=ttl_seconds,
+                                    force_refresh=force_refresh, timeout=timeout, build=InstrumentMaster,
+                                    load_cached=lambda payload_path: _open_if_current(snapshot_path, payload_path))
+    if master is None:
+        return None
+    if master.snapshot_path is None:
+        try:
+            compile_snapshot(cache_dir, master)
+            master = InstrumentMaster.open_snapshot(snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write snapshot {snapshot_path} ({e}); using the in-memory master.")
+    logger.info(f"Instrument master ready in {(time.perf_counter() - start) * 1000:.1f} ms "
+                f"({'mapped from ' + master.snapshot_path if master.snapshot_path else 'in memory'}).")
+    return master
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s')
+    # Run from cron / deploy hooks so that web workers only ever map an existing snapshot.
+    path = compile_snapshot()
+    print(f"Snapshot written to {path}" if path else "No instrument master available; snapshot not written.")
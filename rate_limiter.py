@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+# --- 1. Configuration ---
+# Upstox's published limits for the standard (historical candle) APIs, per access token.
+RATE_LIMIT_PER_SECOND = float(os.environ.get("UPSTOX_RATE_LIMIT_PER_SECOND", 50))
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("UPSTOX_RATE_LIMIT_PER_MINUTE", 500))
+# AIMD bounds on requests in flight; the limit grows by ~1 per round of successes and halves on a 429
+CONCURRENCY_INITIAL = int(os.environ.get("UPSTOX_CONCURRENCY_INITIAL", 8))
+CONCURRENCY_MAX = int(os.environ.get("UPSTOX_CONCURRENCY_MAX", 64))
+CONCURRENCY_MIN = 1
+LATENCY_BACKOFF_FACTOR = 4.0 # A response this many times slower than the best seen counts as congestion...
+LATENCY_BACKOFF_MIN_SECONDS = 0.5 # ...provided it is also at least this slow
+DECREASE_COOLDOWN_SECONDS = 1.0 # At most one multiplicative decrease per window
+DEFAULT_RETRY_AFTER_SECONDS = 1.0 # Pause after a 429 that carries no usable Retry-After
+MAX_RATE_LIMIT_RETRIES = int(os.environ.get("UPSTOX_MAX_RATE_LIMIT_RETRIES", 5))
+_FULL_POLL_SECONDS = 0.005 # How often a waiter re-checks when only the concurrency limit is in the way
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Helpers ---
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """`rate` tokens per second up to `capacity`. Not thread-safe on its own; RateLimiter locks around it."""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"TokenBucket needs a positive rate and a capacity of at least 1 (got rate={rate}, capacity={capacity}).")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    @classmethod
+    def for_limit(cls, limit, window_seconds, burst):
+        """
+        A bucket that refills at `limit` per `window_seconds` (the sustained rate) and holds at
+        most `burst` requests. On its own it can admit burst + limit in one window; pair it with
+        a SlidingWindowLog to cap the window at `limit`.
+        """
+        if limit <= 0:
+            raise ValueError(f"Rate limit must be positive (got {limit}).")
+        return cls(limit / window_seconds, max(1.0, min(burst, limit)))
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now=None):
+        """Seconds until one token is available (0 if one is available now)."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self.tokens -= 1
+
+class SlidingWindowLog:
+    """
+    At most `limit` admissions in any `window_seconds` window, from the times of the last `limit`
+    admissions. Not thread-safe on its own; RateLimiter locks around it.
+    """
+
+    def __init__(self, limit, window_seconds):
+        self.limit = max(1, int(limit)) # A fractional limit is paced by its token bucket
+        self.window_seconds = window_seconds
+        self._admitted = deque()
+
+    def refill(self, now):
+        while self._admitted and now - self._admitted[0] >= self.window_seconds:
+            self._admitted.popleft()
+
+    def wait_time(self, now):
+        """Seconds until the oldest admission in the window leaves it (0 if there is room now)."""
+        if len(self._admitted) < self.limit:
+            return 0.0
+        return self._admitted[0] + self.window_seconds - now
+
+    def take(self, now):
+        self._admitted.append(now)
+
+# --- 3. Rate Limiter ---
+
+class RateLimiter:
+    """
+    Admission control for every Upstox candle request in the process.
+
+    A request may start when every limit (per-second and per-minute by default) has room, the
+    number of requests in flight is below the adaptive concurrency limit, and no Retry-After
+    pause is in force. Each limit is a token bucket refilling at the limit's sustained rate,
+    which sets the pace and the burst, plus a sliding-window log, which keeps any window of
+    that length at or under the limit. The concurrency limit follows AIMD: each success adds
+    1/limit (about +1 per round trip of the whole window); a 429 or a latency spike halves it,
+    at most once per DECREASE_COOLDOWN_SECONDS. A 429 also pauses all admissions until its
+    Retry-After has passed, so the callers' retries land after the server's window resets.
+
+    Threads call acquire() before a request and release() after it; async callers use
+    `await acquire_async()` instead of acquire().
+    """
+
+    def __init__(self, per_second=RATE_LIMIT_PER_SECOND, per_minute=RATE_LIMIT_PER_MINUTE,
+                 concurrency_initial=CONCURRENCY_INITIAL, concurrency_max=CONCURRENCY_MAX):
+        self._limits = [] # Token buckets and sliding windows; a falsy limit disables that limit
+        if per_second: # Paced evenly: no burst beyond a single request
+            self._limits += [TokenBucket.for_limit(per_second, 1.0, burst=1), SlidingWindowLog(per_second, 1.0)]
+        if per_minute: # Half the minute's allowance may go out at the per-second pace
+            self._limits += [TokenBucket.for_limit(per_minute, 60.0, burst=per_minute / 2), SlidingWindowLog(per_minute, 60.0)]
+        self.concurrency_max = concurrency_max
+        self.concurrency_limit = float(min(concurrency_initial, concurrency_max))
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._best_latency = None
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self.stats = {"admitted": 0, "rate_limited": 0, "decreases": 0}
+
+    def _try_admit(self):
+        """Admits one request and returns 0, or returns how long to wait before trying again."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= int(self.concurrency_limit):
+            return _FULL_POLL_SECONDS
+        wait = 0.0
+        for limit in self._limits:
+            limit.refill(now)
+            wait = max(wait, limit.wait_time(now))
+        if wait > 0:
+            return wait
+        for limit in self._limits:
+            limit.take(now)
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        return 0.0
+
+    def acquire(self):
+        with self._lock:
+            while True:
+                wait = self._try_admit()
+                if wait == 0:
+                    return
+                self._released.wait(wait)
+
+    async def acquire_async(self):
+        while True:
+            with self._lock:
+                wait = self._try_admit()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, status=None, latency_seconds=None, retry_after=None):
+        """
+        Reports how an admitted request ended: its HTTP status (None for a network error),
+        its latency, and the parsed Retry-After of a 429.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status == 429:
+                self.stats["rate_limited"] += 1
+                pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER_SECONDS
+                self._paused_until = max(self._paused_until, now + pause)
+                for limit in self._limits: # The server's window is full; don't burst the moment the pause ends
+                    if isinstance(limit, TokenBucket):
+                        limit.tokens = min(limit.tokens, 0.0)
+                self._decrease(now, f"429 (Retry-After {pause:.1f} s)")
+            elif status is not None and status < 500 and latency_seconds is not None:
+                if self._best_latency is None or latency_seconds < self._best_latency:
+                    self._best_latency = latency_seconds
+                if latency_seconds > max(LATENCY_BACKOFF_FACTOR * self._best_latency, LATENCY_BACKOFF_MIN_SECONDS):
+                    self._decrease(now, f"latency {latency_seconds * 1000:.0f} ms")
+                else:
+                    self.concurrency_limit = min(self.concurrency_max, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._released.notify_all()
+
+    def _decrease(self, now, reason):
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.concurrency_limit = max(CONCURRENCY_MIN, self.concurrency_limit / 2)
+        self.stats["decreases"] += 1
+        logger.warning(f"Upstox rate limiter: {reason}; concurrency limit now {int(self.concurrency_limit)}.")
+
+# Shared by every fetcher in the process: Upstox limits apply per token, not per module.
+upstox_rate_limiter = RateLimiter()
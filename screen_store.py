@@ -0,0 +1,318 @@
+import os
+import re
+import sys
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+
+from db_connections import SQLiteConnectionManager
+
+# One schema for every screening run, replacing the data_YYYY_MM_DD / filtered_YYYY_MM_DD table
+# pair each run used to drop and recreate:
+#
+#   screen_runs  one row per run: dates, source, status, counts and timings
+#   screen_rows  one row per (trade_date, symbol): the previous close/OI and the 09:20 price/OI
+#   screen_hits  one row per (trade_date, symbol) that passed the filter, with its % change
+#
+# trade_date is the session whose 09:20 candle was screened (the old tables' date suffix). A
+# re-run of a date replaces that date's rows and hits; earlier runs stay in screen_runs, and
+# every date stays queryable with plain SQL.
+
+# --- 1. Configuration ---
+DB_PATH = os.environ.get("SCREEN_DB_PATH", "./upstox_data_v2.db")
+SCHEMA_VERSION = 1
+# Page cache per connection, in KiB (SQLite's default is 2 MiB). Big enough to keep the screen
+# tables and their indexes in memory, so a run's upserts don't re-read B-tree pages from disk.
+CACHE_SIZE_KB = int(os.environ.get("SCREEN_DB_CACHE_SIZE_KB", 16384))
+# NORMAL in WAL mode syncs at checkpoints rather than on every commit: a power loss can lose
+# the last run's write, never corrupt the file. FULL restores a sync per commit.
+SYNCHRONOUS = os.environ.get("SCREEN_DB_SYNCHRONOUS", "NORMAL").upper()
+
+ROW_FIELDS = ('prev_day_equity_close', 'prev_day_equity_oi', 'equity_920_price', 'equity_920_oi', 'error_message')
+_LEGACY_TABLE = re.compile(r'^(data|filtered)_(\d{4})_(\d{2})_(\d{2})$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS screen_runs (
+    run_id INTEGER PRIMARY KEY,
+    trade_date TEXT NOT NULL,
+    previous_date TEXT,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,                  -- running, complete, failed or imported
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    universe_size INTEGER,
+    row_count INTEGER,
+    error_count INTEGER,
+    hit_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS screen_runs_by_date ON screen_runs (trade_date, previous_date, status, run_id);
+CREATE UNIQUE INDEX IF NOT EXISTS screen_runs_by_legacy_source ON screen_runs (source) WHERE source LIKE 'legacy:%';
+
+CREATE TABLE IF NOT EXISTS screen_rows (
+    trade_date TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES screen_runs (run_id),
+    previous_date TEXT,
+    prev_day_equity_close REAL,
+    prev_day_equity_oi INTEGER,
+    equity_920_price REAL,
+    equity_920_oi INTEGER,
+    error_message TEXT,
+    record_timestamp TEXT NOT NULL,
+    PRIMARY KEY (trade_date, symbol)
+) WITHOUT ROWID;
+-- One symbol across dates, answered from the index alone
+CREATE INDEX IF NOT EXISTS screen_rows_by_symbol
+    ON screen_rows (symbol, trade_date, prev_day_equity_close, equity_920_price, error_message);
+CREATE INDEX IF NOT EXISTS screen_rows_by_run ON screen_rows (run_id);
+
+CREATE TABLE IF NOT EXISTS screen_hits (
+    trade_date TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES screen_runs (run_id),
+    percent_change REAL NOT NULL,
+    record_timestamp TEXT NOT NULL,
+    PRIMARY KEY (trade_date, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS screen_hits_by_symbol ON screen_hits (symbol, trade_date, percent_change);
+"""
+
+# Statements are built once so every call reuses the connection's prepared-statement cache
+_INSERT_RUN_SQL = ("INSERT INTO screen_runs (trade_date, previous_date, source, status, started_at, universe_size) "
+                   "VALUES (?, ?, ?, 'running', ?, ?)")
+_UPSERT_ROW_SQL = (f"INSERT OR REPLACE INTO screen_rows (trade_date, symbol, run_id, previous_date, {', '.join(ROW_FIELDS)}, record_timestamp) "
+                   f"VALUES (?, ?, ?, ?, {', '.join('?' * len(ROW_FIELDS))}, ?)")
+_DELETE_HITS_SQL = "DELETE FROM screen_hits WHERE trade_date = ?"
+_INSERT_HIT_SQL = "INSERT OR REPLACE INTO screen_hits (trade_date, symbol, run_id, percent_change, record_timestamp) VALUES (?, ?, ?, ?, ?)"
+_FINISH_RUN_SQL = ("UPDATE screen_runs SET status = 'complete', finished_at = ?, row_count = ?, error_count = ?, hit_count = ? "
+                   "WHERE run_id = ?")
+_FAIL_RUN_SQL = "UPDATE screen_runs SET status = 'failed', finished_at = ? WHERE run_id = ?"
+_INSERT_FAILED_RUN_SQL = ("INSERT INTO screen_runs (trade_date, previous_date, source, status, started_at, finished_at, universe_size) "
+                          "VALUES (?, ?, ?, 'failed', ?, ?, ?)")
+
+logger = logging.getLogger(__name__)
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def _row_values(record):
+    """The ROW_FIELDS of a stock dict as the fetchers build it (missing keys are NULL)."""
+    return tuple(record.get(field) for field in ROW_FIELDS)
+
+# --- 2. Store ---
+
+class ScreenStore:
+    """
+    The screen_runs / screen_rows / screen_hits tables in one SQLite file. Opening it creates
+    the schema if needed and imports any legacy per-date tables not imported yet (see
+    migrate_legacy_tables). Connections come from a SQLiteConnectionManager (WAL,
+    synchronous=SYNCHRONOUS, a CACHE_SIZE_KB page cache): writes go through its single writer
+    thread, reads use the calling thread's long-lived read-only connection, so dashboard
+    reads never block a run being stored.
+    """
+
+    def __init__(self, path=DB_PATH, migrate=True):
+        self.path = path
+        self._db = SQLiteConnectionManager(path, pragmas={"synchronous": SYNCHRONOUS, "cache_size": -CACHE_SIZE_KB},
+                                           setup=_create_schema, name="screen-store-writer")
+        if migrate:
+            self.migrate_legacy_tables()
+
+    def _reader(self):
+        return self._db.reader()
+
+    def close(self):
+        """Finishes queued writes and closes every connection to the file."""
+        self._db.close()
+
+    # Writing runs
+
+    def start_run(self, trade_date, previous_date, source, universe_size=None):
+        """Records a run as 'running' and returns its run_id."""
+        def write(conn):
+            with conn:
+                return conn.execute(_INSERT_RUN_SQL, (str(trade_date), previous_date and str(previous_date), source, _now(), universe_size)).lastrowid
+        return self._db.write(write)
+
+    def _record_failure(self, trade_date, previous_date, source, run_id, universe_size, started_at, error):
+        """After a failed store_run: its run is recorded as 'failed' (inserted, if its insert was rolled back)."""
+        def write(conn):
+            with conn:
+                if run_id is not None:
+                    conn.execute(_FAIL_RUN_SQL, (_now(), run_id))
+                    return run_id
+                return conn.execute(_INSERT_FAILED_RUN_SQL, (trade_date, previous_date, source, started_at, _now(), universe_size)).lastrowid
+        try:
+            failed_run_id = self._db.write(write)
+            logger.error(f"Storing run {failed_run_id} for {trade_date} failed ({error}); marked 'failed'.")
+        except sqlite3.Error as e:
+            logger.error(f"Storing a run for {trade_date} failed ({error}), and so did marking it failed ({e}).")
+
+    def store_run(self, trade_date, previous_date, rows, hits, source, run_id=None, universe_size=None):
+        """
+        Writes a finished run: `rows` are stock dicts (stock_symbol plus ROW_FIELDS), `hits` are
+        (symbol, percent_change) pairs. trade_date's rows are replaced symbol by symbol and its
+        hits as a set (left alone when `hits` is None). Everything, including the screen_runs
+        row unless `run_id` names one already started, is one transaction of batched
+        statements. `universe_size` defaults to len(rows); a resumed run writes fewer rows than
+        it screened. Returns the run_id. If the write fails it is rolled back, the run is recorded
+        as 'failed' and the error re-raised.
+        """
+        trade_date, previous_date = str(trade_date), previous_date and str(previous_date)
+        now = _now() # One timestamp for the whole run
+        error_count = sum(1 for record in rows if record.get('error_message'))
+        hit_count = None if hits is None else len(hits)
+        # Parameters are built here, on the caller's thread, so the writer only runs SQL
+        row_params = [(trade_date, record['stock_symbol'], previous_date, *_row_values(record), now) for record in rows]
+        hit_params = None if hits is None else [(trade_date, symbol, percent_change, now) for symbol, percent_change in hits]
+
+        def write(conn):
+            with conn: # Commits on success, rolls back on error
+                new_run_id = run_id
+                if new_run_id is None:
+                    new_run_id = conn.execute(_INSERT_RUN_SQL, (trade_date, previous_date, source, now, universe_size or len(rows))).lastrowid
+                conn.executemany(_UPSERT_ROW_SQL, [(p[0], p[1], new_run_id, *p[2:]) for p in row_params])
+                if hit_params is not None:
+                    conn.execute(_DELETE_HITS_SQL, (trade_date,))
+                    conn.executemany(_INSERT_HIT_SQL, [(p[0], p[1], new_run_id, *p[2:]) for p in hit_params])
+                conn.execute(_FINISH_RUN_SQL, (now, len(rows), error_count, hit_count, new_run_id))
+                return new_run_id
+
+        try:
+            run_id = self._db.write(write)
+        except Exception as e:
+            self._record_failure(trade_date, previous_date, source, run_id, universe_size or len(rows), now, e)
+            raise
+        logger.info(f"Stored run {run_id} for {trade_date}: {len(rows)} rows ({error_count} with errors), {hit_count} hits.")
+        return run_id
+
+    # Reading
+
+    def hits(self, trade_date):
+        """[(symbol, percent_change)] for trade_date, by symbol."""
+        return self._reader().execute(
+            "SELECT symbol, percent_change FROM screen_hits WHERE trade_date = ? ORDER BY symbol", (str(trade_date),)).fetchall()
+
+    def rows(self, trade_date):
+        """trade_date's stored rows as stock dicts, by symbol."""
+        cursor = self._reader().execute(
+            f"SELECT symbol, previous_date, {', '.join(ROW_FIELDS)}, record_timestamp FROM screen_rows WHERE trade_date = ? ORDER BY symbol",
+            (str(trade_date),))
+        return [dict(zip(('stock_symbol', 'previous_date', *ROW_FIELDS, 'record_timestamp'), row)) for row in cursor]
+
+    def runs(self, trade_date=None, limit=50):
+        """The most recent runs (of one trade_date, if given), newest first, as dicts."""
+        sql = "SELECT * FROM screen_runs"
+        params = []
+        if trade_date is not None:
+            sql += " WHERE trade_date = ?"
+            params.append(str(trade_date))
+        cursor = self._reader().execute(sql + " ORDER BY run_id DESC LIMIT ?", (*params, limit))
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    # --- 3. Legacy Migration ---
+
+    def legacy_tables(self, conn=None):
+        """{'YYYY-MM-DD': {'data': name, 'filtered': name}} for the per-date tables in this file."""
+        by_date = {}
+        for (name,) in (conn or self._reader()).execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+            match = _LEGACY_TABLE.match(name)
+            if match:
+                kind, year, month, day = match.groups()
+                by_date.setdefault(f"{year}-{month}-{day}", {})[kind] = name
+        return dict(sorted(by_date.items()))
+
+    def migrate_legacy_tables(self, drop=False):
+        """
+        Imports every data_YYYY_MM_DD / filtered_YYYY_MM_DD pair not imported before, as one
+        'imported' run per date (source 'legacy:<table>'). Rows already stored for that date by
+        a newer run are kept. With `drop`, the legacy tables are dropped once imported.
+        Returns {trade_date: (rows imported, hits imported)} for this call. Runs on the writer.
+        """
+        return self._db.write(lambda conn: self._migrate(conn, drop))
+
+    def _migrate(self, conn, drop):
+        imported = {}
+        for trade_date, tables in self.legacy_tables(conn).items():
+            source = f"legacy:{tables.get('data') or tables['filtered']}"
+            already = conn.execute("SELECT 1 FROM screen_runs WHERE source = ?", (source,)).fetchone()
+            if not already:
+                imported[trade_date] = self._import_legacy_date(conn, trade_date, tables, source)
+            if drop:
+                with conn:
+                    for name in tables.values():
+                        conn.execute(f'DROP TABLE "{name}"')
+                logger.info(f"Dropped legacy tables {', '.join(tables.values())}.")
+        return imported
+
+    def _import_legacy_date(self, conn, trade_date, tables, source):
+        rows, hits = [], []
+        if 'data' in tables:
+            columns = {c[1] for c in conn.execute(f'PRAGMA table_info("{tables["data"]}")')}
+            select = ", ".join(c if c in columns else "NULL" for c in ('stock_symbol', *ROW_FIELDS, 'record_timestamp'))
+            # Ordered by id so that, for a symbol inserted twice, the later row wins as it did on read
+            rows = conn.execute(f'SELECT {select} FROM "{tables["data"]}" ORDER BY id').fetchall()
+        if 'filtered' in tables:
+            hits = conn.execute(f'SELECT stock_symbol, percent_change, record_timestamp FROM "{tables["filtered"]}" '
+                                'WHERE percent_change IS NOT NULL ORDER BY id').fetchall()
+        timestamps = [r[-1] for r in rows + hits if r[-1]]
+        started, finished = (min(timestamps), max(timestamps)) if timestamps else (_now(), _now())
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO screen_runs (trade_date, previous_date, source, status, started_at, finished_at, universe_size, row_count, error_count, hit_count) "
+                "VALUES (?, NULL, ?, 'imported', ?, ?, ?, ?, ?, ?)",
+                (trade_date, source, started, finished, len(rows), len(rows), sum(1 for r in rows if r[-2]), len(hits))).lastrowid
+            conn.executemany(
+                f"INSERT OR IGNORE INTO screen_rows (trade_date, symbol, run_id, {', '.join(ROW_FIELDS)}, record_timestamp) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(ROW_FIELDS))}, ?)",
+                [(trade_date, r[0], run_id, *r[1:-1], r[-1] or started) for r in reversed(rows)])
+            conn.executemany("INSERT OR IGNORE INTO screen_hits (trade_date, symbol, run_id, percent_change, record_timestamp) VALUES (?, ?, ?, ?, ?)",
+                             [(trade_date, symbol, run_id, percent_change, ts or started) for symbol, percent_change, ts in reversed(hits)])
+        logger.info(f"Imported legacy tables for {trade_date} as run {run_id}: {len(rows)} rows, {len(hits)} hits.")
+        return len(rows), len(hits)
+
+def _create_schema(conn):
+    with conn:
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_screen_store(path=DB_PATH):
+    """The process-wide ScreenStore for `path`, opened (and migrated) on first use."""
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = ScreenStore(path)
+    return store
+
+# --- 4. Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate or inspect the screen_runs / screen_rows / screen_hits tables.")
+    parser.add_argument("command", choices=("migrate", "runs"))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--drop-legacy", action="store_true", help="migrate: drop the per-date tables once imported")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    store = ScreenStore(args.db, migrate=False)
+    if args.command == "migrate":
+        imported = store.migrate_legacy_tables(drop=args.drop_legacy)
+        for trade_date, (n_rows, n_hits) in imported.items():
+            print(f"{trade_date}: {n_rows} rows, {n_hits} hits")
+        if not imported:
+            print("No legacy tables left to import.")
+    else:
+        for run in store.runs():
+            print(run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
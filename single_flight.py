@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_LEADER_CANCELLED = object() # Set as the shared result when the leader is cancelled; joiners retry
+
+# --- 1. Thread Single-Flight ---
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs the
+    function, and callers that arrive while it is running wait for it and get the same result,
+    or the same exception re-raised. Once the leader finishes the key is forgotten, so the next
+    call runs afresh (results are not cached here). `stats` counts leaders and joined callers.
+    """
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "joined": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+            else:
+                self.stats["joined"] += 1
+        if not leader:
+            logger.debug(f"{self.name}: joining the in-flight call for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+# --- 2. asyncio Single-Flight ---
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines. Calls are coalesced per event loop, since a future can only be
+    awaited on the loop that created it; the Flask app runs one loop per request. Cancelling the
+    leader cancels only the leader: its key is forgotten and the first joiner to wake runs the
+    call again, the others joining it.
+    """
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self._futures = {} # (loop, key) -> Future of the leader's result
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "joined": 0, "leaders_cancelled": 0}
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                future = self._futures.get((loop, key))
+                leader = future is None
+                if leader:
+                    future = self._futures[(loop, key)] = loop.create_future()
+                    self.stats["leaders"] += 1
+                else:
+                    self.stats["joined"] += 1
+            if leader:
+                return await self._lead(loop, key, future, coro_fn, *args, **kwargs)
+            result = await asyncio.shield(future) # A cancelled joiner must not cancel the leader's result
+            if result is not _LEADER_CANCELLED:
+                return result
+            logger.debug(f"{self.name}: the leader for {key} was cancelled; running it again")
+
+    async def _lead(self, loop, key, future, coro_fn, *args, **kwargs):
+        try:
+            result = await coro_fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            with self._lock:
+                self.stats["leaders_cancelled"] += 1
+            future.set_result(_LEADER_CANCELLED) # The key is forgotten below before any joiner wakes
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # Marks it retrieved when nobody joined
+            raise
+        finally:
+            with self._lock:
+                del self._futures[(loop, key)]
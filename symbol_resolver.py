@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+from difflib import SequenceMatcher
+
+from instrument_master import CACHE_DIR
+
+# --- 1. Configuration ---
+RESOLUTION_FILE = os.path.join(CACHE_DIR, "symbol_resolution.json")
+RESOLUTION_FORMAT_VERSION = 1
+MIN_FUZZY_SCORE = 0.75 # Below this a fuzzy candidate is reported as unresolved rather than guessed
+
+# Words that carry no identity in company names ("RELIANCE INDUSTRIES LTD" == "Reliance Industries")
+_NAME_SUFFIX_WORDS = {"LTD", "LIMITED", "L", "THE", "CO", "COMPANY", "CORP", "CORPORATION", "INC"}
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Normalization ---
+
+def normalize_name(name):
+    """Upper-cases, spells out '&', drops punctuation and legal-entity suffixes: "Dr. Reddy's Labs Ltd." -> "DR REDDYS LABS"."""
+    text = (name or '').upper().replace('&', ' AND ').replace("'", '')
+    words = re.sub(r'[^A-Z0-9]+', ' ', text).split()
+    # Upstream spells possessives with a space ("DIVI S LABORATORIES"); fold them back into the word
+    folded = []
+    for word in words:
+        if word == 'S' and folded:
+            folded[-1] += word
+        else:
+            folded.append(word)
+    words = folded
+    while words and words[-1] in _NAME_SUFFIX_WORDS:
+        words.pop()
+    return ' '.join(words)
+
+def _compact_symbol(text):
+    """Symbol-shaped forms of a short name: "L&T" -> ("L&T", "LT")."""
+    upper = re.sub(r'\s+', '', (text or '').upper())
+    return tuple(dict.fromkeys(s for s in (upper, re.sub(r'[^A-Z0-9]', '', upper)) if s))
+
+def _split_alias(stock_name):
+    """"Larsen & Toubro (L&T)" -> ("Larsen & Toubro", "L&T"); names without parentheses have no alias."""
+    match = re.search(r'\((.*?)\)', stock_name)
+    if not match:
+        return stock_name, None
+    return (stock_name[:match.start()] + stock_name[match.end():]).strip(), match.group(1).strip()
+
+def _word_matches(word, listed_word):
+    """True when one word abbreviates the other: PHARMA/PHARMACEUTICALS, PRUDENTIAL/PRU, LABS/LABORATORIES."""
+    if listed_word.startswith(word) or word.startswith(listed_word):
+        return True
+    return len(word) > 3 and word.endswith('S') and listed_word.startswith(word[:-1])
+
+def _abbreviates(words, listed_words):
+    """True when every word lines up with the listed name word in the same position."""
+    return len(words) <= len(listed_words) and all(map(_word_matches, words, listed_words))
+
+# --- 3. Candidate Table ---
+
+class EquityNameTable:
+    """
+    The NSE equity rows of an InstrumentMaster, keyed the ways a human-written stock name can
+    match them: by trading symbol, by normalized company name, and by first name word (the
+    block that fuzzy ranking searches). Built once per resolution pass.
+    """
+
+    def __init__(self, master, segment='NSE_EQ'):
+        self.symbols = set()
+        self.by_name = {}
+        self.by_first_word = {}
+        for index in master.select(segment=segment, instrument_type='EQ', exchange='NSE'):
+            row = master.row(index)
+            symbol = row.get('trading_symbol')
+            if not symbol:
+                continue
+            self.symbols.add(symbol)
+            normalized = normalize_name(row.get('name')) or normalize_name(symbol)
+            self.by_name.setdefault(normalized, symbol)
+            self.by_first_word.setdefault(normalized.split(' ', 1)[0], []).append((normalized, symbol))
+
+    def match_symbol(self, text):
+        for candidate in _compact_symbol(text):
+            if candidate in self.symbols:
+                return candidate
+        return None
+
+    def rank(self, normalized):
+        """Returns (score, symbol) of the closest company name sharing the first word, or (0.0, None)."""
+        best = (0.0, None)
+        words = normalized.split()
+        for candidate_name, symbol in self.by_first_word.get(words[0] if words else '', ()):
+            score = SequenceMatcher(None, normalized, candidate_name).ratio()
+            if _abbreviates(words, candidate_name.split()):
+                score = max(score, 0.9)
+            if score > best[0]:
+                best = (score, symbol)
+        return best
+
+# --- 4. Resolution ---
+
+def resolve_trading_symbol(stock_name, table):
+    """
+    Resolves one human-written stock name against an EquityNameTable.
+    Returns {"symbol", "method", "score"}; symbol is None when nothing scores above MIN_FUZZY_SCORE.
+    """
+    base_name, alias = _split_alias(stock_name)
+    normalized = normalize_name(base_name)
+
+    if alias:
+        symbol = table.match_symbol(alias)
+        if symbol:
+            return {"symbol": symbol, "method": "alias", "score": 1.0}
+    symbol = table.by_name.get(normalized)
+    if symbol:
+        return {"symbol": symbol, "method": "name", "score": 1.0}
+    symbol = table.match_symbol(base_name) or table.match_symbol(normalized)
+    if symbol:
+        return {"symbol": symbol, "method": "symbol", "score": 1.0}
+    if alias:
+        symbol = table.by_name.get(normalize_name(alias))
+        if symbol:
+            return {"symbol": symbol, "method": "name", "score": 1.0}
+
+    score, symbol = table.rank(normalized)
+    if symbol and score >= MIN_FUZZY_SCORE:
+        return {"symbol": symbol, "method": "fuzzy", "score": round(score, 3)}
+    return {"symbol": None, "method": "unresolved", "score": round(score, 3)}
+
+def _load_resolutions(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable symbol resolution file {path}: {e}")
+        return {}
+    if saved.get('version') != RESOLUTION_FORMAT_VERSION:
+        return {}
+    return saved.get('names', {})
+
+def _save_resolutions(path, resolutions):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # A temp file of its own per call, so concurrent saves never write into each other's file
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=f"{os.path.basename(path)}.",
+                                     suffix='.tmp', delete=False) as f:
+        try:
+            json.dump({'version': RESOLUTION_FORMAT_VERSION, 'names': resolutions}, f, indent=1, sort_keys=True)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+def resolve_trading_symbols(stock_names, master, path=RESOLUTION_FILE):
+    """
+    Maps each stock name to its NSE trading symbol (or None), reusing the resolution table on disk.
+
+    Saved entries are kept as long as their symbol is still an NSE equity in `master`, so a run
+    only resolves names that are new, were edited, were unresolved last time, or whose symbol
+    disappeared from the master. Saved entries can be corrected by hand; a corrected symbol is
+    kept for as long as it exists in the master.
+    """
+    saved = _load_resolutions(path)
+    resolutions = {}
+    pending = []
+    for stock_name in stock_names:
+        entry = saved.get(stock_name)
+        if entry and entry.get('symbol') and master.find_equity_key(entry['symbol']):
+            resolutions[stock_name] = entry
+        else:
+            pending.append(stock_name)
+
+    if pending:
+        start = time.perf_counter()
+        table = EquityNameTable(master)
+        for stock_name in pending:
+            resolutions[stock_name] = resolve_trading_symbol(stock_name, table)
+            entry = resolutions[stock_name]
+            if entry['symbol'] is None:
+                logger.warning(f"Could not resolve a trading symbol for '{stock_name}' (best score {entry['score']}).")
+            elif entry['method'] == 'fuzzy':
+                logger.info(f"Fuzzy-resolved '{stock_name}' -> {entry['symbol']} (score {entry['score']}).")
+        logger.info(f"Resolved {len(pending)} of {len(resolutions)} stock names in "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms; {len(resolutions) - len(pending)} reused from {path}.")
+        try:
+            _save_resolutions(path, {**saved, **resolutions})
+        except OSError as e:
+            logger.warning(f"Could not save symbol resolutions to {path}: {e}")
+
+    return {stock_name: entry['symbol'] for stock_name, entry in resolutions.items()}
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root; keep the tests off the real caches and the network.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INSTRUMENT_CACHE_DIR", tempfile.mkdtemp(prefix="instrument_cache_"))
+os.environ.setdefault("INSTRUMENT_REFRESHER_AUTOSTART", "0")
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+from candle_archive import CandleArchive, decode_session, encode_session, import_candle_cache, to_candles
+from candle_cache import CandleCache
+from instrument_master import IST
+
+KEY = "NSE_EQ|INE002A01018"
+DAY = date(2025, 5, 23)
+
+def session(day=DAY, n=375, start_price=2500.0):
+    start = datetime.combine(day, time(9, 15), IST)
+    candles, price, oi = [], start_price, 1_000_000
+    for m in range(n):
+        close = round(price + (m % 7 - 3) * 0.05, 2)
+        candles.append([(start + timedelta(minutes=m)).isoformat(), price, round(max(price, close) + 0.1, 2),
+                        round(min(price, close) - 0.05, 2), close, 1000 + m * 3, oi])
+        price, oi = close, oi + (m % 5 - 2) * 150
+    return candles[::-1] # Upstox returns newest first
+
+@pytest.fixture
+def archive(tmp_path):
+    return CandleArchive(str(tmp_path / "archive.db"))
+
+def test_codec_round_trip():
+    candles = session()
+    blob = encode_session(candles)
+    assert to_candles(decode_session(blob)) == candles[::-1]
+    assert len(blob) < len(str(candles)) / 5
+
+def test_codec_round_trip_fine_prices_and_empty():
+    candles = [["2025-05-23T09:15:00+05:30", 0.0525, 0.055, 0.05, 0.0531, 10, 0],
+               ["2025-05-23T09:16:00+05:30", 0.0531, 0.06, 0.0525, 0.0575, 20, 0]]
+    assert to_candles(decode_session(encode_session(candles))) == candles
+    assert to_candles(decode_session(encode_session([]))) == []
+
+def test_codec_rejects_what_it_cannot_store_exactly():
+    with pytest.raises(ValueError):
+        encode_session([["2025-05-23T09:15:00+05:30", 1.1234567, 1, 1, 1, 10, 0]])
+    with pytest.raises(ValueError):
+        encode_session([["2025-05-23T09:15:00+05:30", 1, 1, 1, 1, 10.5, 0]])
+
+def test_put_days_archives_finished_sessions_only(archive):
+    today = datetime.now(IST).date()
+    written = archive.put_days(KEY, {DAY.isoformat(): session(), today.isoformat(): session(today)})
+    assert written == 1
+    assert archive.archived_dates(KEY) == [DAY.isoformat()]
+    assert archive.get_candles(KEY, today) is None
+
+def test_lookups(archive):
+    candles = session()
+    archive.put_days(KEY, {DAY.isoformat(): candles, (DAY + timedelta(days=1)).isoformat(): session(DAY + timedelta(days=1))})
+    at_920 = next(c for c in candles if c[0].endswith("T09:20:00+05:30"))
+    assert archive.candle_at(KEY, datetime.combine(DAY, time(9, 20), IST)) == at_920
+    assert archive.candle_at(KEY, datetime.combine(DAY, time(20, 0), IST)) is None
+    window = archive.candles_between(KEY, datetime.combine(DAY, time(15, 0), IST),
+                                     datetime.combine(DAY + timedelta(days=1), time(9, 30), IST))
+    assert len(window["close"]) == 30 + 16
+    assert np.all(np.diff(window["timestamp"]) > 0)
+
+def test_get_or_fetch_reads_the_archive_first(archive):
+    fetched = []
+    def fetch():
+        fetched.append(1)
+        return {DAY.isoformat(): session()}
+    first = archive.get_or_fetch(KEY, DAY, fetch)
+    assert first == session()
+    assert archive.get_or_fetch(KEY, DAY, fetch) == session()[::-1] # Archived oldest first
+    assert len(fetched) == 1
+
+def test_get_or_fetch_async(archive):
+    async def fetch():
+        return {DAY.isoformat(): session()}
+    assert asyncio.run(archive.get_or_fetch_async(KEY, DAY, fetch)) == session()
+    assert archive.get_candles(KEY, DAY) == session()[::-1]
+
+def test_get_or_fetch_does_not_archive_a_day_left_out(archive):
+    next_day = DAY + timedelta(days=1)
+    responses = [{next_day.isoformat(): session(next_day)}, {DAY.isoformat(): session()}]
+    assert archive.get_or_fetch(KEY, DAY, lambda: responses.pop(0)) == []
+    assert archive.get_candles(KEY, DAY) is None
+    assert archive.get_candles(KEY, next_day) == session(next_day)[::-1]
+    assert archive.get_or_fetch(KEY, DAY, lambda: responses.pop(0)) == session()
+
+def test_get_or_fetch_refetches_an_empty_cached_entry(tmp_path, archive):
+    cache = CandleCache(str(tmp_path / "candles.db"))
+    cache._connection().execute("INSERT INTO candles VALUES (?, 'minutes', 1, ?, '[]', 0, 1)", (KEY, DAY.isoformat()))
+    assert archive.get_or_fetch(KEY, DAY, lambda: {DAY.isoformat(): session()}, cache=cache) == session()
+
+def test_get_or_fetch_moves_cached_json_sessions(tmp_path, archive):
+    cache = CandleCache(str(tmp_path / "candles.db"))
+    cache.put_days(KEY, "minutes", 1, {DAY.isoformat(): session()})
+    candles = archive.get_or_fetch(KEY, DAY, lambda: pytest.fail("fetched a cached session"), cache=cache)
+    assert candles == session()
+    assert cache.final_entry(KEY, "minutes", 1, DAY) is None
+    assert archive.get_candles(KEY, DAY) == session()[::-1]
+
+def test_import_candle_cache_with_evict(tmp_path, archive):
+    cache_path = str(tmp_path / "candles.db")
+    cache = CandleCache(cache_path)
+    cache.put_days(KEY, "minutes", 1, {DAY.isoformat(): session()})
+    cache.put_days(KEY, "days", 1, {DAY.isoformat(): [["2025-05-23T00:00:00+05:30", 1, 1, 1, 1, 1, 1]]})
+    assert import_candle_cache(archive, cache_path, evict=True) == 1
+    assert cache.final_entry(KEY, "minutes", 1, DAY) is None
+    assert cache.final_entry(KEY, "days", 1, DAY) is not None
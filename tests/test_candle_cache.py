@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import candle_cache
+from candle_cache import CandleCache, split_candles_by_day
+from instrument_master import IST
+
+KEY = "NSE_EQ|INE002A01018"
+PAST = "2025-05-22"
+
+def candle(day, minute, close=100.0):
+    return [f"{day}T09:{15 + minute:02d}:00+05:30", close, close, close, close, 1000, 0]
+
+@pytest.fixture
+def cache(tmp_path):
+    return CandleCache(str(tmp_path / "candles.db"), current_day_ttl_seconds=60)
+
+def test_miss_then_hit(cache):
+    assert cache.get(KEY, "minutes", 1, PAST) is None
+    cache.put_days(KEY, "minutes", 1, {PAST: [candle(PAST, 0)]})
+    assert cache.get(KEY, "minutes", 1, PAST) == [candle(PAST, 0)]
+    assert cache.get(KEY, "minutes", 5, PAST) is None
+    assert cache.stats == {"hits": 1, "misses": 2, "expired": 0, "writes": 1}
+
+def test_empty_list_is_an_entry(cache):
+    cache.put_days(KEY, "minutes", 1, {PAST: []})
+    assert cache.get(KEY, "minutes", 1, PAST) == []
+
+def test_todays_entry_expires(cache, monkeypatch):
+    today = datetime.now(IST).date().isoformat()
+    cache.put_days(KEY, "minutes", 1, {today: [candle(today, 0)], PAST: [candle(PAST, 0)]})
+    assert cache.get(KEY, "minutes", 1, today) == [candle(today, 0)]
+    later = time.time() + 61
+    monkeypatch.setattr(candle_cache.time, "time", lambda: later)
+    assert cache.get(KEY, "minutes", 1, today) is None
+    assert cache.get(KEY, "minutes", 1, PAST) == [candle(PAST, 0)]
+    assert cache.stats["expired"] == 1
+
+def test_is_final():
+    today = datetime.now(IST).date()
+    assert CandleCache.is_final(today - timedelta(days=1))
+    assert not CandleCache.is_final(today)
+    assert not CandleCache.is_final((today + timedelta(days=1)).isoformat())
+
+def test_get_or_fetch_writes_every_day_of_the_response(cache):
+    other = "2025-05-21"
+    calls = []
+    def fetch():
+        calls.append(1)
+        return split_candles_by_day([candle(PAST, 1), candle(PAST, 0), candle(other, 0)])
+    assert cache.get_or_fetch(KEY, "minutes", 1, PAST, fetch) == [candle(PAST, 1), candle(PAST, 0)]
+    assert cache.get_or_fetch(KEY, "minutes", 1, other, fetch) == [candle(other, 0)]
+    assert len(calls) == 1
+
+def test_empty_entries_expire_unless_settled(cache, monkeypatch):
+    cache.put_days(KEY, "days", 1, {"2025-05-20": [], "2025-05-21": [candle("2025-05-21", 0)], PAST: []},
+                   settled_through="2025-05-21")
+    later = time.time() + 61
+    monkeypatch.setattr(candle_cache.time, "time", lambda: later)
+    assert cache.get(KEY, "days", 1, "2025-05-20") == []
+    assert cache.get(KEY, "days", 1, PAST) is None
+
+def test_get_or_fetch_missing_day_is_fetched_again(cache, monkeypatch):
+    responses = [{"2025-05-21": [candle("2025-05-21", 0)]}, {PAST: [candle(PAST, 0)]}]
+    assert cache.get_or_fetch(KEY, "minutes", 1, PAST, lambda: responses.pop(0)) == []
+    assert cache.get(KEY, "minutes", 1, PAST) == [] # Within the TTL
+    later = time.time() + 61
+    monkeypatch.setattr(candle_cache.time, "time", lambda: later)
+    assert cache.get_or_fetch(KEY, "minutes", 1, PAST, lambda: responses.pop(0)) == [candle(PAST, 0)]
+    assert cache.get(KEY, "minutes", 1, "2025-05-21") == [candle("2025-05-21", 0)]
+
+def test_get_or_fetch_error_writes_nothing(cache):
+    def fetch():
+        raise RuntimeError("upstream down")
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch(KEY, "minutes", 1, PAST, fetch)
+    assert cache.get(KEY, "minutes", 1, PAST) is None
+    assert cache.stats["writes"] == 0
+
+def test_concurrent_misses_share_one_fetch(cache):
+    calls = []
+    started = threading.Event()
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {PAST: [candle(PAST, 0)]}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(KEY, "minutes", 1, PAST, fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [[candle(PAST, 0)]] * 8
+
+def test_get_or_fetch_async(cache):
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {PAST: [candle(PAST, 0)]}
+    async def main():
+        return await asyncio.gather(*(cache.get_or_fetch_async(KEY, "minutes", 1, PAST, fetch) for _ in range(5)))
+    assert asyncio.run(main()) == [[candle(PAST, 0)]] * 5
+    assert len(calls) == 1
+
+def test_final_entry_and_evict(cache):
+    today = datetime.now(IST).date().isoformat()
+    cache.put_days(KEY, "minutes", 1, {PAST: [candle(PAST, 0)], today: [candle(today, 0)]})
+    stats = dict(cache.stats)
+    assert cache.final_entry(KEY, "minutes", 1, PAST) == [candle(PAST, 0)]
+    assert cache.final_entry(KEY, "minutes", 1, today) is None
+    assert cache.stats == stats
+    assert cache.evict(KEY, "minutes", 1, [PAST, date(2025, 5, 20)]) == 1
+    assert cache.get(KEY, "minutes", 1, PAST) is None
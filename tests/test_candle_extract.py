@@ -0,0 +1,57 @@
+import json
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from candle_extract import candle_timestamp, candles_at_times, extract_candles_from_body, find_candles_at
+
+DAY = date(2025, 5, 23)
+
+def session(n=30):
+    start = datetime.combine(DAY, time(9, 15))
+    return [[f"{(start + timedelta(minutes=m)).isoformat()}+05:30", 100.0 + m, 101.0 + m, 99.0 + m, 100.5 + m, 1000 + m, 5000]
+            for m in range(n)]
+
+TARGETS = [candle_timestamp(DAY, time(9, 20)), candle_timestamp(DAY, time(9, 15)), candle_timestamp(DAY, time(9, 44))]
+
+def body(payload):
+    return json.dumps(payload).encode()
+
+def test_candle_timestamp():
+    assert candle_timestamp(DAY, time(9, 20)) == "2025-05-23T09:20:00+05:30"
+
+@pytest.mark.parametrize("order", ["oldest_first", "newest_first"])
+def test_find_candles_at(order):
+    candles = session() if order == "oldest_first" else session()[::-1]
+    found = find_candles_at(candles, TARGETS)
+    assert found == {ts: next(c for c in session() if c[0] == ts) for ts in TARGETS}
+    assert found[TARGETS[0]][1] == 105.0
+
+def test_find_candles_at_missing_timestamp():
+    candles = [c for c in session() if not c[0].startswith("2025-05-23T09:20")]
+    assert set(find_candles_at(candles, TARGETS)) == {TARGETS[1], TARGETS[2]}
+    assert find_candles_at(candles[::-1], [candle_timestamp(DAY, time(9, 20))]) == {}
+    assert find_candles_at([], TARGETS) == {}
+
+def test_find_candles_at_other_timestamp_forms():
+    # Same instants written in UTC: found by the parsing fallback, as the fetchers always did
+    utc = [[(datetime.fromisoformat(c[0]) - timedelta(hours=5, minutes=30)).strftime("%Y-%m-%dT%H:%M:%S"), *c[1:]]
+           for c in session()]
+    assert find_candles_at(utc, [candle_timestamp(DAY, time(3, 50), "")]) == {"2025-05-23T03:50:00": utc[5]}
+
+@pytest.mark.parametrize("order", ["oldest_first", "newest_first"])
+def test_extract_candles_from_body(order):
+    candles = session() if order == "oldest_first" else session()[::-1]
+    raw = body({"status": "success", "data": {"candles": candles}})
+    assert extract_candles_from_body(raw, TARGETS) == find_candles_at(candles, TARGETS)
+
+def test_extract_candles_from_body_without_a_session():
+    assert extract_candles_from_body(body({"status": "success", "data": None}), TARGETS) == {}
+    assert extract_candles_from_body(body({"status": "success", "data": {"candles": []}}), TARGETS) == {}
+    assert extract_candles_from_body(body({"status": "success"}), TARGETS) == {}
+
+def test_candles_at_times_takes_lists_or_bodies():
+    times = [time(9, 20), time(15, 29)]
+    expected = {time(9, 20): session()[5]}
+    assert candles_at_times(session(), DAY, times) == expected
+    assert candles_at_times(body({"data": {"candles": session()[::-1]}}), DAY, times) == expected
@@ -0,0 +1,130 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError,
+                             CIRCUIT_COOLDOWN_SECONDS, CIRCUIT_FAILURE_THRESHOLD, endpoint_of, open_circuits)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(circuit_breaker, "_auth_failed", {})
+
+CANDLE_URL = "https://api.upstox.com/v3/historical-candle/NSE_EQ%7CINE002A01018/minutes/1/2025-05-22"
+QUOTE_URL = "https://api.upstox.com/v2/market-quote/quotes"
+
+def trip(breaker):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.on_response(503, breaker.allow())
+
+def test_endpoint_drops_instrument_keys_and_dates():
+    assert endpoint_of(CANDLE_URL) == "/v3/historical-candle/minutes/1"
+    assert endpoint_of(CANDLE_URL.replace("INE002A01018", "INE467B01029")) == endpoint_of(CANDLE_URL)
+
+def test_opens_after_threshold_failures_in_window(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.on_response(500, breaker.allow())
+    assert breaker.state == CLOSED
+    breaker.on_failure("timeout", breaker.allow())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.allow()
+    assert excinfo.value.retry_in_seconds == pytest.approx(CIRCUIT_COOLDOWN_SECONDS)
+    assert breaker.short_circuited == 1
+
+def test_failures_outside_the_window_do_not_count(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD * 2):
+        breaker.on_response(502, breaker.allow())
+        clock.now += circuit_breaker.CIRCUIT_FAILURE_WINDOW_SECONDS
+    assert breaker.state == CLOSED
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.on_response(500, breaker.allow())
+    breaker.on_response(200, breaker.allow())
+    breaker.on_response(500, breaker.allow())
+    assert breaker.state == CLOSED
+
+def test_one_half_open_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    trip(breaker)
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    breaker.check()
+    probe = breaker.allow()
+    assert probe is True and breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow() # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.on_response(200, probe)
+    assert breaker.state == CLOSED and breaker.short_circuited == 0
+    assert breaker.allow() is False
+
+def test_failed_probe_doubles_the_cooldown(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    trip(breaker)
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    breaker.on_response(503, breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.cooldown_seconds == 2 * CIRCUIT_COOLDOWN_SECONDS
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    assert breaker.allow() is True
+
+def test_429_probe_lets_the_next_caller_probe(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    trip(breaker)
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    breaker.on_response(429, breaker.allow())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+
+def test_stale_success_does_not_close_an_open_circuit(clock):
+    breaker = CircuitBreaker("/v2/market-quote/quotes")
+    in_flight = breaker.allow()
+    trip(breaker)
+    breaker.on_response(200, in_flight)
+    assert breaker.state == OPEN
+
+def test_401_opens_every_endpoint_for_the_token(clock):
+    quotes = circuit_breaker.circuit_breaker("token-a", QUOTE_URL)
+    candles = circuit_breaker.circuit_breaker("token-a", CANDLE_URL)
+    other_token = circuit_breaker.circuit_breaker("token-b", QUOTE_URL)
+    quotes.on_response(401, quotes.allow())
+    assert quotes.state == candles.state == OPEN
+    assert other_token.state == CLOSED
+    # Endpoints first used after the 401 start open too
+    later = circuit_breaker.circuit_breaker("token-a", "https://api.upstox.com/v2/user/profile")
+    assert later.state == OPEN
+    assert {e["endpoint"] for e in open_circuits("token-a")} == {quotes.endpoint, candles.endpoint, later.endpoint}
+    assert all(e["status"] == 401 for e in open_circuits("token-a"))
+    assert open_circuits("token-b") == []
+
+def test_successful_probe_clears_the_auth_failure(clock):
+    quotes = circuit_breaker.circuit_breaker("token-a", QUOTE_URL)
+    quotes.on_response(401, quotes.allow())
+    clock.now += CIRCUIT_COOLDOWN_SECONDS
+    quotes.on_response(200, quotes.allow())
+    assert circuit_breaker.circuit_breaker("token-a", CANDLE_URL).state == CLOSED
+
+def test_registry_returns_one_breaker_per_endpoint_and_token():
+    first = circuit_breaker.circuit_breaker("token-a", CANDLE_URL)
+    assert circuit_breaker.circuit_breaker("token-a", CANDLE_URL.replace("2025-05-22", "2025-05-23")) is first
+    assert circuit_breaker.circuit_breaker("token-b", CANDLE_URL) is not first
@@ -0,0 +1,45 @@
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+import columnar_export
+from candle_archive import CandleArchive
+from instrument_master import IST
+
+REPO_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upstox_data_v2.db")
+
+def test_unmigrated_screen_store_is_migrated_before_reading(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    shutil.copy(REPO_DB, path) # Per-date tables only, as the app left them before the screen store
+    rows = columnar_export.read_columns("screen_rows", path, fmt="numpy")
+    hits = columnar_export.read_columns("screen_hits", path, "2025-05-23", "2025-05-23", fmt="numpy")
+    assert len(rows["symbol"]) > 0
+    assert set(hits["trade_date"].astype(str)) == {"2025-05-23"}
+
+def test_missing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        columnar_export.read_columns("screen_rows", str(tmp_path / "missing.db"), fmt="numpy")
+
+def test_archived_candles_in_chunks(tmp_path):
+    archive = CandleArchive(str(tmp_path / "archive.db"))
+    day = date(2025, 5, 23)
+    start = datetime.combine(day, time(9, 15), IST)
+    for k in range(3):
+        candles = [[(start + timedelta(minutes=m)).isoformat(), 100.0 + k, 100.5 + k, 99.5 + k, 100.25 + k, 10 + m, k]
+                   for m in range(375)]
+        archive.put_days(f"NSE_EQ|KEY{k}", {day.isoformat(): candles})
+    chunks = list(columnar_export.iter_chunks("archived_candles", archive.path, symbols=["NSE_EQ|KEY0", "NSE_EQ|KEY2"],
+                                              columns=["instrument_key", "timestamp", "close"], chunk_rows=500, fmt="numpy"))
+    assert [len(chunk["close"]) for chunk in chunks] == [500, 250]
+    close = np.concatenate([chunk["close"] for chunk in chunks])
+    assert close[0] == 100.25 and close[-1] == 102.25
+    assert chunks[0]["timestamp"][0] == np.datetime64("2025-05-23T03:45:00") # 09:15 IST, stored as UTC
+
+def test_unknown_dataset_and_columns():
+    with pytest.raises(ValueError):
+        columnar_export.read_columns("nope")
+    with pytest.raises(ValueError):
+        columnar_export.read_columns("screen_rows", columns=["nope"])
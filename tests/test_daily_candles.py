@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import candle_cache
+import daily_candles
+from candle_cache import CandleCache
+from daily_candles import DailyCandleRanges
+from instrument_master import IST
+
+KEY = "NSE_EQ|INE002A01018"
+TODAY = datetime.now(IST).date()
+
+def daily(day, close=100.0):
+    return [f"{day.isoformat()}T00:00:00+05:30", close, close, close, close, 1000, 0]
+
+@pytest.fixture
+def requests_made(monkeypatch):
+    """Serves days/1 ranges with a candle every day except TODAY - 5 (a holiday) and yesterday (not published yet)."""
+    made = []
+    def fetch_daily_range(access_token, instrument_key, from_date, to_date, api_base_url, timeout):
+        made.append((from_date, to_date))
+        days = (from_date + timedelta(days=i) for i in range((to_date - from_date).days + 1))
+        return {d.isoformat(): daily(d) for d in days
+                if d not in (TODAY - timedelta(days=5), TODAY - timedelta(days=1)) and d < TODAY}
+    monkeypatch.setattr(daily_candles, "fetch_daily_range", fetch_daily_range)
+    return made
+
+def test_days_without_a_candle_before_the_newest_are_covered(requests_made):
+    ranges = DailyCandleRanges("token", lookback_days=10)
+    assert ranges.candle(KEY, TODAY) is None
+    assert ranges.candle(KEY, TODAY - timedelta(days=2)) == daily(TODAY - timedelta(days=2))
+    assert ranges.candle(KEY, TODAY - timedelta(days=5)) is None # Holiday, answered from the range
+    assert len(requests_made) == 1
+
+def test_unpublished_day_after_the_newest_candle_is_fetched_again(requests_made):
+    ranges = DailyCandleRanges("token", lookback_days=10)
+    ranges.candle(KEY, TODAY - timedelta(days=2))
+    assert ranges.candle(KEY, TODAY - timedelta(days=1)) is None
+    assert ranges.candle(KEY, TODAY - timedelta(days=1)) is None
+    assert len(requests_made) == 3
+
+def test_persistent_cache_keeps_only_settled_empty_days(requests_made, tmp_path, monkeypatch):
+    cache = CandleCache(str(tmp_path / "candles.db"), current_day_ttl_seconds=60)
+    DailyCandleRanges("token", lookback_days=10, cache=cache).candle(KEY, TODAY - timedelta(days=1))
+    later = time.time() + 61
+    monkeypatch.setattr(candle_cache.time, "time", lambda: later)
+    assert cache.get(KEY, "days", 1, (TODAY - timedelta(days=5)).isoformat()) == []
+    assert cache.get(KEY, "days", 1, (TODAY - timedelta(days=1)).isoformat()) is None
+    restarted = DailyCandleRanges("token", lookback_days=10, cache=cache)
+    assert restarted.candle(KEY, TODAY - timedelta(days=5)) is None
+    assert len(requests_made) == 1
+    restarted.candle(KEY, TODAY - timedelta(days=1))
+    assert len(requests_made) == 2
@@ -0,0 +1,50 @@
+import gc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db_connections import SQLiteConnectionManager
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteConnectionManager(str(tmp_path / "test.db"), setup=lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"))
+    yield db
+    db.close()
+
+def test_writes_are_visible_to_readers(db):
+    db.write(lambda conn: conn.execute("INSERT INTO t VALUES (1)") and conn.commit())
+    assert db.reader().execute("SELECT x FROM t").fetchall() == [(1,)]
+
+def test_write_errors_reach_the_caller(db):
+    with pytest.raises(Exception):
+        db.write(lambda conn: conn.execute("INSERT INTO missing VALUES (1)"))
+    assert db.stats["write_errors"] == 1
+
+def test_readers_are_closed_when_their_threads_exit(db):
+    def read():
+        db.reader().execute("SELECT count(*) FROM t").fetchone()
+
+    for _ in range(10):
+        threads = [threading.Thread(target=read) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    gc.collect()
+    assert db.stats["readers_opened"] == 200
+    assert db.open_readers == 0
+
+def test_pool_threads_keep_their_reader(db):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        connections = set(pool.map(lambda _: id(db.reader()), range(100)))
+        assert len(connections) <= 4
+        assert db.open_readers <= 4
+    gc.collect()
+    assert db.open_readers == 0
+
+def test_close_closes_live_readers(db):
+    db.reader()
+    assert db.open_readers == 1
+    db.close()
+    assert db.open_readers == 0
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+import pytest
+import requests
+
+import instrument_master
+from instrument_master import IST, InstrumentMaster, iter_instruments, load_instrument_master
+
+def instrument(symbol, key, segment="NSE_EQ", instrument_type="EQ", **fields):
+    return {"trading_symbol": symbol, "instrument_key": key, "segment": segment, "instrument_type": instrument_type,
+            "exchange": "NSE", "name": symbol.title(), **fields}
+
+def futures(underlying, *expiries):
+    return [instrument(f"{underlying} FUT {day}", f"NSE_FO|{underlying}{day}", "NSE_FO", "FUT", underlying_symbol=underlying,
+                       expiry=int(datetime.combine(day, datetime.min.time(), IST).timestamp() * 1000), lot_size=250)
+            for day in expiries]
+
+INSTRUMENTS = ([instrument(f"SYM{i}", f"NSE_EQ|INE{i:06d}01", isin=f"INE{i:06d}01") for i in range(2000)]
+               + [instrument("SYM7", "NSE_EQ|DUPLICATE")] # A later duplicate: lookups return the first row
+               + [instrument("SYM7", "BSE_EQ|INE00000701", "BSE_EQ")]
+               + futures("SYM7", date(2025, 6, 26), date(2025, 5, 29), date(2025, 7, 31)))
+
+def check(master):
+    assert master.find_equity_key("SYM7") == "NSE_EQ|INE00000701"
+    assert master.find("SYM7", "BSE_EQ", "EQ").get("instrument_key") == "BSE_EQ|INE00000701"
+    assert master.find_equity_key("MISSING") is None
+    assert master.find_equity_keys(["SYM1", "SYM1999", "NOPE"]) == {"SYM1": "NSE_EQ|INE00000101",
+                                                                   "SYM1999": "NSE_EQ|INE00199901", "NOPE": None}
+    assert master.get_by_key("NSE_EQ|INE00004201").get("trading_symbol") == "SYM42"
+    assert master.get_by_key("NSE_EQ|DUPLICATE").get("trading_symbol") == "SYM7"
+    assert master.get_by_key("NSE_EQ|MISSING") is None
+    assert master.get_by_key("") is None
+    assert [row.get("instrument_key") for row in master.get_by_isin("INE00000301")] == ["NSE_EQ|INE00000301"]
+    expiries = [datetime.fromtimestamp(row.get("expiry") / 1000, IST).date() for row in master.futures("SYM7", date(2025, 6, 1))]
+    assert expiries == [date(2025, 6, 26), date(2025, 7, 31)]
+
+def test_lookups():
+    check(InstrumentMaster(INSTRUMENTS))
+
+def test_snapshot_lookups(tmp_path):
+    path = str(tmp_path / "NSE.snapshot")
+    InstrumentMaster(INSTRUMENTS).write_snapshot(path)
+    check(InstrumentMaster.open_snapshot(path))
+
+def test_every_key_is_found():
+    master = InstrumentMaster(INSTRUMENTS)
+    for i in range(2000):
+        assert master.get_by_key(f"NSE_EQ|INE{i:06d}01").get("trading_symbol") == f"SYM{i}"
+
+# load_instrument_master: disk cache, conditional revalidation and stale fallback
+
+PAYLOAD = gzip.compress(json.dumps([instrument("SYM1", "NSE_EQ|INE00000101", lot_size=1)]).encode())
+URL = "https://example.com/NSE.json.gz"
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code, self.body, self.headers = status_code, body, headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size):
+        return (self.body[i:i + chunk_size] for i in range(0, len(self.body), chunk_size))
+
+class FakeUpstream:
+    def __init__(self, monkeypatch):
+        self.responses, self.requests = [], []
+        self.now = 1_000_000.0
+        monkeypatch.setattr(instrument_master.requests, "get", self.get)
+        monkeypatch.setattr(instrument_master.time, "time", lambda: self.now)
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requests.append(headers)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+@pytest.fixture
+def upstream(monkeypatch):
+    return FakeUpstream(monkeypatch)
+
+def load(tmp_path, **kwargs):
+    return load_instrument_master(URL, cache_dir=str(tmp_path), ttl_seconds=60, **kwargs)
+
+def test_loader_serves_the_disk_copy_within_the_ttl(tmp_path, upstream):
+    upstream.responses.append(FakeResponse(200, PAYLOAD, {"ETag": '"v1"', "Last-Modified": "Fri, 23 May 2025 00:00:00 GMT"}))
+    assert [row["trading_symbol"] for row in load(tmp_path)] == ["SYM1"]
+    upstream.now += 59
+    assert [row["trading_symbol"] for row in load(tmp_path)] == ["SYM1"]
+    assert upstream.requests == [{}]
+
+def test_loader_revalidates_after_the_ttl_and_reuses_the_copy_on_304(tmp_path, upstream):
+    upstream.responses += [FakeResponse(200, PAYLOAD, {"ETag": '"v1"', "Last-Modified": "Fri, 23 May 2025 00:00:00 GMT"}),
+                           FakeResponse(304)]
+    load(tmp_path)
+    upstream.now += 61
+    assert [row["trading_symbol"] for row in load(tmp_path)] == ["SYM1"]
+    assert upstream.requests[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Fri, 23 May 2025 00:00:00 GMT"}
+    upstream.now += 59 # The 304 restarted the TTL
+    load(tmp_path)
+    assert len(upstream.requests) == 2
+
+def test_loader_replaces_the_copy_on_200(tmp_path, upstream):
+    changed = gzip.compress(json.dumps([instrument("SYM2", "NSE_EQ|INE00000201")]).encode())
+    upstream.responses += [FakeResponse(200, PAYLOAD, {"ETag": '"v1"'}), FakeResponse(200, changed, {"ETag": '"v2"'})]
+    load(tmp_path)
+    assert [row["trading_symbol"] for row in load(tmp_path, force_refresh=True)] == ["SYM2"]
+    assert upstream.requests[1] == {"If-None-Match": '"v1"'}
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+def test_loader_falls_back_to_the_stale_copy(tmp_path, upstream):
+    upstream.responses += [FakeResponse(200, PAYLOAD, {"ETag": '"v1"'}), requests.ConnectionError("offline"), FakeResponse(503)]
+    load(tmp_path)
+    upstream.now += 61
+    assert [row["trading_symbol"] for row in load(tmp_path)] == ["SYM1"]
+    assert [row["trading_symbol"] for row in load(tmp_path)] == ["SYM1"]
+    assert len(upstream.requests) == 3 # A failed revalidation does not restart the TTL
+
+def test_loader_without_a_copy_returns_none_when_upstream_fails(tmp_path, upstream):
+    upstream.responses.append(FakeResponse(500))
+    assert load(tmp_path) is None
+
+# iter_instruments: records and string literals split across read-chunk boundaries
+
+TRICKY = [instrument(f"SYM{i}", f"NSE_EQ|INE{i:06d}01", name=name, lot_size=i, extra={"nested": [1, {"x": "}]"}]})
+          for i, name in enumerate(['Plain', 'Brace } and bracket ] inside', 'Escaped \\"quote\\" and \\\\ slash',
+                                    'Multi-byte ₹ Ünïcode', 'Comma, colon: {"not": "json"}', ''])]
+
+@pytest.mark.parametrize("compress", [False, True], ids=["plain", "gzip"])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_iter_instruments_across_chunk_boundaries(compress, chunk_size):
+    payload = json.dumps(TRICKY, ensure_ascii=False, indent=1).encode()
+    if compress:
+        payload = gzip.compress(payload)
+    chunks = (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size))
+    expected = [{field: row[field] for field in instrument_master.INSTRUMENT_FIELDS if field in row} for row in TRICKY]
+    assert list(iter_instruments(chunks)) == expected
+
+def test_iter_instruments_rejects_a_truncated_stream():
+    payload = json.dumps(TRICKY).encode()[:-40]
+    with pytest.raises(ValueError):
+        list(iter_instruments(payload[i:i + 5] for i in range(0, len(payload), 5)))
+
+def test_nearest_future_keys_roll_to_next_month_after_expiry():
+    master = InstrumentMaster(INSTRUMENTS)
+    assert master.nearest_future_keys(["SYM7", "SYM1"], date(2025, 5, 29)) == {"SYM7": "NSE_FO|SYM72025-05-29", "SYM1": None}
+    assert master.nearest_future_keys(["SYM7"], date(2025, 5, 30)) == {"SYM7": "NSE_FO|SYM72025-06-26"}
+    assert [row.get("instrument_key") for row in master.futures_expiring_in("SYM7", 2025, 5)] == ["NSE_FO|SYM72025-05-29"]
@@ -0,0 +1,95 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, SlidingWindowLog, TokenBucket, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+def admitted_over(limiter, clock, seconds, step=1e-9):
+    """Admissions per whole second over `seconds` of fake time, releasing each request at once."""
+    per_second = [0] * int(seconds)
+    end = clock.now + seconds
+    start = clock.now
+    while clock.now < end:
+        wait = limiter._try_admit()
+        if wait == 0:
+            per_second[int(clock.now - start)] += 1
+            limiter.release(200, 0.01)
+        else:
+            clock.now += max(wait, step)
+    return per_second
+
+def test_for_limit_sustains_the_limit():
+    bucket = TokenBucket.for_limit(500, 60.0, burst=250)
+    assert bucket.rate == pytest.approx(500 / 60.0)
+    assert bucket.capacity == 250
+    assert TokenBucket.for_limit(2, 1.0, burst=1).rate == 2.0
+    assert TokenBucket.for_limit(1, 1.0, burst=1).rate == 1.0
+
+def test_zero_limit_is_rejected():
+    with pytest.raises(ValueError):
+        TokenBucket.for_limit(0, 1.0, burst=1)
+    with pytest.raises(ValueError):
+        TokenBucket(0, 1)
+
+def test_falsy_limit_disables_it(clock):
+    limiter = RateLimiter(per_second=0, per_minute=None, concurrency_initial=64)
+    for _ in range(1000):
+        assert limiter._try_admit() == 0
+        limiter.release(200, 0.01)
+
+@pytest.mark.parametrize("per_second", [1, 2, 50])
+def test_per_second_throughput(clock, per_second):
+    limiter = RateLimiter(per_second=per_second, per_minute=None, concurrency_initial=64)
+    counts = admitted_over(limiter, clock, 10)
+    assert max(counts) <= per_second
+    assert sum(counts) >= 10 * per_second - 1
+
+def test_per_minute_throughput_and_window_cap(clock):
+    limiter = RateLimiter(per_second=50, per_minute=500, concurrency_initial=64)
+    counts = admitted_over(limiter, clock, 180)
+    windows = [sum(counts[i:i + 60]) for i in range(len(counts) - 59)]
+    assert max(windows) <= 500
+    assert sum(counts[:60]) == 500 # The burst at 50/s, then the sustained rate fills the minute
+    assert sum(counts[60:]) >= 2 * 500 - 2
+    assert max(counts) <= 50
+
+def test_sliding_window_log():
+    window = SlidingWindowLog(3, 1.0)
+    for t in (0.0, 0.1, 0.2):
+        window.refill(t)
+        assert window.wait_time(t) == 0
+        window.take(t)
+    assert window.wait_time(0.5) == pytest.approx(0.5)
+    window.refill(1.0)
+    assert window.wait_time(1.0) == 0
+
+def test_429_pauses_admissions(clock):
+    limiter = RateLimiter(per_second=None, per_minute=600, concurrency_initial=8)
+    assert limiter._try_admit() == 0
+    limiter.release(429, retry_after=2.0)
+    assert limiter._try_admit() == pytest.approx(2.0)
+    assert limiter.concurrency_limit == 4
+    clock.now += 2.0
+    admitted = 0
+    while limiter._try_admit() == 0: # The burst was drained: only the pause's refill (10/s) is left
+        limiter.release(200, 0.01)
+        admitted += 1
+    assert admitted == 20
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == pytest.approx(10.0)
+    assert parse_retry_after("soon") is None
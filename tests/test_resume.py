@@ -0,0 +1,74 @@
+import pytest
+
+import app
+from instrument_master import InstrumentMaster
+from screen_store import open_screen_store
+
+CURRENT, PREVIOUS = "2025-05-23", "2025-05-22"
+NAMES = {"Infosys": "INFY", "Tata Consultancy Services": "TCS", "State Bank of India": "SBIN"}
+# Daily close and 09:20 price each fetched stock comes back with
+PRICES = {"NSE_EQ|INFY": (100.0, 50.0), "NSE_EQ|TCS": (200.0, 201.0), "NSE_EQ|SBIN": (800.0, 840.0)}
+
+def row(symbol, prev_close, price, error_message=None):
+    return {'stock_symbol': symbol, 'prev_day_equity_close': prev_close, 'prev_day_equity_oi': 1,
+            'equity_920_price': price, 'equity_920_oi': 1, 'error_message': error_message}
+
+@pytest.fixture(params=["threads", "async"])
+def run(request, tmp_path, monkeypatch):
+    """Sets up a three-stock universe with a partial stored run; returns the fetched instrument keys per call."""
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "screen.db"))
+    monkeypatch.setattr(app, "ANALYZE_ENGINE", request.param)
+    monkeypatch.setattr(app, "F_AND_O_STOCK_NAMES", list(NAMES))
+    master = InstrumentMaster([{"trading_symbol": symbol, "instrument_key": f"NSE_EQ|{symbol}", "segment": "NSE_EQ",
+                                "instrument_type": "EQ", "exchange": "NSE", "name": name} for name, symbol in NAMES.items()])
+    monkeypatch.setattr(app, "get_instrument_master", lambda: master)
+    monkeypatch.setattr(app, "resolve_trading_symbols", lambda names, master: {name: NAMES[name] for name in names})
+    fetched = {"daily": [], "intraday": []}
+
+    def daily(instrument_key, date_str):
+        fetched["daily"].append(instrument_key)
+        return PRICES[instrument_key][0], 1, None
+
+    def intraday(instrument_key, day):
+        fetched["intraday"].append(instrument_key)
+        return PRICES[instrument_key][1], 1, None
+
+    async def daily_async(client, instrument_key, date_str):
+        return daily(instrument_key, date_str)
+
+    async def intraday_async(client, instrument_key, day):
+        return intraday(instrument_key, day)
+
+    monkeypatch.setattr(app, "fetch_historical_data_for_analyzer", daily)
+    monkeypatch.setattr(app, "fetch_intraday_data_920_for_analyzer", intraday)
+    monkeypatch.setattr(app, "fetch_historical_data_for_analyzer_async", daily_async)
+    monkeypatch.setattr(app, "fetch_intraday_data_920_for_analyzer_async", intraday_async)
+
+    # INFY is stored complete (a 10% hit), TCS errored, SBIN never made it into the store
+    open_screen_store(app.DB_PATH).store_run(
+        CURRENT, PREVIOUS, [row("INFY", 100.0, 110.0), row("TCS", None, None, "HTTP Error 500")], [("INFY", 10.0)],
+        source="app", universe_size=len(NAMES))
+    return fetched
+
+def test_resume_fetches_only_missing_stocks_and_merges(run):
+    response = app.app.test_client().get(f"/api/analyze_stocks?previous_date={PREVIOUS}&current_date={CURRENT}&resume=1")
+    assert response.status_code == 200
+    result = response.get_json()
+    assert sorted(run["daily"]) == sorted(run["intraday"]) == ["NSE_EQ|SBIN", "NSE_EQ|TCS"]
+    assert result["resumed"] == {"reused": 1, "refetched": 2}
+    assert result["processed_stocks_count"] == 3
+    # The reused INFY row still counts towards the filter; TCS moved 0.5%, under the threshold
+    assert result["filtered_stocks"] == [{"symbol": "INFY", "percent_change": 10.0}, {"symbol": "SBIN", "percent_change": 5.0}]
+
+    store = open_screen_store(app.DB_PATH)
+    rows = {r['stock_symbol']: r for r in store.rows(CURRENT)}
+    assert rows["INFY"]["equity_920_price"] == 110.0 # Kept, not refetched (the fetch would say 50.0)
+    assert rows["TCS"]["equity_920_price"] == 201.0 and rows["TCS"]["error_message"] is None
+    assert rows["SBIN"]["equity_920_price"] == 840.0
+    assert store.hits(CURRENT) == [("INFY", 10.0), ("SBIN", 5.0)]
+    latest = store.runs(CURRENT, limit=1)[0]
+    assert (latest["row_count"], latest["universe_size"], latest["hit_count"]) == (2, 3, 2)
+
+def test_resume_against_another_previous_date_refetches_everything(run):
+    app.app.test_client().get(f"/api/analyze_stocks?previous_date=2025-05-21&current_date={CURRENT}&resume=1")
+    assert sorted(run["daily"]) == ["NSE_EQ|INFY", "NSE_EQ|SBIN", "NSE_EQ|TCS"]
@@ -0,0 +1,26 @@
+import pytest
+
+import app
+from screen_store import open_screen_store
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "screen.db"))
+    store = open_screen_store(app.DB_PATH)
+    for day in range(1, 8):
+        store.store_run(f"2025-05-{day:02d}", None, [], [], source="test")
+    return app.app.test_client()
+
+@pytest.mark.parametrize("limit, expected", [("-1", 1), ("0", 1), ("3", 3), ("100000", 7)])
+def test_limit_is_clamped(client, limit, expected):
+    response = client.get(f"/api/screen_runs?limit={limit}")
+    assert response.status_code == 200
+    assert len(response.get_json()["runs"]) == expected
+
+def test_limit_upper_bound(client, monkeypatch):
+    monkeypatch.setattr(app, "SCREEN_RUNS_MAX_LIMIT", 2)
+    assert len(client.get("/api/screen_runs?limit=5").get_json()["runs"]) == 2
+
+def test_bad_parameters(client):
+    assert client.get("/api/screen_runs?limit=x").status_code == 400
+    assert client.get("/api/screen_runs?trade_date=23-05-2025").status_code == 400
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from screen_store import ScreenStore
+
+REPO_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upstox_data_v2.db")
+
+def row(symbol, price=110.0, error=None):
+    return {'stock_symbol': symbol, 'prev_day_equity_close': 100.0, 'prev_day_equity_oi': 5,
+            'equity_920_price': price, 'equity_920_oi': 6, 'error_message': error}
+
+@pytest.fixture
+def store(tmp_path):
+    store = ScreenStore(str(tmp_path / "screen.db"))
+    yield store
+    store.close()
+
+def test_store_run_replaces_rows_per_symbol_and_hits_as_a_set(store):
+    store.store_run("2025-05-23", "2025-05-22", [row("INFY"), row("TCS")], [("INFY", 10.0), ("TCS", 2.5)], source="test")
+    run_id = store.store_run("2025-05-23", "2025-05-22", [row("TCS", 120.0, "HTTP Error")], [("TCS", 20.0)], source="test")
+    rows = {r['stock_symbol']: r for r in store.rows("2025-05-23")}
+    assert rows["INFY"]["equity_920_price"] == 110.0
+    assert rows["TCS"]["equity_920_price"] == 120.0 and rows["TCS"]["error_message"] == "HTTP Error"
+    assert store.hits("2025-05-23") == [("TCS", 20.0)]
+    latest = store.runs("2025-05-23", limit=1)[0]
+    assert (latest["run_id"], latest["status"], latest["row_count"], latest["error_count"], latest["hit_count"]) == (run_id, "complete", 1, 1, 1)
+
+def test_hits_none_leaves_hits_alone(store):
+    store.store_run("2025-05-23", None, [row("INFY")], [("INFY", 10.0)], source="test")
+    store.store_run("2025-05-23", None, [row("SBIN")], None, source="single")
+    assert store.hits("2025-05-23") == [("INFY", 10.0)]
+
+def test_failed_store_is_rolled_back_and_recorded(store):
+    store.store_run("2025-05-23", None, [row("INFY")], [("INFY", 10.0)], source="test")
+    with pytest.raises(sqlite3.IntegrityError):
+        store.store_run("2025-05-23", None, [row("TCS"), row(None)], [("TCS", 1.0)], source="test", universe_size=2)
+    assert [r['stock_symbol'] for r in store.rows("2025-05-23")] == ["INFY"]
+    assert store.hits("2025-05-23") == [("INFY", 10.0)]
+    failed = store.runs("2025-05-23", limit=1)[0]
+    assert (failed["status"], failed["universe_size"], failed["row_count"]) == ("failed", 2, None)
+    assert failed["finished_at"] is not None
+
+def test_failed_store_of_a_started_run(store):
+    run_id = store.start_run("2025-05-23", None, "test")
+    with pytest.raises(sqlite3.IntegrityError):
+        store.store_run("2025-05-23", None, [row(None)], None, source="test", run_id=run_id)
+    assert [(r["run_id"], r["status"]) for r in store.runs("2025-05-23")] == [(run_id, "failed")]
+
+def test_legacy_tables_are_migrated_once(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    shutil.copy(REPO_DB, path)
+    store = ScreenStore(path)
+    try:
+        imported = store.runs()
+        assert imported and all(run["status"] == "imported" and run["source"].startswith("legacy:") for run in imported)
+        assert store.rows("2025-05-23")
+        assert store.migrate_legacy_tables() == {} # Already imported
+        assert store.migrate_legacy_tables(drop=True) == {}
+        assert store.legacy_tables() == {}
+        assert len(store.runs()) == len(imported)
+    finally:
+        store.close()
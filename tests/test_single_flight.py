@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    calls, release = [], threading.Event()
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fn))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.stats["leaders"] + flight.stats["joined"] < 8:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 8
+    assert len(calls) == 1
+    assert flight.do("key", lambda: "again") == "again" # Nothing is cached once the call is done
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+    errors = []
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    joiner = threading.Thread(target=call)
+    joiner.start()
+    while flight.stats["joined"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    joiner.join()
+    assert len(errors) == 2
+
+def test_async_calls_share_one_run():
+    flight = AsyncSingleFlight()
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+
+def test_cancelled_async_leader_does_not_cancel_joiners():
+    flight = AsyncSingleFlight()
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+    async def main():
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        joiners = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*joiners)
+    assert asyncio.run(main()) == [2, 2, 2] # The first joiner re-ran the fetch; the others joined it
+    assert len(calls) == 2
+    assert flight.stats["leaders_cancelled"] == 1
+
+def test_cancelled_async_joiner_leaves_the_leader_running():
+    flight = AsyncSingleFlight()
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+    async def main():
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.005)
+        joiner.cancel()
+        return await leader
+    assert asyncio.run(main()) == "done"
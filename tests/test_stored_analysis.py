@@ -0,0 +1,51 @@
+import pytest
+
+import app
+from screen_store import open_screen_store
+
+CURRENT, PREVIOUS = "2025-05-23", "2025-05-22"
+
+def row(symbol, price=110.0):
+    return {'stock_symbol': symbol, 'prev_day_equity_close': 100.0, 'prev_day_equity_oi': 0,
+            'equity_920_price': price, 'equity_920_oi': 0, 'error_message': None}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "screen.db"))
+    store = open_screen_store(app.DB_PATH)
+    store.store_run(CURRENT, PREVIOUS, [row("INFY"), row("TCS", 101.0)], [("INFY", 10.0)], source="app",
+                    universe_size=len(app.F_AND_O_STOCK_NAMES))
+    return store
+
+def test_serves_the_apps_complete_run(store):
+    result = app.stored_analysis(CURRENT, PREVIOUS)
+    assert result["filtered_stocks"] == [{"symbol": "INFY", "percent_change": 10.0}]
+    assert result["processed_stocks_count"] == len(app.F_AND_O_STOCK_NAMES)
+    assert app.stored_analysis(CURRENT, "2025-05-21") is None
+
+def test_rows_written_by_another_tool_invalidate_the_stored_run(store):
+    store.store_run(CURRENT, "2025-05-21", [row("INFY", 90.0)], None, source="fetch_store_equity_data")
+    assert app.stored_analysis(CURRENT, PREVIOUS) is None
+
+def test_failed_and_imported_runs_do_not_invalidate_the_stored_run(store):
+    store.start_run(CURRENT, PREVIOUS, "fetch_store_equity_data") # Never finished: wrote nothing
+    def import_legacy_run(conn): # As _import_legacy_date records one; its rows are INSERT OR IGNORE
+        with conn:
+            conn.execute("INSERT INTO screen_runs (trade_date, source, status, started_at, row_count, hit_count) "
+                         "VALUES (?, 'legacy:data_2025_05_23', 'imported', '', 3, 1)", (CURRENT,))
+    store._db.write(import_legacy_run)
+    result = app.stored_analysis(CURRENT, PREVIOUS)
+    assert result["processed_stocks_count"] == len(app.F_AND_O_STOCK_NAMES)
+
+def test_hits_replaced_by_another_tool_are_not_served(store):
+    store.store_run(CURRENT, PREVIOUS, [row("SBIN")], [("SBIN", 5.0)], source="db_storage_module")
+    assert app.stored_analysis(CURRENT, PREVIOUS) is None
+
+def test_a_run_over_another_universe_is_not_served(store):
+    store.store_run(CURRENT, PREVIOUS, [row("INFY")], [("INFY", 10.0)], source="app", universe_size=1)
+    assert app.stored_analysis(CURRENT, PREVIOUS) is None
+
+def test_errored_rows_are_refetched_not_served(store):
+    store.store_run(CURRENT, PREVIOUS, [row("INFY"), {**row("TCS"), 'error_message': "HTTP Error"}], [("INFY", 10.0)],
+                    source="app", universe_size=len(app.F_AND_O_STOCK_NAMES))
+    assert app.stored_analysis(CURRENT, PREVIOUS) is None
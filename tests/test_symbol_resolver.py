@@ -0,0 +1,72 @@
+import os
+import threading
+
+import pytest
+
+from instrument_master import InstrumentMaster, _write_atomic
+from symbol_resolver import (MIN_FUZZY_SCORE, EquityNameTable, _load_resolutions, _save_resolutions, normalize_name,
+                             resolve_trading_symbol, resolve_trading_symbols)
+
+def test_concurrent_saves_never_interleave(tmp_path):
+    path = str(tmp_path / "symbol_resolution.json")
+    def save(i):
+        for _ in range(20):
+            _save_resolutions(path, {f"Name {j}": {"symbol": f"SYM{i}", "method": "test"} for j in range(200)})
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    saved = _load_resolutions(path)
+    assert len(saved) == 200 and len({entry["symbol"] for entry in saved.values()}) == 1
+    assert os.listdir(tmp_path) == ["symbol_resolution.json"] # No temp files left behind
+
+def test_write_atomic_leaves_no_temp_files(tmp_path):
+    path = str(tmp_path / "NSE.meta.json")
+    _write_atomic(path, "{}", mode='w')
+    _write_atomic(path, '{"etag": "x"}', mode='w')
+    assert os.listdir(tmp_path) == ["NSE.meta.json"]
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == '{"etag": "x"}'
+
+def test_resolutions_are_saved_and_reused(tmp_path):
+    path = str(tmp_path / "symbol_resolution.json")
+    master = InstrumentMaster([{"trading_symbol": "INFY", "name": "INFOSYS LIMITED", "instrument_key": "NSE_EQ|INE009A01021",
+                                "segment": "NSE_EQ", "instrument_type": "EQ", "exchange": "NSE"}])
+    assert resolve_trading_symbols(["Infosys"], master, path) == {"Infosys": "INFY"}
+    assert _load_resolutions(path)["Infosys"]["symbol"] == "INFY"
+    assert resolve_trading_symbols(["Infosys"], master, path) == {"Infosys": "INFY"}
+
+LISTED = [("LT", "LARSEN & TOUBRO LTD."), ("LTIM", "LTIMINDTREE LIMITED"), ("DRREDDY", "DR. REDDY'S LABORATORIES LTD"),
+          ("HINDUNILVR", "HINDUSTAN UNILEVER LTD."), ("HINDPETRO", "HINDUSTAN PETROLEUM CORP LTD"),
+          ("HINDALCO", "HINDALCO INDUSTRIES LTD"), ("HDFCBANK", "HDFC BANK LTD"), ("HDFCLIFE", "HDFC LIFE INS CO LTD"),
+          ("HDFCAMC", "HDFC AMC LIMITED")]
+
+@pytest.fixture(scope="module")
+def table():
+    return EquityNameTable(InstrumentMaster([{"trading_symbol": symbol, "name": name, "instrument_key": f"NSE_EQ|{symbol}",
+                                              "segment": "NSE_EQ", "instrument_type": "EQ", "exchange": "NSE"}
+                                             for symbol, name in LISTED]))
+
+@pytest.mark.parametrize("stock_name, symbol, method", [
+    ("Larsen & Toubro (L&T)", "LT", "alias"),
+    ("Dr. Reddy's Laboratories", "DRREDDY", "name"),
+    ("Dr Reddys Labs", "DRREDDY", "fuzzy"),
+    ("Hindustan Unilever", "HINDUNILVR", "name"),
+    ("HDFC Bank", "HDFCBANK", "name"),
+    ("HDFC Life", "HDFCLIFE", "symbol"),
+    ("HDFC Life Insurance", "HDFCLIFE", "fuzzy"),
+    ("HDFC Bnk", "HDFCBANK", "fuzzy"),
+    ("Hindustan Zinc", None, "unresolved"), # Closest is HINDUNILVR, below MIN_FUZZY_SCORE
+])
+def test_problem_names(table, stock_name, symbol, method):
+    resolution = resolve_trading_symbol(stock_name, table)
+    assert (resolution["symbol"], resolution["method"]) == (symbol, method)
+
+def test_fuzzy_ranking_separates_names_sharing_a_first_word(table):
+    life_score, life = table.rank(normalize_name("HDFC Life Insurance"))
+    bank_score, bank = table.rank(normalize_name("HDFC Bnk"))
+    assert (life, bank) == ("HDFCLIFE", "HDFCBANK")
+    assert min(life_score, bank_score) >= MIN_FUZZY_SCORE
+    score, symbol = table.rank(normalize_name("Larsen Toubro")) # Without the '&': no exact name match
+    assert symbol == "LT" and score >= MIN_FUZZY_SCORE
@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+import logging
+from urllib.parse import quote
+
+import aiohttp
+
+from rate_limiter import upstox_rate_limiter, parse_retry_after, MAX_RATE_LIMIT_RETRIES
+from circuit_breaker import circuit_breaker
+
+# --- 1. Configuration ---
+API_BASE_URL = os.environ.get("UPSTOX_API_BASE_URL", "https://api.upstox.com")
+# Requests allowed in flight at once per client. Requests beyond this wait on the semaphore
+# without holding a connection, so their timeouts only start once they are actually sent.
+ASYNC_MAX_IN_FLIGHT = int(os.environ.get("ASYNC_MAX_IN_FLIGHT", 256))
+DEFAULT_TIMEOUT_SECONDS = 20
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Errors ---
+
+class UpstoxHTTPError(Exception):
+    """A non-2xx response; mirrors what callers read from requests' HTTPError.response."""
+
+    def __init__(self, status, text, url):
+        super().__init__(f"{status} for {url}")
+        self.status = status
+        self.text = text
+        self.url = url
+
+# --- 3. Client ---
+
+class AsyncUpstoxClient:
+    """
+    asyncio client for the historical-candle endpoints used by the screens:
+
+        /v3/historical-candle/{key}/days/1/{date}
+        /v3/historical-candle/{key}/minutes/1/{date}
+        /v3/historical-candle/intraday/{key}/minutes/1
+
+    Use as `async with AsyncUpstoxClient(token) as client:`. One aiohttp session (and its
+    connection pool) is shared by every call made through the client; `max_in_flight` bounds
+    concurrent requests with a semaphore so thousands of coroutines can be queued safely, and
+    every request is also admitted by the shared rate limiter (429s are retried after the
+    limiter's Retry-After pause, as in upstox_http.upstox_get).
+    Each method returns the response's `data.candles` list (or None) and raises UpstoxHTTPError
+    for non-2xx responses; network errors and timeouts propagate as aiohttp/asyncio exceptions.
+    Outcomes feed the same per-endpoint circuit breakers as upstox_get, and CircuitOpenError is
+    raised without sending while an endpoint's circuit is open.
+    """
+
+    def __init__(self, access_token, api_base_url=API_BASE_URL, max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                 timeout_seconds=DEFAULT_TIMEOUT_SECONDS, limiter=upstox_rate_limiter):
+        self.access_token = access_token
+        self.limiter = limiter
+        self.api_base_url = api_base_url.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.timeout_seconds = timeout_seconds
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.access_token}", "Accept": "application/json"},
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_in_flight),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def get_candles(self, path, params=None, timeout_seconds=None):
+        """GETs `path` (relative to api_base_url) and returns data.candles."""
+        url = f"{self.api_base_url}{path}"
+        timeout = aiohttp.ClientTimeout(total=timeout_seconds or self.timeout_seconds)
+        breaker = circuit_breaker(self.access_token, url)
+        breaker.check()
+        async with self._semaphore:
+            breaker.check()
+            probe = False
+            status = None
+            try:
+                for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                    await self.limiter.acquire_async()
+                    start = time.monotonic()
+                    status = retry_after = None
+                    try:
+                        if attempt == 0: # Checked once admitted, so queued callers see a circuit opened meanwhile
+                            probe = breaker.allow()
+                        async with self._session.get(url, params=params, timeout=timeout) as response:
+                            status = response.status
+                            if status == 429:
+                                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                                error = UpstoxHTTPError(status, await response.text(), url)
+                                continue
+                            if status >= 400:
+                                raise UpstoxHTTPError(status, await response.text(), url)
+                            payload = await response.json(content_type=None)
+                            return ((payload or {}).get("data") or {}).get("candles") # "data" is null when there is no session
+                    finally:
+                        self.limiter.release(status, time.monotonic() - start, retry_after)
+                raise error # Still rate limited after every retry
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                breaker.on_failure(type(e).__name__, probe)
+                status = probe = None # Already reported
+                raise
+            finally:
+                if probe is not None:
+                    breaker.on_response(status, probe)
+
+    async def daily_candles(self, instrument_key, date_str, timeout_seconds=15):
+        return await self.get_candles(f"/v3/historical-candle/{quote(instrument_key)}/days/1/{date_str}",
+                                      timeout_seconds=timeout_seconds)
+
+    async def minute_candles(self, instrument_key, date_str, timeout_seconds=20):
+        # Same from_date quirk as the threaded fetchers: the date is repeated as a query parameter
+        return await self.get_candles(f"/v3/historical-candle/{quote(instrument_key)}/minutes/1/{date_str}",
+                                      params={"from_date": date_str}, timeout_seconds=timeout_seconds)
+
+    async def intraday_minute_candles(self, instrument_key, timeout_seconds=20):
+        return await self.get_candles(f"/v3/historical-candle/intraday/{quote(instrument_key)}/minutes/1",
+                                      timeout_seconds=timeout_seconds)
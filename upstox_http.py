@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import upstox_rate_limiter, parse_retry_after, MAX_RATE_LIMIT_RETRIES
+from circuit_breaker import circuit_breaker
+
+# --- 1. Configuration ---
+# Keep-alive connections kept open per host. Sized for the fetch engine's thread pool so that
+# concurrent fetches never have to open (and then discard) an extra TLS connection.
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 32))
+HTTP_POOL_CONNECTIONS = 4 # Distinct hosts cached; the fetchers only talk to api.upstox.com
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# --- 2. Shared Session ---
+
+def upstox_session(access_token):
+    """
+    Returns the process-wide requests.Session for `access_token`, creating it on first use.
+
+    The session carries the Bearer/Accept headers, so fetchers only pass the URL, params and
+    timeout. Its connection pool keeps up to HTTP_POOL_MAXSIZE keep-alive connections per host,
+    so after the first request each thread reuses an open TCP+TLS connection instead of
+    handshaking again. requests.Session is safe to share between the fetch engine's threads.
+    """
+    session = _sessions.get(access_token)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(access_token)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {access_token}", "Accept": "application/json"})
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[access_token] = session
+    return session
+
+def upstox_get(access_token, url, params=None, timeout=None, limiter=upstox_rate_limiter):
+    """
+    GETs `url` on the shared session once the rate limiter admits it. A 429 is reported to the
+    limiter (which pauses every caller for its Retry-After) and retried up to
+    MAX_RATE_LIMIT_RETRIES times, so a stock only fails on rate limiting if the limit never
+    clears. Returns the final requests.Response; callers still call raise_for_status().
+
+    The endpoint's circuit breaker sees every outcome; while it is open this raises
+    circuit_breaker.CircuitOpenError without sending anything.
+    """
+    session = upstox_session(access_token)
+    breaker = circuit_breaker(access_token, url)
+    breaker.check()
+    probe = False
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        start = time.monotonic()
+        status = retry_after = None
+        try:
+            if attempt == 0: # Checked once admitted, so callers queued at the limiter see a circuit opened meanwhile
+                probe = breaker.allow()
+            response = session.get(url, params=params, timeout=timeout)
+            status = response.status_code
+            if status == 429:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            breaker.on_failure(type(e).__name__, probe)
+            raise
+        except BaseException:
+            breaker.on_response(None, probe)
+            raise
+        finally:
+            limiter.release(status, time.monotonic() - start, retry_after)
+        if status != 429:
+            break
+        logger.warning(f"429 from Upstox for {url} (attempt {attempt + 1}); retrying after the limiter's pause.")
+    breaker.on_response(status, probe)
+    return response
+
+# --- 3. Instrumentation ---
+
+def connection_stats():
+    """
+    Totals over every shared session's connection pools: requests sent, connections opened, and
+    the share of requests that went out on an already-open connection.
+    """
+    requests_sent = connections_opened = 0
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    for session in sessions:
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+    reuse_rate = 1 - connections_opened / requests_sent if requests_sent else 0.0
+    return {"requests": requests_sent, "connections_opened": connections_opened, "reuse_rate": round(reuse_rate, 3)}
+
+def log_connection_stats(label="Upstox HTTP"):
+    stats = connection_stats()
+    logger.info(f"{label}: {stats['requests']} requests over {stats['connections_opened']} connections "
+                f"({stats['reuse_rate']:.1%} reused).")
+    return stats
@@ -0,0 +1,488 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import zlib
+import random
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
+from urllib.parse import unquote
+
+# A local stand-in for the parts of the Upstox API this repo talks to, so fetchers, the Flask
+# app and the benchmarks can run against realistic latency and failures without a token or the
+# network. Point any of them at it with UPSTOX_API_BASE_URL (and UPSTOX_INSTRUMENT_MASTER_URL
+# for the instrument master):
+#
+#   python upstox_mock_server.py --port 8765 --latency 0.05
+#   UPSTOX_API_BASE_URL=http://127.0.0.1:8765 \
+#   UPSTOX_INSTRUMENT_MASTER_URL=http://127.0.0.1:8765/market-quote/instruments/exchange/NSE.json.gz python app.py
+#
+# Served routes:
+#   GET /market-quote/instruments/exchange/NSE.json.gz        gzipped master (ETag / 304 aware)
+#   GET /v3/historical-candle/{key}/days/1/{date}            one daily candle
+#   GET /v3/historical-candle/{key}/days/1/{to}/{from}       daily candles of a range
+#   GET /v3/historical-candle/{key}/minutes/1/{date}         session before {date} (the D+1 quirk)
+#   GET /v3/historical-candle/{key}/minutes/1/{to}/{from}    minute candles of a range
+#   GET /v3/historical-candle/intraday/{key}/minutes/1       today's session so far
+#   GET|POST /__mock/config, GET /__mock/stats, POST /__mock/reset
+#
+# Candles are synthetic and deterministic per (instrument key, date), or replayed from a
+# fixtures directory recorded with --record-from against the real API.
+
+# --- 1. Configuration ---
+DEFAULT_HOST = os.environ.get("UPSTOX_MOCK_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.environ.get("UPSTOX_MOCK_PORT", 8765))
+INSTRUMENT_MASTER_PATH = "/market-quote/instruments/exchange/NSE.json.gz"
+SESSION_MINUTES = 375 # 09:15 to 15:29 inclusive
+MINUTE_BODY_CACHE_SIZE = 4096 # Serialised minute responses kept, so the mock's CPU stays out of the numbers
+
+DEFAULT_CONFIG = {
+    "latency_seconds": float(os.environ.get("UPSTOX_MOCK_LATENCY_SECONDS", 0.05)),
+    "jitter_seconds": 0.0, # Extra uniform random delay on top of the latency
+    "fail_status": None, # 401, 429 or a 5xx: answer a share of API requests with that error
+    "fail_rate": 1.0, # Share of API requests that get fail_status
+    "retry_after_seconds": 1, # Retry-After sent with injected 429s
+    "slow_seconds": 0.0, # Extra delay for a share of requests (e.g. past the client's timeout)
+    "slow_rate": 0.0,
+    "limit_per_second": None, # Sliding-window limit; requests beyond it get a 429, like the real API
+    "intraday_date": None, # Session served by the intraday route; defaults to today in IST
+}
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+_ERRORS = {
+    401: ("UDAPI100050", "Invalid token used to access API"),
+    429: ("UDAPI10005", "Too Many Request Sent"),
+    500: ("UDAPI100500", "Something went wrong"),
+    502: ("UDAPI100502", "Bad gateway"),
+    503: ("UDAPI100503", "Service unavailable"),
+    504: ("UDAPI100504", "Gateway timeout"),
+}
+
+logger = logging.getLogger(__name__)
+
+# --- 2. Synthetic Data ---
+
+def _hash(*parts):
+    return zlib.crc32("|".join(map(str, parts)).encode())
+
+def _unit_interval(*parts):
+    """A deterministic value in [-1, 1] for these parts."""
+    return (_hash(*parts) % 20001) / 10000.0 - 1.0
+
+def _base_price(instrument_key):
+    return 50.0 + _hash(instrument_key) % 495000 / 100.0
+
+def synthetic_daily_candle(instrument_key, day):
+    """[ts, o, h, l, c, volume, oi] for `day`, or None on weekends. Opens gap up to 5% from the base price."""
+    if day.weekday() >= 5:
+        return None
+    base = _base_price(instrument_key)
+    open_ = round(base * (1 + 0.05 * _unit_interval(instrument_key, day, "open")), 2)
+    close = round(base * (1 + 0.05 * _unit_interval(instrument_key, day, "close")), 2)
+    high, low = round(max(open_, close) * 1.004, 2), round(min(open_, close) * 0.996, 2)
+    volume = 100000 + _hash(instrument_key, day, "volume") % 5000000
+    oi = 0 if instrument_key.startswith("NSE_EQ") else 1000000 + _hash(instrument_key, day, "oi") % 9000000
+    return [f"{day.isoformat()}T00:00:00+05:30", open_, high, low, close, volume, oi]
+
+def synthetic_minute_candles(instrument_key, day, last_minute=SESSION_MINUTES):
+    """The day's 1-minute candles, newest first, walking from the daily open to the daily close."""
+    daily = synthetic_daily_candle(instrument_key, day)
+    if daily is None:
+        return []
+    open_, close, volume, oi = daily[1], daily[4], daily[5], daily[6]
+    candles = []
+    previous = open_
+    for minute in range(min(last_minute, SESSION_MINUTES)):
+        hh, mm = divmod(9 * 60 + 15 + minute, 60)
+        price = round(open_ + (close - open_) * (minute + 1) / SESSION_MINUTES, 2)
+        candles.append([f"{day.isoformat()}T{hh:02d}:{mm:02d}:00+05:30", previous, round(max(previous, price) + 0.05, 2),
+                        round(min(previous, price) - 0.05, 2), price, volume // SESSION_MINUTES, oi])
+        previous = price
+    candles.reverse() # Upstox returns newest first
+    return candles
+
+def _weekdays_between(first, last):
+    return [first + timedelta(days=i) for i in range((last - first).days + 1) if (first + timedelta(days=i)).weekday() < 5]
+
+def _universe_symbol(name, alias, taken):
+    symbol = re.sub(r'[^A-Z0-9&-]', '', (alias or name).upper())[:10] or "SYM"
+    candidate, n = symbol, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{symbol[:8]}{n}"
+    taken.add(candidate)
+    return candidate
+
+def synthetic_instruments(stock_names, reference_day=None, n_expiries=3):
+    """
+    A small instrument master covering `stock_names` (human-written, as in F_AND_O_STOCK_NAMES):
+    an NSE_EQ row per name that symbol_resolver resolves back to it, plus monthly NSE_FO futures.
+    """
+    reference_day = reference_day or datetime.now(IST).date()
+    instruments, taken = [], set()
+    for i, stock_name in enumerate(stock_names):
+        alias_match = re.search(r'\((.*?)\)', stock_name)
+        alias = alias_match.group(1).strip() if alias_match else None
+        name = re.sub(r'\s*\(.*?\)', '', stock_name).strip().upper()
+        symbol = _universe_symbol(name, alias, taken)
+        isin = f"INE{_hash(symbol) % 1000000:06d}01"
+        instruments.append({
+            "segment": "NSE_EQ", "name": f"{name} LIMITED", "exchange": "NSE", "isin": isin,
+            "instrument_type": "EQ", "instrument_key": f"NSE_EQ|{isin}", "lot_size": 1,
+            "freeze_quantity": 100000.0, "exchange_token": str(1000 + i), "tick_size": 5.0,
+            "trading_symbol": symbol, "short_name": name.title(), "security_type": "NORMAL",
+        })
+        for month in range(n_expiries):
+            year, month_index = divmod(reference_day.month - 1 + month, 12)
+            expiry_day = _last_thursday(reference_day.year + year, month_index + 1)
+            expiry_ms = int(datetime(expiry_day.year, expiry_day.month, expiry_day.day, 15, 30, tzinfo=IST).timestamp() * 1000)
+            token = 50000 + i * n_expiries + month
+            instruments.append({
+                "segment": "NSE_FO", "name": f"{name} LIMITED", "exchange": "NSE", "expiry": expiry_ms,
+                "instrument_type": "FUT", "asset_symbol": symbol, "underlying_symbol": symbol,
+                "instrument_key": f"NSE_FO|{token}", "lot_size": 500, "freeze_quantity": 10000.0,
+                "exchange_token": str(token), "minimum_lot": 500, "asset_key": f"NSE_EQ|{isin}",
+                "underlying_key": f"NSE_EQ|{isin}", "tick_size": 5.0, "asset_type": "EQUITY", "underlying_type": "EQUITY",
+                "trading_symbol": f"{symbol} FUT {expiry_day.strftime('%d %b %y').upper()}", "qty_multiplier": 1.0,
+            })
+    return instruments
+
+def _last_thursday(year, month):
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - 3) % 7)
+
+def default_stock_names():
+    """The F&O universe the analyzers screen (fno_equity_analyzer.F_AND_O_STOCK_NAMES)."""
+    from fno_equity_analyzer import F_AND_O_STOCK_NAMES
+    return F_AND_O_STOCK_NAMES
+
+# --- 3. Recorded Fixtures ---
+
+def fixture_path(fixtures_dir, path, query_string=""):
+    """File a recorded response for this request path lives in: the URL path with '|' spelled '_'."""
+    name = unquote(path).strip("/").replace("|", "_")
+    if query_string:
+        name += "__" + re.sub(r'[^A-Za-z0-9=_.-]', '_', query_string)
+    return os.path.join(fixtures_dir, name + ".json")
+
+# --- 4. Server ---
+
+class MockUpstoxServer:
+    """
+    The aiohttp application behind the mock. `config` (see DEFAULT_CONFIG) can be changed while
+    it runs, through update_config() or POST /__mock/config, so a benchmark can switch a live
+    server between healthy, failing and slow. `stats` counts requests per route and status.
+    """
+
+    def __init__(self, config=None, fixtures_dir=None, record_from=None, instruments=None, seed=0):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.fixtures_dir = fixtures_dir
+        self.record_from = record_from.rstrip("/") if record_from else None
+        self._instruments = instruments
+        self._master_body = None
+        self._master_etag = None
+        self._master_modified = None
+        self._minute_bodies = OrderedDict()
+        self._arrivals = deque() # Request times in the last second, for limit_per_second
+        self._rng = random.Random(seed)
+        self.stats = {}
+
+    def update_config(self, **changes):
+        unknown = set(changes) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown mock config keys: {sorted(unknown)}")
+        self.config.update(changes)
+        return dict(self.config)
+
+    def reset_stats(self):
+        self.stats = {}
+        self._arrivals.clear()
+
+    def _count(self, route, status):
+        by_status = self.stats.setdefault(route, {})
+        by_status[str(status)] = by_status.get(str(status), 0) + 1
+
+    # Responses
+
+    @staticmethod
+    def _error(web, status, retry_after=None):
+        error_code, message = _ERRORS.get(status, ("UDAPI100500", "Something went wrong"))
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+        return web.json_response({"status": "error", "errors": [{"errorCode": error_code, "message": message,
+                                                                 "propertyPath": None, "invalidValue": None}]},
+                                 status=status, headers=headers)
+
+    @staticmethod
+    def _candles(web, candles):
+        return web.json_response({"status": "success", "data": {"candles": candles}})
+
+    def _intraday_day(self):
+        configured = self.config.get("intraday_date")
+        return date.fromisoformat(configured) if configured else datetime.now(IST).date()
+
+    # Middleware: admin routes pass straight through; API routes get latency, injected failures
+    # and the optional rate limit, in that order, before being answered.
+
+    def middleware(self):
+        from aiohttp import web
+
+        @web.middleware
+        async def inject(request, handler):
+            if request.path.startswith("/__mock/"):
+                return await handler(request)
+            route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+            config = self.config
+            delay = config["latency_seconds"] + (self._rng.uniform(0, config["jitter_seconds"]) if config["jitter_seconds"] else 0.0)
+            if config["slow_rate"] and self._rng.random() < config["slow_rate"]:
+                delay += config["slow_seconds"]
+            if delay > 0:
+                await asyncio.sleep(delay)
+            is_api = request.path.startswith("/v3/")
+            if is_api and config["fail_status"] and self._rng.random() < config["fail_rate"]:
+                status = int(config["fail_status"])
+                self._count(route, status)
+                return self._error(web, status, config["retry_after_seconds"] if status == 429 else None)
+            if is_api and config["limit_per_second"]:
+                now = time.monotonic()
+                while self._arrivals and now - self._arrivals[0] >= 1.0:
+                    self._arrivals.popleft()
+                if len(self._arrivals) >= config["limit_per_second"]:
+                    self._count(route, 429)
+                    return self._error(web, 429, max(1, round(1.0 - (now - self._arrivals[0]))))
+                self._arrivals.append(now)
+            response = await handler(request)
+            self._count(route, response.status)
+            return response
+
+        return inject
+
+    async def _replay_or_record(self, request):
+        """A recorded response for this request, fetching and saving it first with --record-from; None otherwise."""
+        if not self.fixtures_dir:
+            return None
+        from aiohttp import web
+        path = fixture_path(self.fixtures_dir, request.path, request.query_string)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return web.Response(body=f.read(), content_type='application/json')
+        if not self.record_from:
+            return None
+        import aiohttp
+        headers = {name: request.headers[name] for name in ("Authorization", "Accept") if name in request.headers}
+        url = f"{self.record_from}{request.path_qs}"
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=headers) as upstream:
+                body = await upstream.read()
+                if upstream.status == 200:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(body)
+                    logger.info(f"Recorded {url} -> {path}")
+                return web.Response(body=body, status=upstream.status, content_type='application/json')
+
+    # Routes
+
+    async def instrument_master(self, request):
+        from aiohttp import web
+        if self._master_body is None:
+            recorded = self.fixtures_dir and os.path.join(self.fixtures_dir, "NSE.json.gz")
+            if recorded and os.path.exists(recorded):
+                with open(recorded, 'rb') as f:
+                    self._master_body = f.read()
+            else:
+                instruments = self._instruments if self._instruments is not None else synthetic_instruments(default_stock_names())
+                self._master_body = gzip.compress(json.dumps(instruments).encode(), compresslevel=6)
+            self._master_etag = f'"{zlib.crc32(self._master_body):08x}"'
+            self._master_modified = formatdate(time.time(), usegmt=True)
+        if request.headers.get("If-None-Match") == self._master_etag:
+            return web.Response(status=304, headers={"ETag": self._master_etag})
+        return web.Response(body=self._master_body, content_type='application/octet-stream',
+                            headers={"ETag": self._master_etag, "Last-Modified": self._master_modified})
+
+    async def daily(self, request):
+        from aiohttp import web
+        recorded = await self._replay_or_record(request)
+        if recorded is not None:
+            return recorded
+        candle = synthetic_daily_candle(unquote(request.match_info['key']), date.fromisoformat(request.match_info['date']))
+        return self._candles(web, [candle] if candle else [])
+
+    async def daily_range(self, request):
+        from aiohttp import web
+        recorded = await self._replay_or_record(request)
+        if recorded is not None:
+            return recorded
+        key = unquote(request.match_info['key'])
+        days = _weekdays_between(date.fromisoformat(request.match_info['from_date']), date.fromisoformat(request.match_info['to_date']))
+        return self._candles(web, [synthetic_daily_candle(key, d) for d in reversed(days)])
+
+    def _minute_body(self, key, day, last_minute=SESSION_MINUTES):
+        cache_key = (key, day, last_minute)
+        body = self._minute_bodies.get(cache_key)
+        if body is None:
+            body = json.dumps({"status": "success", "data": {"candles": synthetic_minute_candles(key, day, last_minute)}})
+            self._minute_bodies[cache_key] = body
+            if len(self._minute_bodies) > MINUTE_BODY_CACHE_SIZE:
+                self._minute_bodies.popitem(last=False)
+        return body
+
+    async def minutes(self, request):
+        from aiohttp import web
+        recorded = await self._replay_or_record(request)
+        if recorded is not None:
+            return recorded
+        # The API answers /minutes/1/{D+1} with the session of D, which the fetchers rely on
+        session_day = date.fromisoformat(request.match_info['date']) - timedelta(days=1)
+        return web.Response(text=self._minute_body(unquote(request.match_info['key']), session_day), content_type='application/json')
+
+    async def minutes_range(self, request):
+        from aiohttp import web
+        recorded = await self._replay_or_record(request)
+        if recorded is not None:
+            return recorded
+        key = unquote(request.match_info['key'])
+        days = _weekdays_between(date.fromisoformat(request.match_info['from_date']), date.fromisoformat(request.match_info['to_date']))
+        return self._candles(web, [c for d in reversed(days) for c in synthetic_minute_candles(key, d)])
+
+    async def intraday(self, request):
+        from aiohttp import web
+        recorded = await self._replay_or_record(request)
+        if recorded is not None:
+            return recorded
+        day = self._intraday_day()
+        now = datetime.now(IST)
+        # Only the minutes that have closed by now when serving the real today
+        last_minute = SESSION_MINUTES if day != now.date() else max(0, (now.hour * 60 + now.minute) - (9 * 60 + 15))
+        return web.Response(text=self._minute_body(unquote(request.match_info['key']), day, last_minute), content_type='application/json')
+
+    async def get_config(self, request):
+        from aiohttp import web
+        return web.json_response(self.config)
+
+    async def post_config(self, request):
+        from aiohttp import web
+        try:
+            return web.json_response(self.update_config(**(await request.json())))
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+    async def get_stats(self, request):
+        from aiohttp import web
+        return web.json_response(self.stats)
+
+    async def post_reset(self, request):
+        from aiohttp import web
+        self.reset_stats()
+        return web.json_response({"reset": True})
+
+    def application(self):
+        from aiohttp import web
+        app = web.Application(middlewares=[self.middleware()])
+        candles = '/v3/historical-candle'
+        app.router.add_get(INSTRUMENT_MASTER_PATH, self.instrument_master)
+        app.router.add_get(candles + '/intraday/{key}/minutes/1', self.intraday)
+        app.router.add_get(candles + '/{key}/days/1/{date}', self.daily)
+        app.router.add_get(candles + '/{key}/days/1/{to_date}/{from_date}', self.daily_range)
+        app.router.add_get(candles + '/{key}/minutes/1/{date}', self.minutes)
+        app.router.add_get(candles + '/{key}/minutes/1/{to_date}/{from_date}', self.minutes_range)
+        app.router.add_get('/__mock/config', self.get_config)
+        app.router.add_post('/__mock/config', self.post_config)
+        app.router.add_get('/__mock/stats', self.get_stats)
+        app.router.add_post('/__mock/reset', self.post_reset)
+        return app
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, on_started=None):
+        """Serves until cancelled. `on_started(port)` is called once listening (port 0 picks a free one)."""
+        from aiohttp import web
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port, backlog=4096)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Mock Upstox API listening on http://{host}:{bound_port}")
+        if on_started:
+            on_started(bound_port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+# --- 5. Running It ---
+
+def _serve_in_process(options, port_queue):
+    server = MockUpstoxServer(options.get("config"), options.get("fixtures_dir"), options.get("record_from"),
+                              options.get("instruments"), options.get("seed", 0))
+    asyncio.run(server.serve(options.get("host", DEFAULT_HOST), options.get("port", 0), port_queue.put))
+
+def start_in_background(port=0, host=DEFAULT_HOST, fixtures_dir=None, record_from=None, instruments=None, seed=0, **config):
+    """
+    Starts the mock in a separate process (so it doesn't share the caller's GIL) and returns its
+    base URL, e.g. for UPSTOX_API_BASE_URL. The process is a daemon and exits with the caller.
+    `config` takes DEFAULT_CONFIG's keys; change them later with set_config().
+    """
+    import multiprocessing
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown mock config keys: {sorted(unknown)}")
+    port_queue = multiprocessing.Queue()
+    options = {"config": config, "fixtures_dir": fixtures_dir, "record_from": record_from,
+               "instruments": instruments, "seed": seed, "host": host, "port": port}
+    multiprocessing.Process(target=_serve_in_process, args=(options, port_queue), daemon=True).start()
+    return f"http://{host}:{port_queue.get(timeout=30)}"
+
+def set_config(base_url, **changes):
+    """Changes a running mock's config over HTTP; returns the new config."""
+    import requests
+    response = requests.post(f"{base_url}/__mock/config", json=changes, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def get_stats(base_url, reset=False):
+    """{route: {status: count}} from a running mock, optionally resetting the counters after reading."""
+    import requests
+    stats = requests.get(f"{base_url}/__mock/stats", timeout=10).json()
+    if reset:
+        requests.post(f"{base_url}/__mock/reset", timeout=10)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the Upstox instrument-master and historical-candle API.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency_seconds"], help="Seconds before every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay, seconds")
+    parser.add_argument("--fail-status", type=int, choices=sorted(_ERRORS), help="Answer API requests with this error")
+    parser.add_argument("--fail-rate", type=float, default=1.0, help="Share of API requests that fail (with --fail-status)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--slow-seconds", type=float, default=0.0, help="Extra delay for --slow-rate of requests")
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--limit-per-second", type=int, help="429 requests beyond this many in any second")
+    parser.add_argument("--intraday-date", help="Session served by the intraday route (YYYY-MM-DD; default today)")
+    parser.add_argument("--fixtures", help="Directory of recorded responses to replay instead of synthetic data")
+    parser.add_argument("--record-from", help="With --fixtures: fetch misses from this base URL (e.g. https://api.upstox.com) and save them")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for jitter and injected failures")
+    args = parser.parse_args(argv)
+    if args.record_from and not args.fixtures:
+        parser.error("--record-from needs --fixtures")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = {"latency_seconds": args.latency, "jitter_seconds": args.jitter, "fail_status": args.fail_status,
+              "fail_rate": args.fail_rate, "retry_after_seconds": args.retry_after, "slow_seconds": args.slow_seconds,
+              "slow_rate": args.slow_rate, "limit_per_second": args.limit_per_second, "intraday_date": args.intraday_date}
+    server = MockUpstoxServer(config, args.fixtures, args.record_from, seed=args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())